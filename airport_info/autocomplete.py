@@ -0,0 +1,100 @@
+"""
+Prefix autocomplete over airport codes, names and municipalities.
+
+AutocompleteIndex answers "which airports start with this?" from memory.
+Records are ranked once (larger airports and those with scheduled service
+first), and every normalized key (codes, full names, full municipalities
+and their single words) keeps only the ranks of its best few airports.
+"""
+from bisect import bisect_left
+from .search import TYPE_RANK, normalize
+import numpy as np
+
+# Prefixes up to this long have their results precomputed; they match too
+# many keys to merge per request
+PRECOMPUTED_LENGTH = 3
+
+
+class AutocompleteIndex:
+    """
+    Sorted-array prefix index over airfield records.
+
+    keys is a sorted list of unique normalized keys; key i's airports are
+    ranks[offsets[i]:offsets[i + 1]], at most top_k of them, best first.
+    The keys sharing a prefix form one contiguous run of that list, so the
+    airports for a prefix are the smallest ranks in one contiguous slice of
+    ranks. Answers for short prefixes, whose slices are long, are computed
+    up front.
+    """
+
+    def __init__(self, records, top_k=20):
+        self.top_k = top_k
+        self.records = sorted(
+            records, key=lambda r: (TYPE_RANK.get(r.type, 4), not r.scheduled_service, r.name, r.id)
+        )
+        postings = {}
+        self.codes = {}
+        for rank, record in enumerate(self.records):
+            for code in (record.iata_code, record.ident):
+                if code:
+                    self.codes.setdefault(normalize(code), rank)
+            for key in self._keys(record):
+                ranks = postings.setdefault(key, [])
+                # Records arrive best first, so each key keeps its top_k best
+                if len(ranks) < top_k:
+                    ranks.append(rank)
+
+        self.keys = sorted(postings)
+        lengths = np.array([len(postings[key]) for key in self.keys], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)])
+        self.ranks = np.fromiter(
+            (rank for key in self.keys for rank in postings[key]), dtype=np.int32, count=int(self.offsets[-1])
+        )
+
+        self.top = {}
+        prefixes = {key[:length] for key in self.keys for length in range(1, PRECOMPUTED_LENGTH + 1)}
+        for prefix in prefixes:
+            self.top[prefix] = tuple(self._merge(prefix))
+
+    def __len__(self):
+        return len(self.records)
+
+    @staticmethod
+    def _keys(record):
+        keys = set()
+        for code in (record.iata_code, record.ident, record.gps_code):
+            if code:
+                keys.add(normalize(code))
+        for text in (record.name, record.municipality):
+            text = normalize(text)
+            if text:
+                keys.add(text)
+                keys.update(text.split())
+        keys.discard('')
+        return keys
+
+    def _merge(self, prefix):
+        """Best top_k ranks over every key starting with prefix."""
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + '\uffff', lo)
+        if lo == hi:
+            return []
+        return np.unique(self.ranks[self.offsets[lo]:self.offsets[hi]])[:self.top_k].tolist()
+
+    def complete(self, prefix, limit=10):
+        """Return up to limit records with a code, name, municipality or word starting with prefix."""
+        prefix = normalize(prefix)
+        if not prefix or limit <= 0:
+            return []
+        if len(prefix) <= PRECOMPUTED_LENGTH:
+            ranks = list(self.top.get(prefix, ()))
+        else:
+            ranks = self._merge(prefix)
+
+        # An exact code match comes first, however small the airport
+        exact = self.codes.get(prefix)
+        if exact is not None:
+            if exact in ranks:
+                ranks.remove(exact)
+            ranks.insert(0, exact)
+        return [self.records[rank] for rank in ranks[:limit]]
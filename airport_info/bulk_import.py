@@ -0,0 +1,211 @@
+from django.db import connection
+from django.utils import timezone
+from .models import Airfield
+import csv
+import hashlib
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+STAGING_TABLE = 'airport_info_airfield_staging'
+
+# Columns loaded from the CSV, in staging table order, with their staging column types
+COLUMNS = [
+    ('id', 'varchar(50) NOT NULL'),
+    ('ident', 'varchar(10) NOT NULL'),
+    ('type', 'varchar(20) NOT NULL'),
+    ('name', 'varchar(200) NOT NULL'),
+    ('latitude', 'numeric(9, 6) NOT NULL'),
+    ('longitude', 'numeric(9, 6) NOT NULL'),
+    ('elevation_ft', 'double precision'),
+    ('continent', 'varchar(2)'),
+    ('iso_country', 'varchar(2) NOT NULL'),
+    ('iso_region', 'varchar(10)'),
+    ('municipality', 'varchar(100)'),
+    ('scheduled_service', 'boolean NOT NULL'),
+    ('gps_code', 'varchar(10)'),
+    ('iata_code', 'varchar(3)'),
+    ('local_code', 'varchar(10)'),
+    ('home_link', 'varchar(500)'),
+    ('wikipedia_link', 'varchar(500)'),
+    ('keywords', 'text'),
+    ('geohash', 'varchar(12)'),
+]
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+NOT_NULL_TEXT = ['id', 'ident', 'type', 'name', 'iso_country']
+
+# Staged rows carry a hash of their values so unchanged rows can be skipped next time
+STAGING_COLUMNS = COLUMNS + [('content_hash', 'varchar(32)')]
+STAGING_COLUMN_NAMES = COLUMN_NAMES + ['content_hash']
+
+
+def content_hash(row):
+    """Stable hash of a row's values in COLUMN_NAMES order."""
+    text = '\x1f'.join('' if value is None else str(value) for value in row)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class AirfieldUpserter:
+    """
+    Set-based airfield writer used by import_airports.
+
+    Each row's content hash is compared with the hash stored on the airfield
+    and identical rows are skipped without touching the database. The rest
+    are loaded into a temporary staging table (COPY on PostgreSQL,
+    executemany elsewhere) and applied with one INSERT ... ON CONFLICT DO
+    UPDATE per chunk. Airfield.updated is only bumped for rows whose values
+    actually differ, and the timezone of existing airfields is left untouched.
+    Airfields missing from the source are listed in removed_ids() once all
+    rows are written.
+
+    Use as a context manager inside a transaction; rows are tuples in
+    COLUMN_NAMES order.
+    """
+
+    def __init__(self, default_timezone=None, chunk_size=10000):
+        self.default_timezone = default_timezone
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.duplicate_ids = 0
+        self.duplicate_iata = 0
+        self._pending = []
+        self._existing_hashes = {}
+        self._seen_ids = set()
+        self._seen_iata = set()
+        self._iata_index = COLUMN_NAMES.index('iata_code')
+        self._quote = connection.ops.quote_name
+        self._table = self._quote(Airfield._meta.db_table)
+        self._staging = self._quote(STAGING_TABLE)
+        self._postgres = connection.vendor == 'postgresql'
+        self._distinct = 'IS DISTINCT FROM' if self._postgres else 'IS NOT'
+
+    def __enter__(self):
+        self._existing_hashes = dict(Airfield.objects.order_by().values_list('id', 'content_hash'))
+        columns = ', '.join(f'{self._quote(name)} {sql_type}' for name, sql_type in STAGING_COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self._staging}')
+            cursor.execute(f'CREATE TEMPORARY TABLE {self._staging} ({columns}, PRIMARY KEY ({self._quote("id")}))')
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.flush()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self._staging}')
+        return False
+
+    def write(self, rows):
+        """Queue rows for upsert, flushing every chunk_size rows."""
+        for row in rows:
+            if row[0] in self._seen_ids:
+                self.duplicate_ids += 1
+                continue
+            self._seen_ids.add(row[0])
+
+            iata_code = row[self._iata_index]
+            if iata_code:
+                # iata_code is unique; later duplicates in the file lose the code
+                if iata_code in self._seen_iata:
+                    row = row[:self._iata_index] + (None,) + row[self._iata_index + 1:]
+                    self.duplicate_iata += 1
+                else:
+                    self._seen_iata.add(iata_code)
+
+            row_hash = content_hash(row)
+            if self._existing_hashes.get(row[0]) == row_hash:
+                self.unchanged += 1
+                continue
+            self._pending.append(row + (row_hash,))
+            if len(self._pending) >= self.chunk_size:
+                self.flush()
+
+    def removed_ids(self):
+        """Ids of existing airfields that were not in any written row."""
+        return sorted(self._existing_hashes.keys() - self._seen_ids)
+
+    def flush(self):
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self._staging}')
+            self._load(cursor, rows)
+            created, updated = self._count_changes(cursor)
+            self._release_iata_codes(cursor)
+            self._upsert(cursor)
+        self.created += created
+        self.updated += updated
+        self.unchanged += len(rows) - created - updated
+        logger.info(f"Upserted {len(rows)} airfields: {created} created, {updated} updated")
+
+    def _load(self, cursor, rows):
+        columns = ', '.join(self._quote(name) for name in STAGING_COLUMN_NAMES)
+        if self._postgres:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            force_not_null = ', '.join(self._quote(name) for name in NOT_NULL_TEXT)
+            cursor.copy_expert(
+                f'COPY {self._staging} ({columns}) FROM STDIN '
+                f'WITH (FORMAT csv, FORCE_NOT_NULL ({force_not_null}))',
+                buffer
+            )
+        else:
+            placeholders = ', '.join(['%s'] * len(STAGING_COLUMN_NAMES))
+            cursor.executemany(f'INSERT INTO {self._staging} ({columns}) VALUES ({placeholders})', rows)
+
+    def _changed_condition(self, target, source):
+        return ' OR '.join(
+            f'{target}.{self._quote(name)} {self._distinct} {source}.{self._quote(name)}'
+            for name in COLUMN_NAMES if name != 'id'
+        )
+
+    def _count_changes(self, cursor):
+        id_column = self._quote('id')
+        cursor.execute(
+            f'SELECT COUNT(*) FROM {self._staging} s '
+            f'WHERE NOT EXISTS (SELECT 1 FROM {self._table} a WHERE a.{id_column} = s.{id_column})'
+        )
+        created = cursor.fetchone()[0]
+        cursor.execute(
+            f'SELECT COUNT(*) FROM {self._staging} s JOIN {self._table} a ON a.{id_column} = s.{id_column} '
+            f'WHERE {self._changed_condition("a", "s")}'
+        )
+        updated = cursor.fetchone()[0]
+        return created, updated
+
+    def _release_iata_codes(self, cursor):
+        """Clear IATA codes that the incoming rows assign to a different airfield, marking it updated."""
+        id_column = self._quote('id')
+        iata_column = self._quote('iata_code')
+        cursor.execute(
+            f'UPDATE {self._table} SET {iata_column} = NULL, {self._quote("updated")} = %s '
+            f'WHERE {iata_column} IS NOT NULL AND EXISTS ('
+            f'SELECT 1 FROM {self._staging} s '
+            f'WHERE s.{iata_column} = {self._table}.{iata_column} AND s.{id_column} <> {self._table}.{id_column})',
+            [timezone.now()]
+        )
+
+    def _upsert(self, cursor):
+        columns = ', '.join(self._quote(name) for name in STAGING_COLUMN_NAMES)
+        assignments = ', '.join(
+            f'{self._quote(name)} = excluded.{self._quote(name)}'
+            for name in STAGING_COLUMN_NAMES if name != 'id'
+        )
+        changed = self._changed_condition(self._table, 'excluded')
+        updated_column = self._quote('updated')
+        hash_column = self._quote('content_hash')
+        # Rows that only gain a hash keep their updated timestamp.
+        # "WHERE true" keeps SQLite from parsing ON CONFLICT as a join constraint.
+        cursor.execute(
+            f'INSERT INTO {self._table} ({columns}, {self._quote("timezone_id")}, {updated_column}) '
+            f'SELECT {columns}, %s, %s FROM {self._staging} WHERE true '
+            f'ON CONFLICT ({self._quote("id")}) DO UPDATE SET {assignments}, '
+            f'{updated_column} = CASE WHEN {changed} THEN excluded.{updated_column} '
+            f'ELSE {self._table}.{updated_column} END '
+            f'WHERE {self._table}.{hash_column} {self._distinct} excluded.{hash_column} OR {changed}',
+            [self.default_timezone.pk if self.default_timezone else None, timezone.now()]
+        )
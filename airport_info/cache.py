@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.core.cache import cache
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+DATASET_VERSION_KEY = 'airport_info:dataset_version'
+
+
+def _initial_version():
+    # Microseconds, so a version recreated after eviction is above any used
+    # before it (each bump takes longer than a microsecond)
+    return time.time_ns() // 1000
+
+
+def get_dataset_version():
+    """
+    Return the current dataset version.
+
+    Every cached response key embeds this version, so bumping it invalidates
+    all cached responses at once without scanning for keys.
+    """
+    try:
+        version = cache.get(DATASET_VERSION_KEY)
+        if version is None:
+            cache.add(DATASET_VERSION_KEY, _initial_version(), timeout=None)
+            version = cache.get(DATASET_VERSION_KEY)
+        return version
+    except Exception as e:
+        logger.warning(f"Cache unavailable reading dataset version: {str(e)}")
+        return None
+
+
+def bump_dataset_version():
+    """
+    Invalidate every cached airport response.
+
+    For bulk changes (imports, alias imports, backfills); a change to one
+    airfield only needs drop_cached_responses().
+    """
+    try:
+        try:
+            version = cache.incr(DATASET_VERSION_KEY)
+        except ValueError:
+            # Key missing or evicted; a new initial version is above what was cached under it
+            cache.add(DATASET_VERSION_KEY, _initial_version(), timeout=None)
+            version = cache.incr(DATASET_VERSION_KEY)
+        logger.info(f"Bumped airport dataset version to {version}")
+        return version
+    except Exception as e:
+        logger.warning(f"Cache unavailable bumping dataset version: {str(e)}")
+        return None
+
+
+def response_key(version, lookup, code, include_timezone):
+    return f"airport_info:payload:{version}:{lookup}:{code}:{int(bool(include_timezone))}"
+
+
+def drop_cached_responses(airfields):
+    """Delete the cached responses of the given airfields (anything with id and code attributes)."""
+    version = get_dataset_version()
+    if version is None:
+        return
+    keys = []
+    for airfield in airfields:
+        lookups = [
+            ('id', airfield.id), ('iata', airfield.iata_code), ('icao', airfield.ident), ('icao', airfield.gps_code)
+        ]
+        for lookup, code in lookups:
+            if code:
+                keys.extend(response_key(version, lookup, code, include_timezone) for include_timezone in (False, True))
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        logger.warning(f"Cache unavailable dropping cached responses: {str(e)}")
+
+
+def get_cached_response(lookup, code, include_timezone):
+    """Return the cached payload (see airport_info.payloads) for a lookup, or None on a miss."""
+    version = get_dataset_version()
+    if version is None:
+        return None
+    try:
+        return cache.get(response_key(version, lookup, code, include_timezone))
+    except Exception as e:
+        logger.warning(f"Cache unavailable reading {lookup} {code}: {str(e)}")
+        return None
+
+
+def set_cached_response(lookup, code, include_timezone, data, timeout=None):
+    """Store a payload for timeout (default CACHE_TTL) seconds under the current dataset version."""
+    version = get_dataset_version()
+    if version is None:
+        return
+    if timeout is None:
+        timeout = settings.CACHE_TTL
+    try:
+        cache.set(response_key(version, lookup, code, include_timezone), data, timeout=timeout)
+    except Exception as e:
+        logger.warning(f"Cache unavailable writing {lookup} {code}: {str(e)}")
@@ -0,0 +1,76 @@
+"""
+Streaming airfield exports.
+
+Rows are read with a server-side cursor and encoded a chunk at a time, so
+an export of the whole dataset holds at most one chunk in memory however
+many airfields it covers.
+"""
+from itertools import islice
+from .index import AIRFIELD_FIELDS, TIMEZONE_FIELDS, airfield_records
+from .renderers import FastJSONRenderer
+from .serializers import FastAirfieldSerializer
+import csv
+import io
+import zlib
+
+CHUNK_SIZE = 2000  # rows fetched from the cursor and encoded together
+
+# CSV columns: the airfield fields, then its timezone's fields prefixed with timezone_
+TIMEZONE_COLUMNS = [
+    name if name.startswith('timezone_') else f'timezone_{name}'
+    for name in TIMEZONE_FIELDS + ('total_offset', 'abbreviation')
+]
+CSV_COLUMNS = list(AIRFIELD_FIELDS) + TIMEZONE_COLUMNS
+
+
+def iter_records(rows, chunk_size=CHUNK_SIZE):
+    """Yield lists of at most chunk_size AirfieldRecords from an airfield_rows() queryset."""
+    rows = iter(rows.iterator(chunk_size=chunk_size))
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield airfield_records(chunk)
+
+
+def iter_ndjson(rows, chunk_size=CHUNK_SIZE):
+    """Yield the airfields as newline-delimited JSON, one chunk of lines at a time."""
+    serializer = FastAirfieldSerializer()
+    renderer = FastJSONRenderer()
+    for records in iter_records(rows, chunk_size):
+        yield b''.join(renderer.render(serializer.airfield(record)) + b'\n' for record in records)
+
+
+def _csv_row(data):
+    timezone_data = data.pop('timezone') or {}
+    row = [data[name] for name in AIRFIELD_FIELDS]
+    for name in TIMEZONE_FIELDS + ('total_offset', 'abbreviation'):
+        value = timezone_data.get(name)
+        row.append(' '.join(value) if isinstance(value, list) else value)
+    return row
+
+
+def iter_csv(rows, chunk_size=CHUNK_SIZE):
+    """Yield the airfields as CSV with a header row, one chunk of rows at a time."""
+    serializer = FastAirfieldSerializer()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for records in iter_records(rows, chunk_size):
+        writer.writerows(_csv_row(serializer.airfield(record)) for record in records)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header of an empty export
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of byte chunks into one gzip stream as it is produced."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,136 @@
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, Cos, Power, Radians, Sin
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from .geohash import covering_ranges, radius_bbox
+from .models import Airfield
+from .spatial import EARTH_RADIUS_KM, KM_PER_NM
+import math
+
+# Largest radius accepted by the radius filter
+MAX_RADIUS_NM = 5000
+
+
+def _geohash_q(min_lat, min_lon, max_lat, max_lon):
+    """Q matching airfields in the geohash ranges covering a bounding box."""
+    condition = Q()
+    for low, high in covering_ranges(min_lat, min_lon, max_lat, max_lon):
+        cell = Q(geohash__gte=low)
+        if high is not None:
+            cell &= Q(geohash__lt=high)
+        condition |= cell
+    return condition
+
+
+def _box_q(min_lat, min_lon, max_lat, max_lon):
+    """Exact bounding box test, including boxes crossing the antimeridian."""
+    condition = Q(latitude__gte=min_lat, latitude__lte=max_lat)
+    if min_lon <= max_lon:
+        return condition & Q(longitude__gte=min_lon, longitude__lte=max_lon)
+    return condition & (Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon))
+
+
+class GeoFilterBackend(BaseFilterBackend):
+    """
+    Filters airfields to a viewport or a radius around a point.
+
+    ?bbox=min_lon,min_lat,max_lon,max_lat keeps airfields inside the box
+    (min_lon > max_lon crosses the antimeridian). ?lat=&lon=&radius_nm=
+    keeps airfields within radius_nm nautical miles of the point. Both first
+    narrow candidates to indexed geohash ranges and then apply the exact test.
+    """
+
+    def _float(self, value, name):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ValidationError({'error': f'{name} must be a number'})
+
+    def _check_coordinate(self, latitude, longitude):
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValidationError(
+                {'error': 'Latitudes must be between -90 and 90 and longitudes between -180 and 180'}
+            )
+
+    def filter_bbox(self, queryset, bbox):
+        parts = bbox.split(',')
+        if len(parts) != 4:
+            raise ValidationError({'error': 'bbox must be min_lon,min_lat,max_lon,max_lat'})
+        min_lon, min_lat, max_lon, max_lat = (self._float(part, 'bbox') for part in parts)
+        self._check_coordinate(min_lat, min_lon)
+        self._check_coordinate(max_lat, max_lon)
+        if min_lat > max_lat:
+            raise ValidationError({'error': 'bbox min_lat must not be greater than max_lat'})
+
+        return queryset.filter(
+            _geohash_q(min_lat, min_lon, max_lat, max_lon),
+            _box_q(min_lat, min_lon, max_lat, max_lon)
+        )
+
+    def filter_radius(self, queryset, params):
+        latitude = self._float(params.get('lat'), 'lat')
+        longitude = self._float(params.get('lon'), 'lon')
+        radius_nm = self._float(params.get('radius_nm'), 'radius_nm')
+        self._check_coordinate(latitude, longitude)
+        if not 0 < radius_nm <= MAX_RADIUS_NM:
+            raise ValidationError({'error': f'radius_nm must be greater than 0 and at most {MAX_RADIUS_NM}'})
+
+        radius_km = radius_nm * KM_PER_NM
+        bbox = radius_bbox(latitude, longitude, radius_km, EARTH_RADIUS_KM)
+        queryset = queryset.filter(_geohash_q(*bbox), _box_q(*bbox))
+
+        # Haversine term compared against its value at the radius, avoiding ASIN in SQL
+        lat1 = math.radians(latitude)
+        lon1 = math.radians(longitude)
+        lat2 = Radians(Cast(F('latitude'), FloatField()))
+        lon2 = Radians(Cast(F('longitude'), FloatField()))
+        haversine = (
+            Power(Sin((lat2 - lat1) / 2), 2)
+            + math.cos(lat1) * Cos(lat2) * Power(Sin((lon2 - lon1) / 2), 2)
+        )
+        limit = math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2) ** 2
+        return queryset.alias(haversine=haversine).filter(haversine__lte=limit)
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        if params.get('bbox'):
+            queryset = self.filter_bbox(queryset, params['bbox'])
+        if params.get('radius_nm'):
+            queryset = self.filter_radius(queryset, params)
+        return queryset
+
+
+class AttributeFilterBackend(BaseFilterBackend):
+    """
+    Filters airfields by ?iso_country=, ?iso_region=, ?type= and ?scheduled_service=.
+
+    iso_country, iso_region and type take comma-separated values and match
+    any of them; scheduled_service takes true or false. Each filter is backed
+    by a composite (field, id) index, so filtered pages in id order are read
+    straight from the index.
+    """
+
+    AIRPORT_TYPES = {value for value, _ in Airfield.AIRPORT_TYPES}
+
+    def _values(self, params, name, normalize):
+        return [normalize(value.strip()) for value in params.get(name, '').split(',') if value.strip()]
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        for name, normalize in (('iso_country', str.upper), ('iso_region', str.upper), ('type', str.lower)):
+            values = self._values(params, name, normalize)
+            if name == 'type' and set(values) - self.AIRPORT_TYPES:
+                raise ValidationError(
+                    {'error': f"type must be one of {', '.join(sorted(self.AIRPORT_TYPES))}"}
+                )
+            if len(values) == 1:
+                queryset = queryset.filter(**{name: values[0]})
+            elif values:
+                queryset = queryset.filter(**{f'{name}__in': values})
+
+        scheduled_service = params.get('scheduled_service')
+        if scheduled_service:
+            if scheduled_service.lower() not in ('true', 'false'):
+                raise ValidationError({'error': 'scheduled_service must be true or false'})
+            queryset = queryset.filter(scheduled_service=scheduled_service.lower() == 'true')
+        return queryset
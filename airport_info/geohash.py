@@ -0,0 +1,128 @@
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9  # ~5m cells; enough to narrow any viewport or radius query
+
+# Upper bound on the number of cells used to cover a query area
+MAX_COVER_CELLS = 32
+
+
+def _cell_size(precision):
+    """Return (lat_bits, lon_bits, cell height, cell width) for a precision."""
+    bits = precision * 5
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return lat_bits, lon_bits, 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def _encode_cell(lat_index, lon_index, precision):
+    lat_bits, lon_bits, _, _ = _cell_size(precision)
+    value = 0
+    # Bits interleave starting with longitude
+    for i in range(precision * 5):
+        if i % 2 == 0:
+            lon_bits -= 1
+            bit = (lon_index >> lon_bits) & 1
+        else:
+            lat_bits -= 1
+            bit = (lat_index >> lat_bits) & 1
+        value = (value << 1) | bit
+    return ''.join(BASE32[(value >> shift) & 31] for shift in range((precision - 1) * 5, -1, -5))
+
+
+def _indices(latitude, longitude, precision):
+    lat_bits, lon_bits, height, width = _cell_size(precision)
+    lat_index = min(int((float(latitude) + 90) // height), (1 << lat_bits) - 1)
+    lon_index = min(int((float(longitude) + 180) // width), (1 << lon_bits) - 1)
+    return max(lat_index, 0), max(lon_index, 0)
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """Geohash of a coordinate."""
+    return _encode_cell(*_indices(latitude, longitude, precision), precision)
+
+
+def neighbors(latitude, longitude, precision=PRECISION):
+    """
+    Geohashes of the cell containing a coordinate followed by its neighbours.
+
+    Longitude wraps at the antimeridian; cells beyond a pole are left out.
+    """
+    lat_bits, lon_bits, _, _ = _cell_size(precision)
+    lat_index, lon_index = _indices(latitude, longitude, precision)
+    cells = [_encode_cell(lat_index, lon_index, precision)]
+    for d_lat in (-1, 0, 1):
+        row = lat_index + d_lat
+        if not 0 <= row < 1 << lat_bits:
+            continue
+        for d_lon in (-1, 0, 1):
+            if d_lat or d_lon:
+                cells.append(_encode_cell(row, (lon_index + d_lon) % (1 << lon_bits), precision))
+    return cells
+
+
+def next_prefix(prefix):
+    """The smallest geohash greater than every hash starting with prefix, or None if there is none."""
+    chars = list(prefix)
+    while chars:
+        position = BASE32.index(chars[-1])
+        if position < len(BASE32) - 1:
+            chars[-1] = BASE32[position + 1]
+            return ''.join(chars)
+        chars.pop()
+    return None
+
+
+def covering_ranges(min_lat, min_lon, max_lat, max_lon, max_cells=MAX_COVER_CELLS):
+    """
+    Return [(low, high), ...] geohash ranges that together cover a bounding box.
+
+    Every geohash inside the box satisfies low <= geohash < high for one of the
+    ranges (high is None for an open upper bound). Uses the finest precision
+    that covers the box in at most max_cells cells, then merges adjacent
+    cells into contiguous ranges. Boxes crossing the antimeridian
+    (min_lon > max_lon) are split in two.
+    """
+    if min_lon > max_lon:
+        return (covering_ranges(min_lat, min_lon, max_lat, 180, max_cells)
+                + covering_ranges(min_lat, -180, max_lat, max_lon, max_cells))
+
+    cells = ['']
+    for precision in range(1, PRECISION + 1):
+        low_lat, low_lon = _indices(min_lat, min_lon, precision)
+        high_lat, high_lon = _indices(max_lat, max_lon, precision)
+        if (high_lat - low_lat + 1) * (high_lon - low_lon + 1) > max_cells:
+            break
+        cells = sorted(
+            _encode_cell(lat_index, lon_index, precision)
+            for lat_index in range(low_lat, high_lat + 1)
+            for lon_index in range(low_lon, high_lon + 1)
+        )
+
+    ranges = []
+    for cell in cells:
+        high = next_prefix(cell) if cell else None
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1] = (ranges[-1][0], high)
+        else:
+            ranges.append((cell, high))
+    return ranges
+
+
+def radius_bbox(latitude, longitude, radius_km, earth_radius_km):
+    """Bounding box (min_lat, min_lon, max_lat, max_lon) of a circle; longitudes may wrap."""
+    angle = radius_km / earth_radius_km
+    delta_lat = math.degrees(angle)
+    min_lat = max(latitude - delta_lat, -90.0)
+    max_lat = min(latitude + delta_lat, 90.0)
+    # A circle reaching over a pole spans every longitude
+    if angle >= math.pi / 2 or math.sin(angle) >= math.cos(math.radians(latitude)):
+        return min_lat, -180.0, max_lat, 180.0
+    delta_lon = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(latitude))))
+    min_lon = longitude - delta_lon
+    max_lon = longitude + delta_lon
+    if min_lon < -180:
+        min_lon += 360
+    if max_lon > 180:
+        max_lon -= 360
+    return min_lat, min_lon, max_lat, max_lon
@@ -0,0 +1,189 @@
+"""
+Shared client for the Google Maps Time Zone API.
+
+All lookups in a process go through one pooled requests.Session. Calls are
+rate limited across every worker through the shared cache, OVER_QUERY_LIMIT
+responses are retried with jittered exponential backoff, and concurrent
+lookups for the same location are coalesced into a single upstream call.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import logging
+import random
+import requests
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+API_URL = 'https://maps.googleapis.com/maps/api/timezone/json'
+CONNECT_TIMEOUT = 3.05
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5  # seconds; doubled on each OVER_QUERY_LIMIT retry
+BACKOFF_CAP = 8.0
+
+RATE_KEY = 'airport_info:google_timezone:rate'
+INFLIGHT_KEY = 'airport_info:google_timezone:inflight'
+RESULT_KEY = 'airport_info:google_timezone:result'
+RESULT_TTL = 60  # seconds a result is kept for callers that coalesced onto it
+INFLIGHT_TTL = 30  # seconds before another worker may retry an abandoned call
+POLL_INTERVAL = 0.1
+
+
+class GoogleTimeZoneError(Exception):
+    """The Time Zone API did not return a timezone."""
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GoogleTimeZoneClient:
+    """
+    Rate-limited, coalescing Time Zone API client.
+
+    The rate limit allows GOOGLE_TIMEZONE_QPS calls per second across all
+    processes: each second's tokens are handed out by atomic increments of a
+    per-second counter in the shared cache (Redis in production), and callers
+    that find the bucket empty wait for the next second. Coalescing happens
+    within a process through in-flight futures and across processes through
+    a short-lived lock and result key in the same cache.
+    """
+
+    def __init__(self):
+        self.session = requests.Session()
+        # Connection-level failures and 5xx responses are retried by urllib3
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=32,
+            max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504],
+                              allowed_methods=['GET']),
+        )
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def lookup(self, latitude, longitude, api_key, timestamp=None, qps=None):
+        """
+        Return the API response data for a location.
+
+        qps, when lower than GOOGLE_TIMEZONE_QPS, makes this call wait for
+        the shared bucket to fall below it, leaving headroom for other
+        callers. Raises GoogleTimeZoneError when the API reports anything but OK.
+        """
+        location = f"{latitude},{longitude}"
+        with self._lock:
+            flight = self._inflight.get(location)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[location] = _Flight()
+
+        if not leader:
+            logger.info(f"Waiting for in-flight timezone lookup of {location}")
+            flight.done.wait()
+        else:
+            try:
+                flight.result = self._coalesced_fetch(location, api_key, timestamp, qps)
+            except Exception as e:
+                flight.error = e
+            finally:
+                with self._lock:
+                    del self._inflight[location]
+                flight.done.set()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _coalesced_fetch(self, location, api_key, timestamp, qps):
+        """Fetch once across processes: one worker calls Google, the others wait for its result."""
+        result_key = f"{RESULT_KEY}:{location}"
+        inflight_key = f"{INFLIGHT_KEY}:{location}"
+        owner = True
+        try:
+            result = cache.get(result_key)
+            if result is not None:
+                return result
+            owner = cache.add(inflight_key, 1, timeout=INFLIGHT_TTL)
+            if not owner:
+                deadline = time.monotonic() + INFLIGHT_TTL
+                while time.monotonic() < deadline:
+                    time.sleep(POLL_INTERVAL)
+                    result = cache.get(result_key)
+                    if result is not None:
+                        return result
+                    if cache.get(inflight_key) is None:
+                        break
+        except Exception as e:
+            logger.warning(f"Cache unavailable coalescing timezone lookup: {str(e)}")
+
+        try:
+            result = self._fetch(location, api_key, timestamp, qps)
+            try:
+                cache.set(result_key, result, timeout=RESULT_TTL)
+            except Exception as e:
+                logger.warning(f"Cache unavailable storing timezone lookup: {str(e)}")
+            return result
+        finally:
+            if owner:
+                try:
+                    cache.delete(inflight_key)
+                except Exception as e:
+                    logger.warning(f"Cache unavailable releasing timezone lookup: {str(e)}")
+
+    def _fetch(self, location, api_key, timestamp, qps):
+        params = {
+            'location': location,
+            'timestamp': int(timestamp if timestamp is not None else time.time()),
+            'key': api_key,
+        }
+        for attempt in range(MAX_RETRIES + 1):
+            self._acquire(qps)
+            logger.info(f"Requesting timezone for {location} (attempt {attempt + 1})")
+            response = self.session.get(
+                API_URL, params=params, timeout=(CONNECT_TIMEOUT, settings.GOOGLE_TIMEZONE_TIMEOUT)
+            )
+            if response.status_code != 200:
+                raise GoogleTimeZoneError(f"HTTP Error: {response.status_code} - {response.text}")
+            data = response.json()
+            if data['status'] == 'OK':
+                return data
+            if data['status'] != 'OVER_QUERY_LIMIT' or attempt == MAX_RETRIES:
+                raise GoogleTimeZoneError(
+                    f"API Error: {data['status']} - {data.get('error_message', 'No error message')}"
+                )
+            # Full jitter keeps workers that hit the limit together from retrying together
+            delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            logger.warning(f"Timezone API over query limit for {location}; retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    def _acquire(self, qps=None):
+        """Block until a token is available in the shared per-second bucket."""
+        capped = qps is not None and qps < settings.GOOGLE_TIMEZONE_QPS
+        qps = min(qps or settings.GOOGLE_TIMEZONE_QPS, settings.GOOGLE_TIMEZONE_QPS)
+        while True:
+            now = time.time()
+            second = int(now)
+            key = f"{RATE_KEY}:{second}"
+            try:
+                cache.add(key, 0, timeout=2)
+                # Capped callers only take a token while the bucket is below their
+                # cap, so waiting never uses up the tokens left for other callers
+                if not capped or cache.get(key, 0) < qps:
+                    if cache.incr(key) <= qps:
+                        return
+                    if capped:
+                        # Lost a race past the cap; hand the token back
+                        cache.decr(key)
+            except Exception as e:
+                logger.warning(f"Cache unavailable for timezone rate limit: {str(e)}")
+                return
+            time.sleep(second + 1 - now + random.uniform(0, 0.05))
+
+
+client = GoogleTimeZoneClient()
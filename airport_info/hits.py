@@ -0,0 +1,89 @@
+from collections import Counter
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from .models import AirfieldAccess
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class HitCounter:
+    """
+    Per-process buffer of airfield lookup counts.
+
+    Hits are counted in memory and written to AirfieldAccess every
+    AIRFIELD_HITS_FLUSH_INTERVAL seconds by a daemon thread, started with
+    the first hit, so counting adds no query to lookup requests. Airfields
+    with the same number of buffered hits share one UPDATE.
+    """
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._database = None
+
+    def record(self, airfield_ids):
+        """Count one hit for each airfield id."""
+        with self._lock:
+            self._counts.update(str(airfield_id) for airfield_id in airfield_ids)
+            # Remember which database the hits belong to, see flush_at_exit()
+            self._database = connection.settings_dict['NAME']
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='airfield-hit-counter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(settings.AIRFIELD_HITS_FLUSH_INTERVAL)
+            self.flush()
+            # Don't hold a connection open between flushes
+            connection.close()
+
+    def flush_at_exit(self):
+        """Write what is left at interpreter exit, unless it was counted against another database."""
+        # The test runner destroys its database and restores the real name
+        # before exit; hits counted against the test database are dropped
+        if self._database is not None and self._database == connection.settings_dict['NAME']:
+            self.flush()
+
+    def flush(self):
+        """Write buffered hits to the database."""
+        # Only one thread flushes; the others keep counting into the next buffer
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                counts, self._counts = self._counts, Counter()
+            if counts:
+                self._write(counts)
+        except Exception as e:
+            logger.warning(f"Error writing airfield hit counts: {str(e)}")
+        finally:
+            self._flush_lock.release()
+
+    def _write(self, counts):
+        now = timezone.now()
+        AirfieldAccess.objects.bulk_create(
+            [AirfieldAccess(airfield_id=airfield_id) for airfield_id in counts],
+            ignore_conflicts=True
+        )
+        by_count = {}
+        for airfield_id, hits in counts.items():
+            by_count.setdefault(hits, []).append(airfield_id)
+        for hits, airfield_ids in by_count.items():
+            AirfieldAccess.objects.filter(airfield_id__in=airfield_ids).update(
+                hit_count=F('hit_count') + hits,
+                last_hit=now
+            )
+        logger.info(f"Recorded {sum(counts.values())} hits for {len(counts)} airfields")
+
+
+hit_counter = HitCounter()
+atexit.register(hit_counter.flush_at_exit)
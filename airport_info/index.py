@@ -0,0 +1,323 @@
+from collections import namedtuple
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from .autocomplete import AutocompleteIndex
+from .cache import get_dataset_version
+from .models import Airfield, TimeZone
+from .serializers import AirfieldSerializer, TimeZoneSerializer
+from .search import SearchIndex
+from .spatial import SpatialIndex
+from datetime import timedelta
+import logging
+import operator
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Record fields mirror the serializer fields so records can be handed to
+# AirfieldSerializer exactly like model instances.
+TIMEZONE_FIELDS = tuple(f for f in TimeZoneSerializer.Meta.fields if f != 'total_offset')
+AIRFIELD_FIELDS = tuple(f for f in AirfieldSerializer.Meta.fields if f != 'timezone')
+
+# Above this many changed rows a full rebuild is cheaper than patching
+PATCH_LIMIT = 1000
+
+# How long after its updated time a row may still be committed and picked up by a patch
+PATCH_OVERLAP = timedelta(minutes=5)
+
+# Everything the derived indexes are built from: all but the update time
+# and the timezone, which change on every timezone refresh
+_content = operator.itemgetter(*(i for i, name in enumerate(AIRFIELD_FIELDS) if name != 'updated'))
+
+
+class TimeZoneRecord(namedtuple('TimeZoneRecord', TIMEZONE_FIELDS)):
+    """Read-only copy of a TimeZone row, shared by every airfield in that zone."""
+    __slots__ = ()
+
+    total_offset = TimeZone.total_offset
+
+
+class AirfieldRecord(namedtuple('AirfieldRecord', AIRFIELD_FIELDS + ('timezone',))):
+    """Read-only copy of an Airfield row with its TimeZone already joined."""
+    __slots__ = ()
+
+    def __str__(self):
+        return f"{self.name} ({self.iata_code or self.ident})"
+
+
+def airfield_rows(queryset):
+    """The queryset as .values_list() rows, joined to TimeZone, for airfield_records()."""
+    return queryset.values_list(*AIRFIELD_FIELDS, 'timezone', *(f'timezone__{f}' for f in TIMEZONE_FIELDS))
+
+
+def airfield_records(rows):
+    """AirfieldRecords built from airfield_rows() rows without instantiating any model."""
+    count = len(AIRFIELD_FIELDS)
+    return [
+        AirfieldRecord(*row[:count], TimeZoneRecord(*row[count + 1:]) if row[count] is not None else None)
+        for row in rows
+    ]
+
+
+_Snapshot = namedtuple(
+    '_Snapshot', ['stamp', 'generation', 'by_id', 'by_iata', 'by_ident', 'by_gps_code', 'by_local_code']
+)
+
+# Code attribute for each of the code maps in a snapshot
+CODE_MAPS = {
+    'by_iata': 'iata_code',
+    'by_ident': 'ident',
+    'by_gps_code': 'gps_code',
+    'by_local_code': 'local_code',
+}
+
+# Indexes built from a snapshot's records, by name
+DERIVED_INDEXES = {
+    'spatial': SpatialIndex,
+    'search': SearchIndex,
+    'autocomplete': lambda records: AutocompleteIndex(records, top_k=settings.AUTOCOMPLETE_MAX_RESULTS),
+}
+
+
+class AirfieldIndex:
+    """
+    Per-process index of airfields by IATA code, ident, GPS code and local code.
+
+    Lookups are served from immutable dict snapshots. The dataset version and
+    the recently updated airfields are checked at most once every
+    AIRFIELD_INDEX_CHECK_INTERVAL seconds. A new version rebuilds the
+    snapshot; updated airfields are patched into a copy of it. Either is
+    swapped in with a single reference assignment so concurrent readers never
+    see a partial index.
+
+    The spatial, search and autocomplete indexes take seconds to build on
+    the full dataset, so they are built by warm() and only rebuilt when a
+    snapshot's generation moves, i.e. when anything but airfields' update
+    times and timezones changed. The old index keeps serving while a
+    background thread builds its replacement. Records from these indexes may
+    carry an older timezone; latest() returns the current snapshot's copy.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._derived_indexes = {}  # name -> (generation, index)
+        self._derived_locks = {name: threading.Lock() for name in DERIVED_INDEXES}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def by_id(self, airfield_id):
+        return self._current().by_id.get(str(airfield_id))
+
+    def by_iata(self, code):
+        return self._current().by_iata.get(code)
+
+    def by_icao(self, code):
+        """Look up an ICAO code, falling back to gps_code for airfields whose ident is not the ICAO code."""
+        snapshot = self._current()
+        return snapshot.by_ident.get(code) or snapshot.by_gps_code.get(code)
+
+    def by_code(self, code):
+        """Look up a code of any kind, most specific first."""
+        snapshot = self._current()
+        for name in CODE_MAPS:
+            record = getattr(snapshot, name).get(code)
+            if record is not None:
+                return record
+        return None
+
+    def latest(self, record):
+        """The current snapshot's copy of a record returned by a derived index."""
+        return self._current().by_id.get(record.id, record)
+
+    def spatial(self):
+        """Return the nearest-neighbour index."""
+        return self._derived('spatial')
+
+    def search(self):
+        """Return the text search index."""
+        return self._derived('search')
+
+    def autocomplete(self):
+        """Return the prefix autocomplete index."""
+        return self._derived('autocomplete')
+
+    def _derived(self, name):
+        """
+        A derived index, rebuilt in the background once the airfields' content changed.
+
+        Only a process that never warmed the index builds it on the request
+        thread, and concurrent first requests wait for that one build.
+        """
+        snapshot = self._current()
+        derived = self._derived_indexes.get(name)
+        if derived is None:
+            with self._derived_locks[name]:
+                derived = self._derived_indexes.get(name) or self._build_derived(name, snapshot)
+        elif derived[0] != snapshot.generation:
+            self._rebuild_derived(name)
+        return derived[1]
+
+    def _build_derived(self, name, snapshot):
+        started = time.monotonic()
+        derived = (snapshot.generation, DERIVED_INDEXES[name](snapshot.by_id.values()))
+        self._derived_indexes[name] = derived
+        logger.info(
+            f"Built {name} index for airfield generation {snapshot.generation} in {time.monotonic() - started:.2f}s"
+        )
+        return derived
+
+    def _rebuild_derived(self, name):
+        """Start rebuilding a derived index on a daemon thread unless it is already being built."""
+        lock = self._derived_locks[name]
+        if not lock.acquire(blocking=False):
+            return
+
+        def rebuild():
+            try:
+                snapshot = self._snapshot
+                if self._derived_indexes[name][0] != snapshot.generation:
+                    self._build_derived(name, snapshot)
+            except Exception as e:
+                logger.error(f"Error rebuilding {name} index: {str(e)}", exc_info=True)
+            finally:
+                lock.release()
+
+        threading.Thread(target=rebuild, name=f'airfield-{name}-index', daemon=True).start()
+
+    def warm(self):
+        """Build the index and its derived indexes up front so requests do not pay for them."""
+        try:
+            snapshot = self._current()
+            for name in DERIVED_INDEXES:
+                with self._derived_locks[name]:
+                    derived = self._derived_indexes.get(name)
+                    if derived is None or derived[0] != snapshot.generation:
+                        self._build_derived(name, snapshot)
+        except Exception as e:
+            logger.error(f"Error building airfield index: {str(e)}", exc_info=True)
+
+    def invalidate(self):
+        """Force a change check on the next lookup."""
+        self._checked_at = 0.0
+
+    def _current(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < settings.AIRFIELD_INDEX_CHECK_INTERVAL:
+            return snapshot
+
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._build()
+                    self._checked_at = time.monotonic()
+                return self._snapshot
+
+        # Only one thread checks for changes; the others keep serving the current snapshot
+        if self._lock.acquire(blocking=False):
+            try:
+                self._snapshot = self._refresh(self._snapshot)
+                self._checked_at = time.monotonic()
+            finally:
+                self._lock.release()
+        return self._snapshot
+
+    def _stamp(self, version, since):
+        """The dataset version, the latest Airfield.updated and how many airfields were updated since `since`."""
+        recent = Count('id', filter=Q(updated__gte=since)) if since is not None else Count('id')
+        stamp = Airfield.objects.aggregate(latest=Max('updated'), recent=recent)
+        return version, stamp['latest'], stamp['recent']
+
+    @staticmethod
+    def _watermark(version, records):
+        """The _stamp() of an index holding exactly these records."""
+        latest = max((record.updated for record in records if record.updated is not None), default=None)
+        if latest is None:
+            return version, None, len(records)
+        since = latest - PATCH_OVERLAP
+        return version, latest, sum(1 for record in records if record.updated is not None and record.updated >= since)
+
+    def _timezones(self):
+        return {
+            row[0]: TimeZoneRecord(*row[1:])
+            for row in TimeZone.objects.order_by().values_list('id', *TIMEZONE_FIELDS)
+        }
+
+    def _records(self, queryset, timezones):
+        rows = queryset.order_by().values_list(*AIRFIELD_FIELDS, 'timezone')
+        for row in rows.iterator(chunk_size=5000):
+            yield AirfieldRecord(*row[:-1], timezones.get(row[-1]))
+
+    def _build(self, previous=None):
+        started = time.monotonic()
+        version = get_dataset_version()
+        timezones = self._timezones()
+        maps = {name: {} for name in CODE_MAPS}
+        by_id = {}
+        for record in self._records(Airfield.objects.all(), timezones):
+            by_id[record.id] = record
+            self._add_codes(maps, record)
+
+        generation = 0
+        if previous is not None:
+            generation = previous.generation + self._content_changed(previous.by_id, by_id)
+        logger.info(f"Built airfield index with {len(by_id)} airfields in {time.monotonic() - started:.2f}s")
+        stamp = self._watermark(version, list(by_id.values()))
+        return _Snapshot(stamp=stamp, generation=generation, by_id=by_id, **maps)
+
+    @staticmethod
+    def _content_changed(old, new):
+        return old.keys() != new.keys() or any(_content(record) != _content(old[i]) for i, record in new.items())
+
+    def _refresh(self, snapshot):
+        # Version bumps come with bulk changes (imports, backfills, alias updates) and may
+        # delete rows or change TimeZone rows without touching Airfield.updated
+        version = get_dataset_version()
+        if version != snapshot.stamp[0]:
+            return self._build(snapshot)
+
+        # Rows are stamped when saved but become visible when committed, so a row can
+        # appear with an older updated than the latest one already indexed. Re-reading
+        # the last PATCH_OVERLAP catches those, and counting the rows in it notices them.
+        last_updated = snapshot.stamp[1]
+        since = last_updated - PATCH_OVERLAP if last_updated is not None else None
+        stamp = self._stamp(version, since)
+        if stamp == snapshot.stamp:
+            return snapshot
+        if stamp[2] > PATCH_LIMIT:
+            return self._build(snapshot)
+
+        # Patch the changed rows into copies of the current maps
+        changed = Airfield.objects.filter(updated__gte=since) if since is not None else Airfield.objects.all()
+        timezones = self._timezones()
+        by_id = dict(snapshot.by_id)
+        maps = {name: dict(getattr(snapshot, name)) for name in CODE_MAPS}
+        content_changed = False
+        patched = list(self._records(changed, timezones))
+        for record in patched:
+            old = by_id.get(record.id)
+            if old is not None:
+                self._remove_codes(maps, old)
+            content_changed = content_changed or old is None or _content(old) != _content(record)
+            by_id[record.id] = record
+            self._add_codes(maps, record)
+
+        # Every indexed row updated since `since` was just re-read
+        stamp = self._watermark(version, patched)
+        logger.info(f"Patched airfield index up to {stamp[1]}")
+        return _Snapshot(stamp=stamp, generation=snapshot.generation + content_changed, by_id=by_id, **maps)
+
+    def _add_codes(self, maps, record):
+        for name, attr in CODE_MAPS.items():
+            code = getattr(record, attr)
+            if code:
+                maps[name].setdefault(code, record)
+
+    def _remove_codes(self, maps, record):
+        for name, attr in CODE_MAPS.items():
+            code = getattr(record, attr)
+            if code and maps[name].get(code) is record:
+                del maps[name][code]
+
+
+airfield_index = AirfieldIndex()
@@ -0,0 +1,202 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from airport_info.cache import bump_dataset_version
+from airport_info.models import Airfield
+from airport_info.payloads import refresh_payloads
+from pathlib import Path
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Backfill airfield timezones concurrently, resuming from a checkpoint after interruption'
+
+    CHUNK_SIZE = 500  # airfields looked up, written and checkpointed together
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Select airfields without a timezone'
+        )
+        parser.add_argument(
+            '--utc',
+            action='store_true',
+            help='Select airfields with the UTC placeholder timezone'
+        )
+        parser.add_argument(
+            '--stale-days',
+            type=int,
+            help='Select airfields whose timezone was last updated more than this many days ago'
+        )
+        parser.add_argument(
+            '--country',
+            action='append',
+            help='Only airfields in this ISO country (repeatable)'
+        )
+        parser.add_argument(
+            '--type',
+            action='append',
+            help='Only airfields of this type (repeatable)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Number of concurrent lookups (default: 8)'
+        )
+        parser.add_argument(
+            '--qps',
+            type=int,
+            help='Google API calls per second to use at most (default: GOOGLE_TIMEZONE_QPS)'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            default=str(Path(settings.BASE_DIR) / 'data' / 'timezone_backfill.json'),
+            help='File recording progress (default: data/timezone_backfill.json)'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore any existing checkpoint and start from the beginning'
+        )
+
+    def select_airfields(self, options):
+        """Airfields matching the selection filters; without a selector, missing and UTC timezones."""
+        selectors = Q()
+        if options['missing']:
+            selectors |= Q(timezone__isnull=True)
+        if options['utc']:
+            selectors |= Q(timezone__timezone_id='UTC')
+        if options['stale_days'] is not None:
+            cutoff = timezone.now() - timezone.timedelta(days=options['stale_days'])
+            selectors |= Q(timezone_last_updated__isnull=True) | Q(timezone_last_updated__lt=cutoff)
+        if not selectors:
+            selectors = Q(timezone__isnull=True) | Q(timezone__timezone_id='UTC')
+
+        airfields = Airfield.objects.filter(selectors)
+        if options['country']:
+            airfields = airfields.filter(iso_country__in=[c.upper() for c in options['country']])
+        if options['type']:
+            airfields = airfields.filter(type__in=options['type'])
+        return airfields.select_related('timezone').order_by('id')
+
+    def load_checkpoint(self, path, selection):
+        """Return (last completed id, counts) for this selection, or a fresh start."""
+        try:
+            checkpoint = json.loads(Path(path).read_text())
+        except (OSError, ValueError):
+            return None, {}
+        if checkpoint.get('selection') != selection:
+            self.stdout.write(self.style.WARNING('Checkpoint is for different filters; starting over'))
+            return None, {}
+        return checkpoint['last_id'], checkpoint['counts']
+
+    def save_checkpoint(self, path, selection, last_id, counts):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(path.suffix + '.tmp')
+        temp_path.write_text(json.dumps({'selection': selection, 'last_id': last_id, 'counts': counts}))
+        temp_path.replace(path)
+
+    def lookup(self, airfield):
+        """Resolve one airfield on a worker thread; returns (airfield, timezone or None)."""
+        try:
+            return airfield, airfield.resolve_timezone(settings.GOOGLE_MAPS_API_KEY, qps=self.qps)
+        except Exception as e:
+            logger.error(f"Error resolving timezone for {airfield}: {str(e)}", exc_info=True)
+            return airfield, None
+
+    def close_connections(self, pool, workers):
+        """Close the database connection each worker thread opened."""
+        barrier = threading.Barrier(workers)
+
+        def close():
+            # Every thread waits here, so each one runs exactly one close
+            barrier.wait()
+            connection.close()
+
+        for future in [pool.submit(close) for _ in range(workers)]:
+            future.result()
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError('--workers must be at least 1')
+        self.qps = options['qps']
+        selection = {
+            key: options[key] for key in ('missing', 'utc', 'stale_days', 'country', 'type')
+        }
+
+        last_id, counts = (None, {}) if options['restart'] else self.load_checkpoint(options['checkpoint'], selection)
+        counts = {'updated': 0, 'unchanged': 0, 'failed': 0, **counts}
+        airfields = self.select_airfields(options)
+        if last_id is not None:
+            self.stdout.write(f'Resuming after airfield {last_id}')
+            airfields = airfields.filter(id__gt=last_id)
+        total = airfields.count()
+        self.stdout.write(f'{total} airfields to backfill with {workers} workers')
+
+        started = time.monotonic()
+        done = 0
+        changed = False
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='timezone-backfill') as pool:
+            try:
+                while True:
+                    chunk = list(airfields[:self.CHUNK_SIZE])
+                    if not chunk:
+                        break
+
+                    now = timezone.now()
+                    to_update = []
+                    for airfield, timezone_obj in pool.map(self.lookup, chunk):
+                        if timezone_obj is None:
+                            counts['failed'] += 1
+                            continue
+                        if airfield.timezone_id == timezone_obj.pk:
+                            counts['unchanged'] += 1
+                        else:
+                            counts['updated'] += 1
+                            airfield.timezone = timezone_obj
+                            airfield.updated = now
+                            changed = True
+                        airfield.timezone_last_updated = now
+                        to_update.append(airfield)
+                    Airfield.objects.bulk_update(
+                        to_update, ['timezone', 'timezone_last_updated', 'updated'], batch_size=self.CHUNK_SIZE
+                    )
+                    refresh_payloads(airfield.id for airfield in to_update if airfield.updated == now)
+
+                    last_id = chunk[-1].id
+                    self.save_checkpoint(options['checkpoint'], selection, last_id, counts)
+                    airfields = airfields.filter(id__gt=last_id)
+
+                    done += len(chunk)
+                    elapsed = time.monotonic() - started
+                    rate = done / elapsed if elapsed else 0
+                    eta = (total - done) / rate if rate else 0
+                    self.stdout.write(
+                        f'{done}/{total} airfields ({rate:.1f}/s, ETA {eta / 60:.1f} min): '
+                        f"{counts['updated']} updated, {counts['unchanged']} unchanged, {counts['failed']} failed"
+                    )
+            finally:
+                self.close_connections(pool, workers)
+                if changed:
+                    bump_dataset_version()
+
+        Path(options['checkpoint']).unlink(missing_ok=True)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Timezone backfill completed: {counts['updated']} updated, "
+                f"{counts['unchanged']} unchanged, {counts['failed']} failed"
+            )
+        )
@@ -1,17 +1,36 @@
+import codecs
 import csv
+import queue
 import requests
-import tempfile
-from pathlib import Path
+import threading
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
+from airport_info.bulk_import import AirfieldUpserter
+from airport_info.cache import bump_dataset_version
+from airport_info.geohash import encode as encode_geohash
 from airport_info.models import Airfield, TimeZone, DataSource
+from airport_info.payloads import refresh_payloads
+import logging
+
+logger = logging.getLogger(__name__)
+
+# CSV columns read for each airfield, in AirfieldUpserter column order
+CSV_FIELDS = [
+    'id', 'ident', 'type', 'name', 'latitude_deg', 'longitude_deg', 'elevation_ft',
+    'continent', 'iso_country', 'iso_region', 'municipality', 'scheduled_service',
+    'gps_code', 'iata_code', 'local_code', 'home_link', 'wikipedia_link', 'keywords',
+]
 
 
 class Command(BaseCommand):
     help = 'Import airports from CSV file and update only if changes detected'
     
     DEFAULT_URL = 'https://davidmegginson.github.io/ourairports-data/airports.csv'
+    CHUNK_SIZE = 64 * 1024  # bytes per read from the response
+    PREFETCH_CHUNKS = 32  # chunks buffered ahead of the parser
+    BATCH_SIZE = 5000  # rows handed to the writer at a time
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -26,8 +45,8 @@ class Command(BaseCommand):
             help='Force update even if the file was recently downloaded'
         )
 
-    def download_file(self, url):
-        """Download the CSV file and return its path."""
+    def open_source(self, url):
+        """Start downloading the CSV file and return the streaming response and its data source."""
         # Get or create data source record
         data_source, _ = DataSource.objects.get_or_create(
             url=url,
@@ -41,7 +60,7 @@ class Command(BaseCommand):
                     'Data was updated less than 7 days ago. Use --force to override.'
                 )
             )
-            return None
+            return None, data_source
 
         # Only use cache headers if not forcing
         headers = {}
@@ -51,28 +70,131 @@ class Command(BaseCommand):
             if data_source.last_modified:
                 headers['If-Modified-Since'] = data_source.last_modified
 
-        response = requests.get(url, headers=headers, stream=True)
+        response = requests.get(url, headers=headers, stream=True, timeout=60)
 
         # Check if the file has been modified (only if not forcing)
         if not self.force and response.status_code == 304:  # Not Modified
+            response.close()
             self.stdout.write(self.style.SUCCESS('Data is up to date'))
-            return None
+            return None, data_source
 
         if response.status_code != 200:
+            response.close()
             raise Exception(f'Failed to download file: {response.status_code}')
 
-        # Save the new ETag and Last-Modified headers
-        data_source.last_etag = response.headers.get('ETag')
-        data_source.last_modified = response.headers.get('Last-Modified')
-        data_source.save()
+        return response, data_source
 
-        # Save the file to a temporary location
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.csv')
-        for chunk in response.iter_content(chunk_size=8192):
-            temp_file.write(chunk)
-        temp_file.close()
+    def iter_chunks(self, response):
+        """
+        Yield response chunks downloaded on a background thread.
 
-        return temp_file.name
+        The download runs ahead of parsing and writing by at most
+        PREFETCH_CHUNKS chunks, so memory stays bounded while network,
+        parsing and database time overlap.
+        """
+        chunks = queue.Queue(maxsize=self.PREFETCH_CHUNKS)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+
+        def download():
+            try:
+                for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                    if stop.is_set():
+                        return
+                    put(chunk)
+                put(done)
+            except Exception as e:
+                put(e)
+
+        thread = threading.Thread(target=download, name='import-airports-download', daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = chunks.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            response.close()
+            thread.join(timeout=5)
+
+    def iter_lines(self, chunks):
+        """Decode byte chunks incrementally into newline-terminated lines."""
+        decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        pending = ''
+        for chunk in chunks:
+            lines = (pending + decoder.decode(chunk)).split('\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line + '\n'
+        pending += decoder.decode(b'', final=True)
+        if pending:
+            yield pending
+
+    def iter_batches(self, response):
+        """Parse the streamed CSV and yield lists of at most BATCH_SIZE upserter rows."""
+        reader = csv.reader(self.iter_lines(self.iter_chunks(response)))
+        header = next(reader)
+        positions = [header.index(field) for field in CSV_FIELDS]
+
+        batch = []
+        for row in reader:
+            if not row:
+                continue
+            try:
+                batch.append(self.parse_row([row[i] for i in positions]))
+            except Exception as e:
+                self.stdout.write(
+                    self.style.ERROR(f'Error processing airport {row[positions[0]]}: {str(e)}')
+                )
+                self.skipped_count += 1
+                continue
+            if len(batch) >= self.BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def parse_row(self, values):
+        """Convert CSV values in CSV_FIELDS order into a tuple in AirfieldUpserter column order."""
+        (airport_id, ident, airport_type, name, latitude, longitude, elevation_ft,
+         continent, iso_country, iso_region, municipality, scheduled_service,
+         gps_code, iata_code, local_code, home_link, wikipedia_link, keywords) = values
+        latitude = float(latitude or 0)
+        longitude = float(longitude or 0)
+        return (
+            airport_id,
+            ident,
+            airport_type,
+            name,
+            latitude,
+            longitude,
+            float(elevation_ft) if elevation_ft else None,
+            continent or None,
+            iso_country,
+            iso_region or None,
+            municipality or None,
+            # Convert 'yes'/'no' to boolean
+            scheduled_service.lower() == 'yes',
+            gps_code or None,
+            iata_code or None,
+            local_code or None,
+            home_link or None,
+            wikipedia_link or None,
+            keywords or None,
+            encode_geohash(latitude, longitude),
+        )
 
     def handle(self, *args, **options):
         # Imports airport data from airports.csv
@@ -91,80 +213,44 @@ class Command(BaseCommand):
                     self.stdout.write(self.style.SUCCESS('Airport data is up to date'))
                     return
 
-            # Download the file
-            csv_file = self.download_file(url)
-            if not csv_file:
+            # Start the download
+            response, data_source = self.open_source(url)
+            if response is None:
                 return
 
             # Get or create a default timezone (UTC)
             default_timezone, _ = TimeZone.objects.get_or_create(
-                name='UTC',
+                timezone_id='UTC',
                 defaults={
+                    'name': 'UTC',
                     'raw_offset': 0,
                     'dst_offset': 0,
-                    'timezone_id': 'UTC',
                     'timezone_name': 'Coordinated Universal Time'
                 }
             )
 
-            created_count = 0
-            updated_count = 0
-            skipped_count = 0
-            
-            try:
-                with open(csv_file, 'r', encoding='utf-8') as file:
-                    reader = csv.DictReader(file)
-                    
-                    with transaction.atomic():
-                        for row in reader:
-                            # Convert 'yes'/'no' to boolean
-                            scheduled_service = row['scheduled_service'].lower() == 'yes'
-                            
-                            # Prepare the airport data
-                            airport_data = {
-                                'ident': row['ident'],
-                                'type': row['type'],
-                                'name': row['name'],
-                                'latitude': float(row['latitude_deg'] or 0),
-                                'longitude': float(row['longitude_deg'] or 0),
-                                'elevation_ft': float(row['elevation_ft'] or 0) if row['elevation_ft'] else None,
-                                'continent': row['continent'] or None,
-                                'iso_country': row['iso_country'],
-                                'iso_region': row['iso_region'] or None,
-                                'municipality': row['municipality'] or None,
-                                'scheduled_service': scheduled_service,
-                                'gps_code': row['gps_code'] or None,
-                                'iata_code': row['iata_code'] or None,
-                                'local_code': row['local_code'] or None,
-                                'home_link': row['home_link'] or None,
-                                'wikipedia_link': row['wikipedia_link'] or None,
-                                'keywords': row['keywords'] or None,
-                                'timezone': default_timezone,
-                            }
-
-                            try:
-                                airport, created = Airfield.objects.update_or_create(
-                                    id=row['id'],
-                                    defaults=airport_data
-                                )
-                                
-                                if created:
-                                    created_count += 1
-                                else:
-                                    updated_count += 1
-                                    
-                            except Exception as e:
-                                self.stdout.write(
-                                    self.style.ERROR(
-                                        f'Error processing airport {row["id"]}: {str(e)}'
-                                    )
-                                )
-                                skipped_count += 1
-                                continue
-
-            finally:
-                # Clean up the temporary file
-                Path(csv_file).unlink()
+            self.skipped_count = 0
+            started = timezone.now()
+            with transaction.atomic(), AirfieldUpserter(default_timezone) as upserter:
+                for batch in self.iter_batches(response):
+                    upserter.write(batch)
+
+            created_count = upserter.created
+            updated_count = upserter.updated
+            unchanged_count = upserter.unchanged
+            skipped_count = self.skipped_count + upserter.duplicate_ids
+            removed_ids = upserter.removed_ids()
+
+            # Re-render the stored responses of airfields this import touched
+            rendered_count = refresh_payloads(
+                Airfield.objects.filter(Q(updated__gte=started) | Q(payload__isnull=True))
+                .order_by().values_list('id', flat=True)
+            )
+
+            # Only remember the ETag and Last-Modified headers once the data is stored
+            data_source.last_etag = response.headers.get('ETag')
+            data_source.last_modified = response.headers.get('Last-Modified')
+            data_source.save()
 
         except Exception as e:
             self.stdout.write(
@@ -172,9 +258,20 @@ class Command(BaseCommand):
             )
             return
 
+        if created_count or updated_count:
+            bump_dataset_version()
+
+        if removed_ids:
+            logger.info(f"Airfields no longer in source: {', '.join(removed_ids)}")
+            shown = ', '.join(removed_ids[:20]) + (', ...' if len(removed_ids) > 20 else '')
+            self.stdout.write(
+                self.style.WARNING(f'{len(removed_ids)} airfields are no longer in the source: {shown}')
+            )
+
         self.stdout.write(
             self.style.SUCCESS(
                 f'Import completed: {created_count} created, '
-                f'{updated_count} updated, {skipped_count} skipped'
+                f'{updated_count} updated, {unchanged_count} unchanged, '
+                f'{skipped_count} skipped, {rendered_count} payloads rendered'
             )
         ) 
\ No newline at end of file
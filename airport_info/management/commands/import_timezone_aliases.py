@@ -1,8 +1,14 @@
+import os
 import requests
-import xml.etree.ElementTree as ET
+import tempfile
+from pathlib import Path
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
+from airport_info.cache import bump_dataset_version
 from airport_info.models import TimeZone, DataSource
+from airport_info.payloads import drop_timezone_payloads
+from airport_info.tzaliases import parse_aliases
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,69 +27,61 @@ class Command(BaseCommand):
         )
 
     def download_timezone_data(self):
-        """Download the timezone XML file and return its content."""
+        """
+        Start downloading the timezone XML file.
+
+        Returns the streaming response and its data source, or (None, data_source)
+        when the file is unchanged since the last import or the download failed.
+        """
         # Get or create data source record
         data_source, _ = DataSource.objects.get_or_create(
             url=self.TIMEZONE_URL,
             defaults={'last_download': timezone.now() - timezone.timedelta(days=self.UPDATE_INTERVAL + 1)}
         )
 
-        # Make the request without using cached headers for this run
+        # Only use cache headers if not forcing and the local snapshot is still there
+        headers = {}
+        if not self.force and self.snapshot_path.exists():
+            if data_source.last_etag:
+                headers['If-None-Match'] = data_source.last_etag
+            if data_source.last_modified:
+                headers['If-Modified-Since'] = data_source.last_modified
+
         try:
-            response = requests.get(self.TIMEZONE_URL)
+            response = requests.get(self.TIMEZONE_URL, headers=headers, stream=True, timeout=60)
+            if response.status_code == 304:  # Not Modified
+                response.close()
+                self.stdout.write(self.style.SUCCESS('Timezone data is up to date'))
+                return None, data_source
             if response.status_code != 200:
+                response.close()
                 raise Exception(f'Failed to download timezone data: {response.status_code}')
 
-            # Save the new ETag and Last-Modified headers
-            data_source.last_etag = response.headers.get('ETag')
-            data_source.last_modified = response.headers.get('Last-Modified')
-            data_source.last_download = timezone.now()
-            data_source.save()
-
-            return response.text
+            return response, data_source
 
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Error downloading timezone data: {str(e)}')
             )
-            return None
+            return None, data_source
 
-    def parse_timezone_aliases(self, xml_content):
-        """Parse the XML content and extract timezone aliases."""
+    def save_snapshot(self, response):
+        """Stream the downloaded XML to the local snapshot file, replacing it atomically."""
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.snapshot_path.parent, suffix='.tmp')
         try:
-            root = ET.fromstring(xml_content)
-            timezone_map = {}
-
-            # Find the timezone keyword
-            for keyword in root.findall(".//key"):
-                if keyword.get('name') == 'tz':
-                    # Process each timezone type
-                    for type_elem in keyword.findall('.//type'):
-                        alias_attr = type_elem.get('alias')
-                        iana_attr = type_elem.get('iana')
-                        
-                        if alias_attr:
-                            # Split the alias attribute into list
-                            all_names = alias_attr.split(' ')
-                            if all_names:
-                                # First name is the canonical ID
-                                canonical_id = all_names[0]
-                                aliases = set(all_names[1:]) if len(all_names) > 1 else set()
-                                
-                                # Add IANA names if they differ from canonical and aliases
-                                if iana_attr:
-                                    iana_names = set(iana_attr.split(' '))
-                                    aliases.update(iana_names)
-                                
-                                # Store both ways for lookup
-                                timezone_map[canonical_id] = aliases
-                                
-                                # Also store mapping for IANA canonical name if different
-                                if iana_attr and iana_attr != canonical_id:
-                                    iana_canonical = iana_attr.split(' ')[0]
-                                    timezone_map[iana_canonical] = {canonical_id}.union(aliases - {iana_canonical})
-
-            return timezone_map
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+            os.replace(temp_path, self.snapshot_path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+
+    def parse_timezone_aliases(self, source):
+        """Parse the XML snapshot into an AliasIndex."""
+        try:
+            return parse_aliases(source)
 
         except Exception as e:
             self.stdout.write(
@@ -91,68 +89,69 @@ class Command(BaseCommand):
             )
             return None
 
-    def update_timezone_aliases(self, timezone_map):
-        """Update timezone records with alias information."""
-        updated_count = 0
+    def update_timezone_aliases(self, alias_index):
+        """Update timezone records whose aliases changed; returns (updated, unchanged, skipped)."""
+        changed = []
+        unchanged_count = 0
         skipped_count = 0
 
-        # Now update timezone records
-        for timezone in TimeZone.objects.all():
-            try:
-                if timezone.timezone_id:
-                    # Get the aliases directly from the timezone_map
-                    aliases = set()
-                    
-                    # Check if this timezone_id is a canonical ID
-                    if timezone.timezone_id in timezone_map:
-                        aliases.update(timezone_map[timezone.timezone_id])
-                    else:
-                        # Check if this timezone_id is an alias
-                        for canonical_id, alias_list in timezone_map.items():
-                            if timezone.timezone_id in alias_list:
-                                # Add the canonical ID and other aliases
-                                aliases.update([canonical_id])
-                                aliases.update(alias_list)
-                                # Remove self from aliases
-                                aliases.discard(timezone.timezone_id)
-                                break
-                    
-                    # Store aliases as space-separated string
-                    timezone.aliases = ' '.join(sorted(aliases)) if aliases else ''
-                    timezone.save()
-                    updated_count += 1
-                    self.stdout.write(f"Updated {timezone.timezone_id} with aliases: {aliases}")
-                else:
-                    skipped_count += 1
-                    logger.warning("Skipped timezone with no ID")
-
-            except Exception as e:
+        for tz in TimeZone.objects.only('id', 'timezone_id', 'aliases'):
+            if not tz.timezone_id:
                 skipped_count += 1
-                logger.error(f"Error updating timezone {timezone.timezone_id}: {str(e)}")
-
-        return updated_count, skipped_count
+                logger.warning("Skipped timezone with no ID")
+                continue
+
+            # Store aliases as space-separated string
+            aliases = ' '.join(sorted(alias_index.aliases(tz.timezone_id)))
+            if (tz.aliases or '') == aliases:
+                unchanged_count += 1
+                continue
+            tz.aliases = aliases
+            changed.append(tz)
+            logger.info(f"Updated {tz.timezone_id} with aliases: {aliases}")
+
+        TimeZone.objects.bulk_update(changed, ['aliases'], batch_size=500)
+        drop_timezone_payloads(tz.pk for tz in changed)
+        return len(changed), unchanged_count, skipped_count
 
     def handle(self, *args, **options):
         # Imports timezone aliases
-        # This is typically run once to set up timezone mappings
+        # Run on a schedule to refresh the CLDR snapshot and the stored aliases
         self.force = options['force']
-        
-        # Download the timezone data
-        xml_content = self.download_timezone_data()
-        if not xml_content:
+        self.snapshot_path = Path(settings.TIMEZONE_ALIASES_FILE)
+
+        # Download the timezone data into the local snapshot read by the alias registry
+        response, data_source = self.download_timezone_data()
+        if response is None:
             return
+        with response:
+            try:
+                self.save_snapshot(response)
+            except Exception as e:
+                self.stdout.write(
+                    self.style.ERROR(f'Error saving timezone data: {str(e)}')
+                )
+                return
 
         # Parse the timezone aliases
-        timezone_map = self.parse_timezone_aliases(xml_content)
-        if not timezone_map:
+        alias_index = self.parse_timezone_aliases(str(self.snapshot_path))
+        if not alias_index:
             return
 
         # Update the timezone records
-        updated_count, skipped_count = self.update_timezone_aliases(timezone_map)
+        updated_count, unchanged_count, skipped_count = self.update_timezone_aliases(alias_index)
+        if updated_count:
+            bump_dataset_version()
+
+        # Only remember the ETag and Last-Modified headers once the aliases are stored
+        data_source.last_etag = response.headers.get('ETag')
+        data_source.last_modified = response.headers.get('Last-Modified')
+        data_source.last_download = timezone.now()
+        data_source.save()
 
         self.stdout.write(
             self.style.SUCCESS(
                 f'Timezone update completed: {updated_count} updated, '
-                f'{skipped_count} skipped'
+                f'{unchanged_count} unchanged, {skipped_count} skipped'
             )
-        ) 
\ No newline at end of file
+        )
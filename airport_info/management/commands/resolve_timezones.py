@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from airport_info.cache import bump_dataset_version
+from airport_info.models import Airfield
+from airport_info.payloads import refresh_payloads
+from airport_info.tzresolver import TimeZoneResolver, get_or_create_timezone, get_resolver, nautical_timezone_id
+from collections import defaultdict
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Resolve timezones for all airfields offline from timezone boundary data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            type=str,
+            help='Timezone boundary GeoJSON (default: settings.TIMEZONE_BOUNDARIES_FILE)'
+        )
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only resolve airfields without a timezone or with the UTC placeholder'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        resolver = TimeZoneResolver.from_file(options['file']) if options['file'] else get_resolver()
+        if resolver is None:
+            raise CommandError('No timezone boundary file found; set TIMEZONE_BOUNDARIES_FILE or pass --file')
+        self.stdout.write(f"Loaded {len(resolver.timezone_ids)} polygons in {time.monotonic() - started:.1f}s")
+
+        airfields = Airfield.objects.order_by()
+        if options['missing_only']:
+            airfields = airfields.filter(Q(timezone__isnull=True) | Q(timezone__timezone_id='UTC'))
+
+        # Group airfields by resolved zone so each zone is written with one UPDATE
+        started = time.monotonic()
+        by_zone = defaultdict(list)
+        current = {}
+        rows = airfields.values_list('id', 'latitude', 'longitude', 'timezone__timezone_id')
+        for airfield_id, latitude, longitude, current_id in rows.iterator(chunk_size=5000):
+            timezone_id = resolver.resolve(latitude, longitude) or nautical_timezone_id(longitude)
+            by_zone[timezone_id].append(airfield_id)
+            current[airfield_id] = current_id
+        resolved_count = len(current)
+        self.stdout.write(
+            f"Resolved {resolved_count} airfields into {len(by_zone)} timezones "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+
+        now = timezone.now()
+        updated_count = 0
+        skipped_count = 0
+        updated_ids = []
+        for timezone_id, airfield_ids in by_zone.items():
+            timezone_obj = get_or_create_timezone(timezone_id)
+            if timezone_obj is None:
+                skipped_count += len(airfield_ids)
+                continue
+            changed = [airfield_id for airfield_id in airfield_ids if current[airfield_id] != timezone_id]
+            for i in range(0, len(changed), 1000):
+                updated_count += Airfield.objects.filter(id__in=changed[i:i + 1000]).update(
+                    timezone=timezone_obj,
+                    timezone_last_updated=now,
+                    updated=now
+                )
+            updated_ids.extend(changed)
+
+        refresh_payloads(updated_ids)
+        if updated_count:
+            bump_dataset_version()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Timezone resolution completed: {updated_count} updated, '
+                f'{resolved_count - updated_count - skipped_count} unchanged, '
+                f'{skipped_count} skipped'
+            )
+        )
@@ -0,0 +1,111 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from airport_info.models import TimeZoneRefreshJob
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Process queued timezone refreshes in the background'
+
+    MAX_ATTEMPTS = 5
+    RETRY_DELAY = 60  # seconds, doubled after every failed attempt
+    STALE_AFTER = 10  # minutes before a running job is considered abandoned
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Number of jobs to claim at a time (default: 20)'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=5,
+            help='Seconds to wait when the queue is empty (default: 5)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of polling'
+        )
+
+    def claim_jobs(self, batch_size):
+        """Mark a batch of due jobs as running and return them."""
+        now = timezone.now()
+
+        # Jobs left running by a worker that died go back on the queue
+        TimeZoneRefreshJob.objects.filter(
+            status=TimeZoneRefreshJob.STATUS_RUNNING,
+            updated__lt=now - timezone.timedelta(minutes=self.STALE_AFTER)
+        ).update(status=TimeZoneRefreshJob.STATUS_PENDING, updated=now)
+
+        with transaction.atomic():
+            jobs = list(
+                TimeZoneRefreshJob.objects.select_for_update(skip_locked=True)
+                .select_related('airfield', 'airfield__timezone')
+                .filter(status=TimeZoneRefreshJob.STATUS_PENDING, run_after__lte=now)
+                .order_by('run_after')[:batch_size]
+            )
+            TimeZoneRefreshJob.objects.filter(
+                pk__in=[job.pk for job in jobs]
+            ).update(status=TimeZoneRefreshJob.STATUS_RUNNING, updated=now)
+        return jobs
+
+    def process_job(self, job):
+        job.attempts += 1
+        try:
+            result = job.airfield.update_timezone(settings.GOOGLE_MAPS_API_KEY)
+            error = None if result else 'Timezone lookup failed'
+        except Exception as e:
+            logger.error(f"Error refreshing timezone for {job.airfield}: {str(e)}", exc_info=True)
+            error = str(e)
+
+        if error is None:
+            job.status = TimeZoneRefreshJob.STATUS_DONE
+            job.last_error = None
+        elif job.attempts >= self.MAX_ATTEMPTS:
+            job.status = TimeZoneRefreshJob.STATUS_FAILED
+            job.last_error = error
+        else:
+            job.status = TimeZoneRefreshJob.STATUS_PENDING
+            job.last_error = error
+            job.run_after = timezone.now() + timezone.timedelta(
+                seconds=self.RETRY_DELAY * 2 ** (job.attempts - 1)
+            )
+        job.save(update_fields=['status', 'attempts', 'run_after', 'last_error', 'updated'])
+        return error is None
+
+    def handle(self, *args, **options):
+        self.stdout.write('Timezone refresh worker started')
+        processed = 0
+        failed = 0
+
+        while True:
+            jobs = self.claim_jobs(options['batch_size'])
+            if not jobs:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            for job in jobs:
+                if self.process_job(job):
+                    processed += 1
+                    self.stdout.write(f"Refreshed timezone for {job.airfield}")
+                else:
+                    failed += 1
+                    self.stdout.write(
+                        self.style.WARNING(f"Failed to refresh timezone for {job.airfield}: {job.last_error}")
+                    )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Timezone worker finished: {processed} refreshed, {failed} failed'
+            )
+        )
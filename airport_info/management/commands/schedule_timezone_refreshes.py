@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.utils import timezone
+from airport_info.hits import hit_counter
+from airport_info.models import Airfield, AirfieldAccess, TimeZoneRefreshJob
+from airport_info.tasks import enqueue_timezone_refresh
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Queue timezone refreshes for stale airfields, most requested first, within a daily API budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget',
+            type=int,
+            default=settings.TIMEZONE_REFRESH_DAILY_BUDGET,
+            help='Maximum number of refreshes to queue (default: TIMEZONE_REFRESH_DAILY_BUDGET)'
+        )
+        parser.add_argument(
+            '--include-unrequested',
+            action='store_true',
+            help='Spend budget left over after requested airfields on ones nobody has looked up'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be queued without queueing anything'
+        )
+
+    def select_airfields(self, budget, include_unrequested):
+        """Stale airfields ordered by hit count, then by how long ago they were refreshed."""
+        cutoff = timezone.now() - timezone.timedelta(days=settings.TIMEZONE_STALE_DAYS)
+        stale = Airfield.objects.filter(
+            Q(timezone_last_updated__isnull=True) | Q(timezone_last_updated__lt=cutoff)
+        ).exclude(
+            timezone_refresh_job__status__in=TimeZoneRefreshJob.ACTIVE_STATUSES
+        ).order_by(
+            F('access__hit_count').desc(nulls_last=True),
+            F('timezone_last_updated').asc(nulls_first=True),
+        )
+        if not include_unrequested:
+            stale = stale.filter(access__hit_count__gt=0)
+        return list(stale.values_list('id', 'access__hit_count', 'timezone_last_updated')[:budget])
+
+    def handle(self, *args, **options):
+        # Count this process's buffered hits too
+        hit_counter.flush()
+
+        selected = self.select_airfields(options['budget'], options['include_unrequested'])
+        for airfield_id, hit_count, last_updated in selected[:20]:
+            self.stdout.write(f"{airfield_id}: {hit_count or 0} hits, last refreshed {last_updated or 'never'}")
+        if len(selected) > 20:
+            self.stdout.write(f"... and {len(selected) - 20} more")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Would queue {len(selected)} timezone refreshes'))
+            return
+
+        queued = enqueue_timezone_refresh(airfield_id for airfield_id, _, _ in selected)
+
+        # Halve every count so priorities follow recent demand
+        AirfieldAccess.objects.filter(hit_count__gt=0).update(hit_count=F('hit_count') / 2)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Queued {queued} timezone refreshes (budget {options["budget"]})'
+            )
+        )
@@ -2,7 +2,6 @@ from django.core.management.base import BaseCommand
 from django.conf import settings
 from airport_info.models import Airfield
 import logging
-import time
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +12,7 @@ class Command(BaseCommand):
         parser.add_argument(
             'airport_ids',
             nargs='+',
-            type=int,
+            type=str,
             help='IDs of airports to update'
         )
 
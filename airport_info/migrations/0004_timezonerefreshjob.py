@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport_info', '0003_airfield_timezone_last_updated_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeZoneRefreshJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('airfield', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='timezone_refresh_job', to='airport_info.airfield')),
+            ],
+            options={
+                'ordering': ['run_after'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='airport_inf_status_a9b26d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+def populate_geohash(apps, schema_editor):
+    from airport_info.geohash import encode
+
+    Airfield = apps.get_model('airport_info', 'Airfield')
+    batch = []
+    for airfield in Airfield.objects.only('id', 'latitude', 'longitude').iterator(chunk_size=5000):
+        airfield.geohash = encode(airfield.latitude, airfield.longitude)
+        batch.append(airfield)
+        if len(batch) >= 5000:
+            Airfield.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        Airfield.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport_info', '0004_timezonerefreshjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airfield',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12, null=True),
+        ),
+        migrations.RunPython(populate_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport_info', '0005_airfield_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airfield',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+    ]
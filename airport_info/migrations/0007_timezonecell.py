@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport_info', '0006_airfield_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeZoneCell',
+            fields=[
+                ('cell', models.CharField(max_length=12, primary_key=True, serialize=False)),
+                ('border', models.BooleanField(default=False)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('timezone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cells', to='airport_info.timezone')),
+            ],
+        ),
+    ]
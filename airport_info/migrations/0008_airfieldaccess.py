@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport_info', '0007_timezonecell'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AirfieldAccess',
+            fields=[
+                ('airfield', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='access', serialize=False, to='airport_info.airfield')),
+                ('hit_count', models.IntegerField(default=0)),
+                ('last_hit', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-hit_count'], name='airport_inf_hit_cou_c72cb2_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport_info', '0008_airfieldaccess'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AirfieldPayload',
+            fields=[
+                ('airfield', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='payload', serialize=False, to='airport_info.airfield')),
+                ('body', models.BinaryField()),
+                ('gzip_body', models.BinaryField()),
+                ('valid_until', models.DateTimeField(blank=True, null=True)),
+                ('rendered', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport_info', '0009_airfieldpayload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airfieldpayload',
+            name='etag',
+            field=models.CharField(default='', max_length=34),
+        ),
+        migrations.AddField(
+            model_name='airfieldpayload',
+            name='last_modified',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
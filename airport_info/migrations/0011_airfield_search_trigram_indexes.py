@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# Columns searched with pg_trgm when AIRPORT_SEARCH_BACKEND is 'postgres'
+SEARCH_COLUMNS = ['name', 'municipality', 'keywords']
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Only PostgreSQL has pg_trgm; other databases use the in-memory search index
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS airport_info_airfield_{column}_trgm '
+            f'ON airport_info_airfield USING gin ({column} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS airport_info_airfield_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport_info', '0010_airfieldpayload_etag_last_modified'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport_info', '0011_airfield_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='airfield',
+            name='airport_inf_iso_cou_d23f35_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='airfield',
+            name='airport_inf_iso_reg_c8564b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='airfield',
+            name='airport_inf_type_9771d6_idx',
+        ),
+        migrations.AddIndex(
+            model_name='airfield',
+            index=models.Index(fields=['iso_country', 'id'], name='airport_inf_iso_cou_f6d8f9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='airfield',
+            index=models.Index(fields=['iso_region', 'id'], name='airport_inf_iso_reg_a28519_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='airfield',
+            index=models.Index(fields=['type', 'id'], name='airport_inf_type_3da7e6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='airfield',
+            index=models.Index(fields=['scheduled_service', 'id'], name='airport_inf_schedul_9a9d84_idx'),
+        ),
+    ]
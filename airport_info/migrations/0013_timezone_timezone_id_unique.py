@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:21
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_timezones(apps, schema_editor):
+    """Point airfields and cells at the oldest row of each timezone_id and delete the other rows."""
+    TimeZone = apps.get_model('airport_info', 'TimeZone')
+    Airfield = apps.get_model('airport_info', 'Airfield')
+    TimeZoneCell = apps.get_model('airport_info', 'TimeZoneCell')
+
+    TimeZone.objects.filter(timezone_id='').update(timezone_id=None)
+    duplicated = (
+        TimeZone.objects.exclude(timezone_id=None).values('timezone_id')
+        .annotate(rows=Count('id')).filter(rows__gt=1).values_list('timezone_id', flat=True)
+    )
+    for timezone_id in list(duplicated):
+        ids = list(TimeZone.objects.filter(timezone_id=timezone_id).order_by('id').values_list('id', flat=True))
+        keep, duplicates = ids[0], ids[1:]
+        Airfield.objects.filter(timezone_id__in=duplicates).update(timezone_id=keep)
+        TimeZoneCell.objects.filter(timezone_id__in=duplicates).update(timezone_id=keep)
+        TimeZone.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport_info', '0012_airfield_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_timezones, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='timezone',
+            name='timezone_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from datetime import timedelta
 import logging
+from .cache import drop_cached_responses
 
 
 class DataSource(models.Model):
@@ -33,7 +35,7 @@ class TimeZone(models.Model):
         null=True,
         blank=True
     )
-    timezone_id = models.CharField(max_length=100, null=True, blank=True)  # e.g., "America/Los_Angeles"
+    timezone_id = models.CharField(max_length=100, unique=True, null=True, blank=True)  # e.g., "America/Los_Angeles"
     timezone_name = models.CharField(max_length=100, null=True, blank=True)  # e.g., "Pacific Daylight Time"
     aliases = models.TextField(null=True, blank=True, help_text="Space-separated list of timezone aliases")
     last_updated = models.DateTimeField(null=True, blank=True)
@@ -95,6 +97,8 @@ class Airfield(models.Model):
     home_link = models.URLField(max_length=500, null=True, blank=True)
     wikipedia_link = models.URLField(max_length=500, null=True, blank=True)
     keywords = models.TextField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, null=True, blank=True, db_index=True)  # derived from latitude/longitude
+    content_hash = models.CharField(max_length=32, null=True, blank=True)  # hash of the imported CSV values
 
     # Existing fields we want to keep
     timezone = models.ForeignKey(
@@ -108,88 +112,124 @@ class Airfield(models.Model):
     timezone_last_updated = models.DateTimeField(null=True, blank=True)
 
     def needs_timezone_update(self):
-        """Return True if timezone needs to be updated"""
+        """
+        Return True if the airfield has no resolved timezone yet.
+
+        Refreshing resolved timezones by age is left to the
+        schedule_timezone_refreshes command, which spends the API budget on
+        the airfields clients actually ask for.
+        """
+        return self.timezone_id is None or not self.timezone_last_updated
+
+    def timezone_is_stale(self):
+        """Return True if the timezone was resolved more than TIMEZONE_STALE_DAYS ago"""
         if not self.timezone_last_updated:
             return True
-        
-        thirty_days_ago = timezone.now() - timezone.timedelta(days=30)
-        return self.timezone_last_updated < thirty_days_ago
+        return self.timezone_last_updated < timezone.now() - timezone.timedelta(days=settings.TIMEZONE_STALE_DAYS)
     
     def update_timezone_if_needed(self, api_key):
         """Update timezone only if needed"""
         if self.needs_timezone_update():
-            old_timezone_id = self.timezone.timezone_id if self.timezone else None
-            updated = self.update_timezone(api_key)
-            if updated and (not old_timezone_id or old_timezone_id != updated.timezone_id):
-                # Only update aliases if we got a new timezone
-                from django.core.management import call_command
-                call_command('import_timezone_aliases')
-            return updated
+            # New zones get their aliases when created; import_timezone_aliases refreshes the rest
+            return self.update_timezone(api_key)
         return False
 
     def update_timezone(self, api_key):
-        """Update timezone information using Google Maps API if needed."""
+        """
+        Update timezone information, resolving it locally from the timezone
+        boundary data when available, then from the coordinate cell cache,
+        and via the Google Maps API otherwise.
+        """
         import logging
         logger = logging.getLogger(__name__)
-        
+
+        timezone_obj = self.resolve_timezone(api_key)
+        if not timezone_obj:
+            return None
+
+        self.timezone = timezone_obj
+        self.timezone_last_updated = timezone.now()
+        self.save()
+        from .payloads import refresh_payloads
+        refresh_payloads([self.id])
+        # Only this airfield's responses changed; the rest of the cache stays warm
+        drop_cached_responses([self])
+        logger.info(f"Successfully updated timezone for {self}: {timezone_obj}")
+        return timezone_obj
+
+    def resolve_timezone(self, api_key, qps=None):
+        """
+        Return the TimeZone for this airfield's location without saving the airfield.
+
+        qps optionally caps the Google calls made for this lookup below
+        GOOGLE_TIMEZONE_QPS. Returns None if the timezone could not be resolved.
+        """
+        import logging
+        logger = logging.getLogger(__name__)
+
+        from .tzresolver import get_or_create_timezone, resolve_timezone_id
+        timezone_id = resolve_timezone_id(self.latitude, self.longitude)
+        timezone_obj = get_or_create_timezone(timezone_id) if timezone_id else None
+        if timezone_obj:
+            logger.info(f"Resolved timezone for {self} locally: {timezone_obj}")
+            return timezone_obj
+
+        # Reuse the timezone of nearby airfields unless this one may be near a zone border
+        from .tzcells import cell_timezone, record_cell_timezone
+        timezone_obj = cell_timezone(self.latitude, self.longitude)
+        if timezone_obj:
+            logger.info(f"Resolved timezone for {self} from its coordinate cell: {timezone_obj}")
+            return timezone_obj
+
         logger.info(f"Using API key: {api_key[:10]}...")  # Only log first 10 chars for security
         
         if not api_key:
             logger.error("No API key provided")
             return None
 
-        import requests
-        import time
-
-        timestamp = int(time.time())
-        url = (
-            f"https://maps.googleapis.com/maps/api/timezone/json"
-            f"?location={self.latitude},{self.longitude}"
-            f"&timestamp={timestamp}"
-            f"&key={api_key}"
-        )
+        from .google_timezone import GoogleTimeZoneError, client
+        from .tzaliases import get_alias_index
 
         try:
-            logger.info(f"Making API request for {self} to URL: {url.replace(api_key, 'REDACTED')}")
-            response = requests.get(url)
-            logger.info(f"API Response status: {response.status_code}")
-            
-            if response.status_code == 200:
-                data = response.json()
-                logger.info(f"API Response data: {data}")
-                
-                if data['status'] == 'OK':
-                    try:
-                        timezone_obj = TimeZone.objects.filter(timezone_id=data['timeZoneId']).first()
-                        if not timezone_obj:
-                            logger.info(f"Creating new timezone object for {data['timeZoneId']}")
-                            timezone_obj = TimeZone.objects.create(
-                                timezone_id=data['timeZoneId'],
-                                name=data['timeZoneId'],
-                                raw_offset=data['rawOffset'],
-                                dst_offset=data['dstOffset'],
-                                timezone_name=data['timeZoneName'],
-                                last_updated=timezone.now()
-                            )
-                        else:
-                            logger.info(f"Updating existing timezone object for {data['timeZoneId']}")
-                            timezone_obj.raw_offset = data['rawOffset']
-                            timezone_obj.dst_offset = data['dstOffset']
-                            timezone_obj.timezone_name = data['timeZoneName']
-                            timezone_obj.last_updated = timezone.now()
-                            timezone_obj.save()
-                        
-                        self.timezone = timezone_obj
-                        self.timezone_last_updated = timezone.now()
-                        self.save()
-                        logger.info(f"Successfully updated timezone for {self}: {timezone_obj}")
-                        return timezone_obj
-                    except Exception as e:
-                        logger.error(f"Database error updating timezone for {self}: {str(e)}", exc_info=True)
+            logger.info(f"Making API request for {self}")
+            try:
+                data = client.lookup(self.latitude, self.longitude, api_key, qps=qps)
+            except GoogleTimeZoneError as e:
+                logger.error(f"API Error for {self}: {str(e)}")
+                return None
+            logger.info(f"API Response data: {data}")
+
+            try:
+                # Concurrent lookups may race to create the zone; get_or_create
+                # retries the get when the unique timezone_id rejects the insert
+                timezone_obj, created = TimeZone.objects.get_or_create(
+                    timezone_id=data['timeZoneId'],
+                    defaults={
+                        'name': data['timeZoneId'],
+                        'raw_offset': data['rawOffset'],
+                        'dst_offset': data['dstOffset'],
+                        'timezone_name': data['timeZoneName'],
+                        'aliases': ' '.join(sorted(get_alias_index().aliases(data['timeZoneId']))),
+                        'last_updated': timezone.now(),
+                    }
+                )
+                if created:
+                    logger.info(f"Created new timezone object for {data['timeZoneId']}")
                 else:
-                    logger.error(f"API Error for {self}: {data['status']} - {data.get('error_message', 'No error message')}")
-            else:
-                logger.error(f"HTTP Error: {response.status_code} - {response.text}")
+                    logger.info(f"Updating existing timezone object for {data['timeZoneId']}")
+                    timezone_obj.raw_offset = data['rawOffset']
+                    timezone_obj.dst_offset = data['dstOffset']
+                    timezone_obj.timezone_name = data['timeZoneName']
+                    timezone_obj.last_updated = timezone.now()
+                    timezone_obj.save()
+                    # Every airfield in the zone embeds the refreshed row
+                    from .payloads import drop_timezone_payloads
+                    drop_timezone_payloads([timezone_obj.pk])
+
+                record_cell_timezone(self.latitude, self.longitude, timezone_obj)
+                return timezone_obj
+            except Exception as e:
+                logger.error(f"Database error updating timezone for {self}: {str(e)}", exc_info=True)
         except Exception as e:
             logger.error(f"Error updating timezone for {self}: {str(e)}", exc_info=True)
         
@@ -204,8 +244,107 @@ class Airfield(models.Model):
             models.Index(fields=['iata_code']),
             models.Index(fields=['ident']),
             models.Index(fields=['municipality']),
-            models.Index(fields=['iso_country']),
-            models.Index(fields=['iso_region']),
-            models.Index(fields=['type']),
+            # Filters on the list endpoint, which pages in id order
+            models.Index(fields=['iso_country', 'id']),
+            models.Index(fields=['iso_region', 'id']),
+            models.Index(fields=['type', 'id']),
+            models.Index(fields=['scheduled_service', 'id']),
             models.Index(fields=['updated']),
         ]
+
+
+class TimeZoneRefreshJob(models.Model):
+    """Queued request to refresh an airfield's timezone outside the HTTP request."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = [STATUS_PENDING, STATUS_RUNNING]
+
+    airfield = models.OneToOneField(
+        Airfield,
+        on_delete=models.CASCADE,
+        related_name='timezone_refresh_job'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.IntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Timezone refresh for {self.airfield_id} ({self.status})"
+
+    class Meta:
+        ordering = ['run_after']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+
+class TimeZoneCell(models.Model):
+    """
+    Timezone shared by the airfields in a small geohash cell.
+
+    Filled from exact (upstream) lookups so nearby airfields can reuse a
+    neighbour's result. A cell in which two different timezones were seen
+    is flagged as a border cell and never answers lookups.
+    """
+    cell = models.CharField(max_length=12, primary_key=True)  # geohash of the cell
+    timezone = models.ForeignKey(TimeZone, on_delete=models.CASCADE, related_name='cells')
+    border = models.BooleanField(default=False)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.cell}: {self.timezone.timezone_id}{' (border)' if self.border else ''}"
+
+
+class AirfieldAccess(models.Model):
+    """How often clients look an airfield up, used to prioritise timezone refreshes."""
+    airfield = models.OneToOneField(
+        Airfield,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='access'
+    )
+    hit_count = models.IntegerField(default=0)  # halved after every refresh scheduling run
+    last_hit = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.airfield_id}: {self.hit_count} hits"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-hit_count']),
+        ]
+
+
+class AirfieldPayload(models.Model):
+    """
+    Pre-rendered lookup response for an airfield, as JSON and gzip-compressed JSON.
+
+    Maintained by airport_info.payloads; see there for when payloads are
+    re-rendered.
+    """
+    airfield = models.OneToOneField(
+        Airfield,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='payload'
+    )
+    body = models.BinaryField()
+    gzip_body = models.BinaryField()
+    valid_until = models.DateTimeField(null=True, blank=True)  # next UTC offset transition of the timezone
+    etag = models.CharField(max_length=34, default='')  # quoted hash of body
+    last_modified = models.DateTimeField(null=True, blank=True)  # latest change to anything in body
+    rendered = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Payload for {self.airfield_id}"
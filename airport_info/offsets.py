@@ -0,0 +1,111 @@
+"""
+UTC offsets computed locally from the IANA timezone database.
+
+Offsets, DST and abbreviation stay constant between transitions, so the
+result for each zone is memoized together with the interval it holds for
+and recomputed only once that interval has passed. Spans looked up for
+other instants (?at=) are kept per zone as well.
+"""
+from bisect import bisect_right, insort
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import threading
+import time
+
+# Transitions are searched for this far either side of an instant; zones
+# without one in that span are re-checked once it has passed
+SEARCH_SECONDS = 400 * 86400
+STEP_SECONDS = 86400
+MAX_SPANS = 64  # historical spans kept per zone
+
+ZoneOffsets = namedtuple(
+    'ZoneOffsets', ['raw_offset', 'dst_offset', 'abbreviation', 'valid_from', 'valid_until']
+)
+
+_memo = {}  # timezone_id -> span containing the current time
+_spans = {}  # timezone_id -> other spans looked up, ordered by valid_from
+_spans_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _zone(timezone_id):
+    try:
+        return ZoneInfo(timezone_id)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def _state(zone, timestamp):
+    local = datetime.fromtimestamp(timestamp, zone)
+    return local.utcoffset(), local.dst(), local.tzname()
+
+
+def _boundary(zone, timestamp, state, step):
+    """Furthest whole second from timestamp, in the direction of step, still in state."""
+    limit = timestamp + SEARCH_SECONDS * (1 if step > 0 else -1)
+    same = timestamp
+    while same != limit:
+        probe = same + step
+        if (probe > limit) if step > 0 else (probe < limit):
+            probe = limit
+        if _state(zone, probe) != state:
+            # Bisect down to the exact second of the transition
+            different = probe
+            while abs(different - same) > 1:
+                middle = (same + different) // 2
+                if _state(zone, middle) == state:
+                    same = middle
+                else:
+                    different = middle
+            return same
+        same = probe
+    return limit
+
+
+def zone_offsets(timezone_id, at=None):
+    """
+    Return ZoneOffsets for a zone at an aware datetime (default now).
+
+    raw_offset and dst_offset are in seconds; valid_from and valid_until are
+    Unix timestamps bounding the span (valid_until exclusive) in which the
+    values hold. Returns None for ids unknown to zoneinfo.
+    """
+    if not timezone_id:
+        return None
+    timestamp = int(at.timestamp() if at is not None else time.time())
+    cached = _memo.get(timezone_id)
+    if cached is not None and cached.valid_from <= timestamp < cached.valid_until:
+        return cached
+
+    spans = _spans.get(timezone_id)
+    if spans:
+        i = bisect_right(spans, timestamp, key=lambda span: span.valid_from) - 1
+        if i >= 0 and timestamp < spans[i].valid_until:
+            return spans[i]
+
+    zone = _zone(timezone_id)
+    if zone is None:
+        return None
+    state = _state(zone, timestamp)
+    utc_offset, dst, abbreviation = state
+    dst_seconds = int(dst.total_seconds()) if dst else 0
+    offsets = ZoneOffsets(
+        raw_offset=int(utc_offset.total_seconds()) - dst_seconds,
+        dst_offset=dst_seconds,
+        abbreviation=abbreviation,
+        valid_from=_boundary(zone, timestamp, state, -STEP_SECONDS),
+        valid_until=_boundary(zone, timestamp, state, STEP_SECONDS) + 1,
+    )
+    # The span containing the current time is kept apart, so historical
+    # ?at= lookups do not evict it
+    if offsets.valid_from <= time.time() < offsets.valid_until:
+        _memo[timezone_id] = offsets
+    else:
+        with _spans_lock:
+            spans = _spans.setdefault(timezone_id, [])
+            if len(spans) >= MAX_SPANS:
+                spans.clear()
+            insort(spans, offsets, key=lambda span: span.valid_from)
+    return offsets
@@ -0,0 +1,23 @@
+from rest_framework.pagination import CursorPagination
+from .index import AIRFIELD_FIELDS
+
+# Position of the id column in airfield_rows() value rows
+ID_POSITION = AIRFIELD_FIELDS.index('id')
+
+
+class AirfieldCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the airfield list, ordered by id.
+
+    Each page continues with WHERE id > <last id> instead of an OFFSET, and
+    no COUNT(*) is run, so deep pages cost the same as the first. Pages hold
+    airfield_rows() value rows rather than model instances.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def _get_position_from_instance(self, instance, ordering):
+        if isinstance(instance, tuple):
+            return str(instance[ID_POSITION])
+        return super()._get_position_from_instance(instance, ordering)
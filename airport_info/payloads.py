@@ -0,0 +1,138 @@
+"""
+Pre-rendered airfield lookup responses.
+
+Each airfield's lookup response is rendered once to JSON and gzip and stored
+in AirfieldPayload, so by_iata, by_icao and retrieve return stored bytes
+without building models or serializing. Payloads are re-rendered by
+import_airports for the airfields it creates or changes and whenever an
+airfield's timezone is re-resolved; payloads of a TimeZone row that changes
+are dropped. The offsets embedded in a payload only hold until the zone's
+next UTC offset transition, so a payload past that point is re-rendered on
+its next use.
+
+Each payload carries a strong ETag (a hash of its JSON) and a Last-Modified
+time: the latest of the airfield's and its TimeZone row's update times and
+the start of the offsets it embeds.
+"""
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from django.utils import timezone
+from .cache import drop_cached_responses
+from .index import airfield_records, airfield_rows
+from .models import Airfield, AirfieldPayload
+from .offsets import zone_offsets
+from .renderers import FastJSONRenderer
+from .serializers import FastAirfieldSerializer
+import gzip
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000  # airfields rendered and written per query
+GZIP_LEVEL = 9  # payloads are compressed once and served many times
+
+Payload = namedtuple(
+    'Payload', ['airfield_id', 'body', 'gzip_body', 'valid_until', 'etag', 'last_modified']
+)
+
+
+def render_payloads(records):
+    """Render Payloads for AirfieldRecords, as served to clients without a pending timezone refresh."""
+    serializer = FastAirfieldSerializer()
+    renderer = FastJSONRenderer()
+    payloads = []
+    for record in records:
+        body = renderer.render({**serializer.airfield(record), 'timezone_refreshing': False})
+        offsets = zone_offsets(record.timezone.timezone_id) if record.timezone else None
+        valid_until = None
+        changes = [record.updated]
+        if record.timezone and record.timezone.last_updated:
+            changes.append(record.timezone.last_updated)
+        if offsets:
+            valid_until = datetime.fromtimestamp(offsets.valid_until, dt_timezone.utc)
+            changes.append(datetime.fromtimestamp(offsets.valid_from, dt_timezone.utc))
+        payloads.append(Payload(
+            record.id,
+            body,
+            gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0),
+            valid_until,
+            f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+            max(changes)
+        ))
+    return payloads
+
+
+def gzip_etag(etag):
+    """ETag of the gzip-compressed representation of a payload with the given ETag."""
+    return f'{etag[:-1]}-gzip"'
+
+
+def store_payloads(payloads):
+    now = timezone.now()
+    AirfieldPayload.objects.bulk_create(
+        [
+            AirfieldPayload(
+                airfield_id=payload.airfield_id,
+                body=payload.body,
+                gzip_body=payload.gzip_body,
+                valid_until=payload.valid_until,
+                etag=payload.etag,
+                last_modified=payload.last_modified,
+                rendered=now
+            )
+            for payload in payloads
+        ],
+        update_conflicts=True,
+        unique_fields=['airfield'],
+        update_fields=['body', 'gzip_body', 'valid_until', 'etag', 'last_modified', 'rendered'],
+        batch_size=500
+    )
+
+
+def refresh_payloads(airfield_ids):
+    """Render and store payloads for the given airfields from the database; returns how many were written."""
+    airfield_ids = list(airfield_ids)
+    written = 0
+    for i in range(0, len(airfield_ids), CHUNK_SIZE):
+        rows = airfield_rows(Airfield.objects.filter(id__in=airfield_ids[i:i + CHUNK_SIZE]).order_by())
+        payloads = render_payloads(airfield_records(rows))
+        store_payloads(payloads)
+        written += len(payloads)
+    if written:
+        logger.info(f"Rendered {written} airfield payloads")
+    return written
+
+
+def drop_timezone_payloads(timezone_ids):
+    """Delete the payloads and cached responses of airfields in the given TimeZone rows; they are rebuilt on use."""
+    timezone_ids = list(timezone_ids)
+    deleted, _ = AirfieldPayload.objects.filter(airfield__timezone__in=timezone_ids).delete()
+    drop_cached_responses(
+        Airfield.objects.filter(timezone__in=timezone_ids).only('id', 'iata_code', 'ident', 'gps_code').iterator()
+    )
+    if deleted:
+        logger.info(f"Dropped {deleted} airfield payloads after timezone changes")
+    return deleted
+
+
+def get_payload(airfield_id):
+    """
+    Return the stored Payload for an airfield.
+
+    Missing payloads and payloads past their offsets' validity are rendered
+    and stored first. Returns None if the airfield does not exist.
+    """
+    row = AirfieldPayload.objects.filter(airfield_id=airfield_id).values_list(
+        'body', 'gzip_body', 'valid_until', 'etag', 'last_modified'
+    ).first()
+    if row is not None and row[3] and (row[2] is None or row[2] > timezone.now()):
+        # PostgreSQL returns binary columns as memoryview
+        return Payload(airfield_id, bytes(row[0]), bytes(row[1]), *row[2:])
+
+    records = airfield_records(airfield_rows(Airfield.objects.filter(id=airfield_id).order_by()))
+    if not records:
+        return None
+    payloads = render_payloads(records)
+    store_payloads(payloads)
+    return payloads[0]
@@ -0,0 +1,71 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+import csv
+import io
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed.
+
+    Output matches JSONRenderer's default compact UTF-8 form; indented
+    output, non-default UNICODE_JSON/COMPACT_JSON settings and environments
+    without orjson use JSONRenderer itself.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._default = encoders.JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Validation errors for list items are keyed by index
+        ret = orjson.dumps(data, default=self._default, option=orjson.OPT_NON_STR_KEYS)
+        # Like JSONRenderer, escape U+2028 and U+2029 so the output is also valid JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class NDJSONRenderer(FastJSONRenderer):
+    """
+    Newline-delimited JSON, one document per line.
+
+    Exports stream their own lines; this renders the remaining responses,
+    such as errors, as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context) + b'\n'
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    CSV with a header row.
+
+    Exports stream their own rows; this renders the remaining responses,
+    such as errors, as a header of the keys and one row of the values.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(data.keys())
+        writer.writerow(data.values())
+        return buffer.getvalue().encode(self.charset)
@@ -0,0 +1,221 @@
+"""
+Typo-tolerant airport search.
+
+SearchIndex is an in-memory inverted index from normalized words to the
+airfields whose codes, name, municipality, keywords or region contain them,
+with a trigram index over the words themselves. Each query word is matched
+against the indexed words by trigram similarity (as PostgreSQL's pg_trgm
+computes it), so misspelled words still find their airports.
+
+database_search() answers the same queries with pg_trgm on PostgreSQL, for
+deployments that set AIRPORT_SEARCH_BACKEND to 'postgres'.
+"""
+from array import array
+import numpy as np
+import re
+import unicodedata
+
+# Weight of a word by the field it was found in, indexed by field number
+SEARCH_FIELDS = ['codes', 'name', 'municipality', 'keywords', 'iso_region']
+FIELD_WEIGHTS = np.array([3.0, 2.0, 1.5, 1.0, 1.0], dtype=np.float32)
+
+# Ranking among equally good matches, larger airports first
+TYPE_RANK = {
+    'large_airport': 0,
+    'medium_airport': 1,
+    'small_airport': 2,
+    'seaplane_base': 3,
+    'heliport': 3,
+    'balloonport': 4,
+    'closed': 5,
+}
+
+SIMILARITY_THRESHOLD = 0.3  # pg_trgm's default similarity threshold
+MIN_FUZZY_LENGTH = 4  # shorter words only match exactly
+MAX_EXPANSIONS = 20  # most similar indexed words used per query word
+MAX_QUERY_WORDS = 8
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    """Lowercase text, strip accents and replace everything but letters and digits with single spaces."""
+    if not text:
+        return ''
+    if not text.isascii():
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+def trigrams(word):
+    """pg_trgm's trigrams of a single word: padded with two spaces in front and one behind."""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _csr(keys, values, size):
+    """Sort values by key and return (values, offsets) so key k's values are values[offsets[k]:offsets[k + 1]]."""
+    order = np.argsort(keys, kind='stable')
+    return values[order], np.searchsorted(keys[order], np.arange(size + 1))
+
+
+class SearchIndex:
+    """
+    Ranked fuzzy search over airfield records.
+
+    Postings are stored in CSR form: for word w, docs[offsets[w]:offsets[w + 1]]
+    are the records containing it, each once, with the weight of the best
+    field it appears in scaled by the word's inverse document frequency. A
+    query scores every record in one pass of numpy operations per query word.
+    Records matching more query words rank first, then by score, then by
+    airport size and scheduled service.
+    """
+
+    def __init__(self, records):
+        self.records = list(records)
+        self.vocab = {}
+        words, docs, fields = array('i'), array('i'), array('b')
+        for doc, record in enumerate(self.records):
+            for field, text in enumerate(self._texts(record)):
+                for word in normalize(text).split():
+                    words.append(self.vocab.setdefault(word, len(self.vocab)))
+                    docs.append(doc)
+                    fields.append(field)
+
+        words = np.frombuffer(words, dtype=np.int32)
+        docs = np.frombuffer(docs, dtype=np.int32)
+        weights = FIELD_WEIGHTS[np.frombuffer(fields, dtype=np.int8)]
+        # Keep each (word, record) pair once, with its best field
+        order = np.lexsort((-weights, docs, words))
+        words, docs, weights = words[order], docs[order], weights[order]
+        first = np.ones(len(words), dtype=bool)
+        first[1:] = (words[1:] != words[:-1]) | (docs[1:] != docs[:-1])
+        words, docs, weights = words[first], docs[first], weights[first]
+
+        size = len(self.vocab)
+        self.offsets = np.searchsorted(words, np.arange(size + 1))
+        idf = np.log1p(len(self.records) / np.maximum(np.diff(self.offsets), 1)).astype(np.float32)
+        self.docs = docs
+        self.weights = weights * idf[words]
+
+        self.gram_ids = {}
+        gram_keys, gram_words = array('i'), array('i')
+        self.gram_counts = np.zeros(size, dtype=np.int16)
+        for word, word_id in self.vocab.items():
+            grams = trigrams(word)
+            self.gram_counts[word_id] = len(grams)
+            for gram in grams:
+                gram_keys.append(self.gram_ids.setdefault(gram, len(self.gram_ids)))
+                gram_words.append(word_id)
+        self.gram_words, self.gram_offsets = _csr(
+            np.frombuffer(gram_keys, dtype=np.int32), np.frombuffer(gram_words, dtype=np.int32), len(self.gram_ids)
+        )
+
+        # Tie-breaker added to scores: too small to reorder different scores
+        self.prior = np.array(
+            [(5 - TYPE_RANK.get(r.type, 4)) * 1e-3 + bool(r.scheduled_service) * 5e-4 for r in self.records],
+            dtype=np.float64
+        )
+
+    def __len__(self):
+        return len(self.records)
+
+    @staticmethod
+    def _texts(record):
+        """A record's searchable text in SEARCH_FIELDS order."""
+        codes = ' '.join(
+            code for code in (record.iata_code, record.ident, record.gps_code, record.local_code) if code
+        )
+        return codes, record.name, record.municipality, record.keywords, record.iso_region
+
+    def similar_words(self, word):
+        """Return (word id, similarity) pairs for the indexed words most similar to word."""
+        if len(word) < MIN_FUZZY_LENGTH:
+            word_id = self.vocab.get(word)
+            return [] if word_id is None else [(word_id, 1.0)]
+
+        grams = trigrams(word)
+        gram_ids = [self.gram_ids[gram] for gram in grams if gram in self.gram_ids]
+        if not gram_ids:
+            return []
+        hits = np.concatenate([self.gram_words[self.gram_offsets[g]:self.gram_offsets[g + 1]] for g in gram_ids])
+        shared = np.bincount(hits, minlength=len(self.vocab))
+        candidates = np.flatnonzero(shared)
+        shared = shared[candidates]
+        similarity = shared / (len(grams) + self.gram_counts[candidates] - shared)
+        keep = similarity >= SIMILARITY_THRESHOLD
+        candidates, similarity = candidates[keep], similarity[keep]
+        if len(candidates) > MAX_EXPANSIONS:
+            best = np.argpartition(-similarity, MAX_EXPANSIONS - 1)[:MAX_EXPANSIONS]
+            candidates, similarity = candidates[best], similarity[best]
+        return list(zip(candidates.tolist(), similarity.tolist()))
+
+    def search(self, query, limit=20):
+        """Return up to limit (record, score) pairs for a free-text query, best first."""
+        words = list(dict.fromkeys(normalize(query).split()))[:MAX_QUERY_WORDS]
+        if not words or not self.records or limit <= 0:
+            return []
+
+        total = np.zeros(len(self.records), dtype=np.float32)
+        matched = np.zeros(len(self.records), dtype=np.int16)
+        for word in words:
+            term = np.zeros(len(self.records), dtype=np.float32)
+            for word_id, similarity in self.similar_words(word):
+                start, end = self.offsets[word_id], self.offsets[word_id + 1]
+                docs = self.docs[start:end]
+                # Each record appears once per word, so fancy assignment is safe
+                term[docs] = np.maximum(term[docs], similarity * self.weights[start:end])
+            total += term
+            matched += term > 0
+
+        candidates = np.flatnonzero(matched)
+        if not len(candidates):
+            return []
+        key = matched[candidates] * 1000.0 + total[candidates] + self.prior[candidates]
+        if len(candidates) > limit:
+            best = np.argpartition(-key, limit - 1)[:limit]
+            candidates, key = candidates[best], key[best]
+        order = np.argsort(-key, kind='stable')
+        return [(self.records[candidates[i]], round(float(total[candidates[i]]), 3)) for i in order]
+
+
+def database_search(query, limit=20):
+    """
+    Search airfields with pg_trgm word similarity; returns (airfield id, score) pairs, best first.
+
+    Requires PostgreSQL with the pg_trgm extension, which migration 0011
+    installs along with trigram indexes on name, municipality and keywords.
+    """
+    from django.contrib.postgres.lookups import TrigramWordSimilar
+    from django.contrib.postgres.search import TrigramWordSimilarity
+    from django.db.models import Case, CharField, F, Q, TextField, Value, When
+    from django.db.models.functions import Coalesce
+    from .models import Airfield
+
+    for field_class in (CharField, TextField):
+        if 'trigram_word_similar' not in field_class.get_lookups():
+            field_class.register_lookup(TrigramWordSimilar)
+
+    query = ' '.join(query.split()[:MAX_QUERY_WORDS])
+    if not query:
+        return []
+    code = query.upper()
+    code_match = Q(iata_code=code) | Q(ident=code) | Q(gps_code=code) | Q(local_code=code) | Q(iso_region=code)
+    text_weights = {'name': 2.0, 'municipality': 1.5, 'keywords': 1.0}
+
+    condition = code_match
+    score = Case(When(code_match, then=Value(float(FIELD_WEIGHTS[0]))), default=Value(0.0))
+    for field, weight in text_weights.items():
+        condition |= Q(**{f'{field}__trigram_word_similar': query})
+        score = score + Coalesce(TrigramWordSimilarity(query, field), 0.0) * weight
+    type_rank = Case(
+        *(When(type=airport_type, then=Value(rank)) for airport_type, rank in TYPE_RANK.items()),
+        default=Value(4)
+    )
+    rows = (
+        Airfield.objects.filter(condition)
+        .annotate(score=score, type_rank=type_rank)
+        .order_by(F('score').desc(), 'type_rank', F('scheduled_service').desc(), 'id')
+        .values_list('id', 'score')[:limit]
+    )
+    return [(airfield_id, round(score, 3)) for airfield_id, score in rows]
@@ -1,5 +1,10 @@
-from rest_framework import serializers
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 from .models import Airfield, TimeZone
+from .offsets import zone_offsets
+import decimal
 
 
 class TimeZoneSerializer(serializers.ModelSerializer):
@@ -17,12 +22,28 @@ class TimeZoneSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        # Convert space-separated aliases string to list
-        if data['aliases']:
-            data['aliases'] = data['aliases'].split()
-        else:
-            data['aliases'] = []
-        return data
+        return _finish_timezone(data, instance.timezone_id, self.context.get('at'))
+
+
+def _finish_timezone(data, timezone_id, at):
+    """Apply computed offsets and split aliases on a serialized timezone."""
+    # Offsets and name in effect at the requested instant (default now),
+    # falling back to the stored values for ids zoneinfo does not know
+    offsets = zone_offsets(timezone_id, at)
+    if offsets:
+        data['timezone_name'] = offsets.abbreviation
+        data['raw_offset'] = offsets.raw_offset
+        data['dst_offset'] = offsets.dst_offset
+        data['total_offset'] = (offsets.raw_offset + offsets.dst_offset) / 3600
+        data['abbreviation'] = offsets.abbreviation
+    else:
+        data['abbreviation'] = None
+    # Convert space-separated aliases string to list
+    if data['aliases']:
+        data['aliases'] = data['aliases'].split()
+    else:
+        data['aliases'] = []
+    return data
 
 
 class AirfieldSerializer(serializers.ModelSerializer):
@@ -51,4 +72,131 @@ class AirfieldSerializer(serializers.ModelSerializer):
             'keywords',
             'timezone',
             'updated'
-        ] 
\ No newline at end of file
+        ]
+
+
+def _datetime(value, tzinfo):
+    """DRF's ISO 8601 DateTimeField output in the given (current) timezone."""
+    value = value.astimezone(tzinfo) if timezone.is_aware(value) else timezone.make_aware(value, tzinfo)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _converter(field):
+    """Return a plain function giving the same output as field.to_representation for non-null values."""
+    if (isinstance(field, serializers.DecimalField)
+            and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)):
+        exponent = decimal.Decimal(1).scaleb(-field.decimal_places)
+
+        def convert(value):
+            if not isinstance(value, decimal.Decimal):
+                value = decimal.Decimal(str(value).strip())
+            return '{:f}'.format(value.quantize(exponent))
+        return convert
+    if (isinstance(field, serializers.DateTimeField) and settings.USE_TZ
+            and getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601):
+        return _datetime
+    if type(field) in (serializers.CharField, serializers.URLField):
+        return str
+    if type(field) is serializers.FloatField:
+        return float
+    if type(field) is serializers.IntegerField:
+        return int
+    if type(field) is serializers.BooleanField:
+        return bool
+    if type(field) in (serializers.ChoiceField, serializers.ReadOnlyField):
+        return None
+    return field.to_representation
+
+
+class FastAirfieldSerializer:
+    """
+    Serializes airfield records to exactly what AirfieldSerializer produces.
+
+    Records are the tuples built by the airfield index (see
+    airport_info.index.AirfieldRecord), holding values in
+    AirfieldSerializer.Meta.fields order. Each field's conversion is worked
+    out once from AirfieldSerializer's own fields, so serializing is a loop
+    over plain functions instead of DRF's per-field machinery.
+    """
+
+    _plans = None
+
+    def __init__(self, context=None):
+        self.at = (context or {}).get('at')
+        self.tzinfo = timezone.get_current_timezone()
+        # Airfields in the same zone share one serialized timezone
+        self._timezones = {}
+        if FastAirfieldSerializer._plans is None:
+            FastAirfieldSerializer._plans = self._compile()
+        self.airfield_plan, self.timezone_plan = FastAirfieldSerializer._plans
+
+    @staticmethod
+    def _compile():
+        """Return (airfield plan, timezone plan) of (name, position in the record, conversion)."""
+        fields = AirfieldSerializer().fields
+        timezone_fields = fields['timezone'].fields
+        airfield_plan = []
+        position = 0
+        for name in AirfieldSerializer.Meta.fields:
+            if name == 'timezone':
+                # The nested timezone is the record's last item
+                airfield_plan.append((name, -1, None))
+            else:
+                airfield_plan.append((name, position, _converter(fields[name])))
+                position += 1
+        # TimeZone records leave out the computed total_offset (position None)
+        timezone_plan = []
+        position = 0
+        for name in TimeZoneSerializer.Meta.fields:
+            if name == 'total_offset':
+                timezone_plan.append((name, None, None))
+            else:
+                timezone_plan.append((name, position, _converter(timezone_fields[name])))
+                position += 1
+        return airfield_plan, timezone_plan
+
+    def timezone(self, record):
+        data = self._timezones.get(record)
+        if data is None:
+            data = {}
+            for name, position, convert in self.timezone_plan:
+                value = record.total_offset if position is None else record[position]
+                data[name] = self._convert(value, convert)
+            data = self._timezones[record] = _finish_timezone(data, record.timezone_id, self.at)
+        return data
+
+    def _convert(self, value, convert):
+        if value is None or convert is None:
+            return value
+        if convert is _datetime:
+            return _datetime(value, self.tzinfo)
+        return convert(value)
+
+    def airfield(self, record):
+        data = {}
+        for name, position, convert in self.airfield_plan:
+            value = record[position]
+            if position == -1:
+                data[name] = self.timezone(value) if value is not None else None
+            else:
+                data[name] = self._convert(value, convert)
+        return data
+
+    def many(self, records):
+        return [self.airfield(record) for record in records]
+
+
+class BatchLookupSerializer(serializers.Serializer):
+    """Request body for the batch lookup endpoint."""
+    codes = serializers.ListField(
+        child=serializers.CharField(max_length=10),
+        allow_empty=False,
+        max_length=settings.BATCH_LOOKUP_MAX_CODES
+    )
+
+    def validate_codes(self, value):
+        # Normalize and de-duplicate while keeping the caller's order
+        return list(dict.fromkeys(code.strip().upper() for code in value if code.strip()))
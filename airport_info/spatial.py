@@ -0,0 +1,80 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_NM = 1.852
+KM_PER_DEGREE = EARTH_RADIUS_KM * np.pi / 180
+
+# Starting half-height (in degrees of latitude) of the candidate band searched around a point
+INITIAL_WINDOW = 1.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; all arguments in radians, arrays broadcast."""
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class SpatialIndex:
+    """
+    Nearest-neighbour index over airfield records.
+
+    Records are sorted by latitude. Every point within d degrees of arc of a
+    query lies within d degrees of its latitude, so a search only computes
+    haversine distances for the latitude band found by binary search, doubling
+    the band until it holds k matches that are provably the nearest.
+    """
+
+    def __init__(self, records):
+        records = [r for r in records if r.latitude is not None and r.longitude is not None]
+        records.sort(key=lambda r: r.latitude)
+        self.records = records
+        self.latitudes = np.array([float(r.latitude) for r in records], dtype=np.float64)
+        self.lat_rad = np.radians(self.latitudes)
+        self.lon_rad = np.radians(np.array([float(r.longitude) for r in records], dtype=np.float64))
+        self.type_codes = {t: i for i, t in enumerate(sorted({r.type for r in records}))}
+        self.types = np.array([self.type_codes[r.type] for r in records], dtype=np.int16)
+        self.scheduled = np.array([bool(r.scheduled_service) for r in records], dtype=bool)
+
+    def __len__(self):
+        return len(self.records)
+
+    def nearest(self, latitude, longitude, k=10, types=None, scheduled_service=None):
+        """Return up to k (record, distance_km) pairs ordered by distance."""
+        if not self.records or k <= 0:
+            return []
+
+        type_filter = None
+        if types:
+            type_filter = np.array([self.type_codes[t] for t in types if t in self.type_codes], dtype=np.int16)
+            if not len(type_filter):
+                return []
+
+        lat = np.radians(latitude)
+        lon = np.radians(longitude)
+        window = INITIAL_WINDOW
+        while True:
+            lo = np.searchsorted(self.latitudes, latitude - window, side='left')
+            hi = np.searchsorted(self.latitudes, latitude + window, side='right')
+            candidates = np.arange(lo, hi)
+            if type_filter is not None:
+                candidates = candidates[np.isin(self.types[candidates], type_filter)]
+            if scheduled_service is not None:
+                candidates = candidates[self.scheduled[candidates] == scheduled_service]
+
+            distances = haversine_km(lat, lon, self.lat_rad[candidates], self.lon_rad[candidates])
+            exhaustive = window >= 180
+            if not exhaustive:
+                # Only points within the band's radius are guaranteed to beat anything outside it
+                inside = distances <= window * KM_PER_DEGREE
+                if np.count_nonzero(inside) < k:
+                    window *= 2
+                    continue
+                candidates, distances = candidates[inside], distances[inside]
+
+            if len(candidates) > k:
+                best = np.argpartition(distances, k - 1)[:k]
+                candidates, distances = candidates[best], distances[best]
+            order = np.argsort(distances, kind='stable')
+            return [(self.records[candidates[i]], float(distances[i])) for i in order]
@@ -0,0 +1,52 @@
+from django.utils import timezone
+from .models import TimeZoneRefreshJob
+import logging
+
+logger = logging.getLogger(__name__)
+
+FAILED_RETRY_AFTER = timezone.timedelta(days=1)
+
+
+def enqueue_timezone_refresh(airfield_ids):
+    """
+    Queue timezone refreshes for the given airfields.
+
+    Airfields that already have a pending or running job are left alone, so
+    calling this on every request for a stale airport is cheap. Returns the
+    number of airfields that were queued or re-queued.
+    """
+    airfield_ids = set(airfield_ids)
+    if not airfield_ids:
+        return 0
+
+    jobs = dict(
+        TimeZoneRefreshJob.objects.filter(airfield_id__in=airfield_ids).values_list('airfield_id', 'status')
+    )
+    requeue = [
+        airfield_id for airfield_id, status in jobs.items()
+        if status not in TimeZoneRefreshJob.ACTIVE_STATUSES
+    ]
+    missing = airfield_ids - jobs.keys()
+
+    now = timezone.now()
+    requeued = 0
+    if requeue:
+        # Airfields that exhausted their retries are only retried once FAILED_RETRY_AFTER has passed
+        requeued = TimeZoneRefreshJob.objects.filter(
+            airfield_id__in=requeue
+        ).exclude(
+            status__in=TimeZoneRefreshJob.ACTIVE_STATUSES
+        ).exclude(
+            status=TimeZoneRefreshJob.STATUS_FAILED,
+            updated__gt=now - FAILED_RETRY_AFTER
+        ).update(status=TimeZoneRefreshJob.STATUS_PENDING, attempts=0, run_after=now, updated=now)
+    if missing:
+        TimeZoneRefreshJob.objects.bulk_create(
+            [TimeZoneRefreshJob(airfield_id=airfield_id, run_after=now) for airfield_id in missing],
+            ignore_conflicts=True
+        )
+
+    queued = len(missing) + requeued
+    if queued:
+        logger.info(f"Queued timezone refresh for {queued} airfields")
+    return queued
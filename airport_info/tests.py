@@ -1,3 +1,1341 @@
-from django.test import TestCase
+from collections import namedtuple
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from .autocomplete import AutocompleteIndex
+from .management.commands import backfill_timezones, import_airports, import_timezone_aliases, run_timezone_worker
+from .bulk_import import COLUMN_NAMES, AirfieldUpserter
+from .cache import (
+    DATASET_VERSION_KEY, bump_dataset_version, get_cached_response, get_dataset_version, set_cached_response
+)
+from .geohash import covering_ranges, encode, neighbors, radius_bbox
+from .google_timezone import GoogleTimeZoneClient
+from .hits import HitCounter
+from .index import AirfieldIndex, airfield_index, airfield_records, airfield_rows
+from .models import (
+    Airfield, AirfieldAccess, AirfieldPayload, DataSource, TimeZone, TimeZoneCell, TimeZoneRefreshJob
+)
+from .offsets import SEARCH_SECONDS, _memo, _spans, zone_offsets
+from .payloads import get_payload
+from .renderers import FastJSONRenderer
+from .search import SearchIndex
+from .spatial import KM_PER_NM, SpatialIndex, haversine_km
+from .serializers import AirfieldSerializer, FastAirfieldSerializer, TimeZoneSerializer
+from .tasks import enqueue_timezone_refresh
+from . import google_timezone, tzaliases, tzcells, tzresolver
+from .tzaliases import get_alias_index, parse_aliases
+from .tzresolver import TimeZoneResolver, get_or_create_timezone, resolve_timezone_id
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+import gzip
+import io
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+
+class FastAirfieldSerializerTests(TestCase):
+    def setUp(self):
+        los_angeles = TimeZone.objects.create(
+            name='America/Los_Angeles',
+            timezone_id='America/Los_Angeles',
+            timezone_name='Pacific Standard Time',
+            raw_offset=-28800,
+            dst_offset=0,
+            aliases='US/Pacific',
+            last_updated=timezone.now()
+        )
+        unknown = TimeZone.objects.create(name='Unknown', timezone_id='Not/AZone', raw_offset=3600)
+        Airfield.objects.create(
+            id='3484', ident='KLAX', iata_code='LAX', name='Los Angeles International Airport',
+            type='large_airport', latitude=Decimal('33.942501'), longitude=Decimal('-118.407997'),
+            elevation_ft=125.0, continent='NA', iso_country='US', iso_region='US-CA',
+            municipality='Los Angeles', scheduled_service=True, gps_code='KLAX',
+            home_link='https://www.flylax.com/', wikipedia_link='https://en.wikipedia.org/wiki/LAX',
+            keywords='Los Angeles   Airport', timezone=los_angeles
+        )
+        Airfield.objects.create(
+            id='99', ident='00A', name='Total Rf Heliport', type='heliport',
+            latitude=Decimal('40.07'), longitude=Decimal('-74.9336'), iso_country='US', timezone=unknown
+        )
+        Airfield.objects.create(
+            id='100', ident='00AK', name='Lowell Field', latitude=Decimal('59.9'),
+            longitude=Decimal('-151.7'), iso_country='US'
+        )
+
+    def test_matches_airfield_serializer(self):
+        queryset = Airfield.objects.select_related('timezone').order_by('id')
+        expected = AirfieldSerializer(queryset, many=True).data
+        records = airfield_records(airfield_rows(Airfield.objects.order_by('id')))
+        self.assertEqual(FastAirfieldSerializer().many(records), json.loads(json.dumps(expected)))
+
+    def test_matches_airfield_serializer_at_instant(self):
+        at = timezone.datetime(2026, 7, 1, tzinfo=timezone.utc)
+        airfield = Airfield.objects.select_related('timezone').get(id='3484')
+        expected = AirfieldSerializer(airfield, context={'at': at}).data
+        record = airfield_records(airfield_rows(Airfield.objects.filter(id='3484')))[0]
+        self.assertEqual(FastAirfieldSerializer(context={'at': at}).airfield(record), expected)
+        self.assertEqual(expected['timezone']['total_offset'], -7.0)
+
+    def test_renderer_matches_json_renderer(self):
+        records = airfield_records(airfield_rows(Airfield.objects.order_by('id')))
+        data = {'results': FastAirfieldSerializer().many(records)}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        errors = {'codes': {0: ['Ensure this field has no more than 10 characters.']}}
+        self.assertEqual(FastJSONRenderer().render(errors), JSONRenderer().render(errors))
+
+
+class AirfieldPayloadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        new_york = TimeZone.objects.create(
+            name='America/New_York',
+            timezone_id='America/New_York',
+            timezone_name='EST',
+            raw_offset=-18000,
+            dst_offset=0,
+            last_updated=timezone.now()
+        )
+        Airfield.objects.create(
+            id='3622', ident='KJFK', iata_code='JFK', name='John F Kennedy International Airport',
+            type='large_airport', latitude=Decimal('40.639447'), longitude=Decimal('-73.779317'),
+            iso_country='US', timezone=new_york, timezone_last_updated=timezone.now()
+        )
+        airfield_index.invalidate()
+
+    def test_payload_matches_serializer(self):
+        payload = get_payload('3622')
+        record = airfield_records(airfield_rows(Airfield.objects.filter(id='3622')))[0]
+        expected = {**FastAirfieldSerializer().airfield(record), 'timezone_refreshing': False}
+        self.assertEqual(json.loads(payload.body), expected)
+        self.assertEqual(gzip.decompress(payload.gzip_body), payload.body)
+        self.assertGreater(payload.valid_until, timezone.now())
+        self.assertTrue(AirfieldPayload.objects.filter(airfield_id='3622').exists())
+
+    def test_lookup_serves_stored_payload(self):
+        payload = get_payload('3622')
+        response = self.client.get('/api/airports/by_iata/', {'code': 'JFK'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response.content, payload.gzip_body)
+        response = self.client.get('/api/airports/3622/')
+        self.assertEqual(response.content, payload.body)
+
+    def test_retrieve_airfield_removed_before_render(self):
+        with mock.patch('airport_info.views.get_payload', return_value=None):
+            response = self.client.get('/api/airports/3622/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['ident'], 'KJFK')
+        self.assertFalse(response.json()['timezone_refreshing'])
+
+    def test_gzip_refused_with_zero_quality(self):
+        payload = get_payload('3622')
+        response = self.client.get('/api/airports/3622/', HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, payload.body)
+        response = self.client.get('/api/airports/3622/', HTTP_ACCEPT_ENCODING='br, *;q=0.5')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_conditional_lookup(self):
+        response = self.client.get('/api/airports/by_iata/', {'code': 'JFK'})
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        response = self.client.get('/api/airports/by_iata/', {'code': 'JFK'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get('/api/airports/by_iata/', {'code': 'JFK'}, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            '/api/airports/by_iata/', {'code': 'JFK'}, HTTP_IF_NONE_MATCH='"stale"',
+            HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class AirfieldSearchTests(TestCase):
+    def setUp(self):
+        Airfield.objects.create(
+            id='2434', ident='EGLL', iata_code='LHR', name='London Heathrow Airport', type='large_airport',
+            latitude=Decimal('51.4706'), longitude=Decimal('-0.461941'), iso_country='GB',
+            iso_region='GB-ENG', municipality='London', scheduled_service=True, keywords='LON, Londres'
+        )
+        Airfield.objects.create(
+            id='29212', ident='GB-0413', name='Heath Farm Airstrip', type='small_airport',
+            latitude=Decimal('52.2'), longitude=Decimal('-1.1'), iso_country='GB', iso_region='GB-ENG'
+        )
+        self.index = SearchIndex(airfield_records(airfield_rows(Airfield.objects.order_by('id'))))
+        airfield_index.invalidate()
+        airfield_index.warm()
+
+    def test_typo_tolerant_ranking(self):
+        self.assertEqual([r.ident for r, _ in self.index.search('hethrow')], ['EGLL'])
+        self.assertEqual([r.ident for r, _ in self.index.search('londres heath')][:2], ['EGLL', 'GB-0413'])
+        self.assertEqual(self.index.search('LHR')[0][0].ident, 'EGLL')
+        self.assertEqual(self.index.search('zzzz'), [])
+
+    def test_search_endpoint(self):
+        response = self.client.get('/api/airports/search/', {'q': 'heathrow londn', 'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['ident'] for r in response.json()], ['EGLL'])
+        self.assertEqual(self.client.get('/api/airports/search/').status_code, 400)
+
+    def test_index_rebuilt_in_background_on_content_changes(self):
+        index = airfield_index.search()
+        # A timezone refresh keeps the index but serves the new timezone
+        tokyo = TimeZone.objects.create(name='Asia/Tokyo', timezone_id='Asia/Tokyo', raw_offset=32400)
+        heathrow = Airfield.objects.get(id='2434')
+        heathrow.timezone = tokyo
+        heathrow.save()
+        airfield_index.invalidate()
+        self.assertIs(airfield_index.search(), index)
+        response = self.client.get('/api/airports/search/', {'q': 'heathrow'})
+        self.assertEqual(response.json()[0]['timezone']['timezone_id'], 'Asia/Tokyo')
+
+        # A rename is picked up by a rebuild while the old index keeps serving
+        heathrow.name = 'London Heathrow Terminal'
+        heathrow.save()
+        airfield_index.invalidate()
+        self.assertIs(airfield_index.search(), index)
+        for thread in threading.enumerate():
+            if thread.name == 'airfield-search-index':
+                thread.join(5)
+        self.assertIsNot(airfield_index.search(), index)
+        self.assertEqual([r.ident for r, _ in airfield_index.search().search('terminal')], ['EGLL'])
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        airports = [
+            ('3484', 'KLAX', 'LAX', 'Los Angeles International Airport', 'large_airport', True, 'Los Angeles'),
+            ('3697', 'KLGA', 'LGA', 'La Guardia Airport', 'large_airport', True, 'New York'),
+            ('2110', 'DNMM', 'LOS', 'Murtala Muhammed International Airport', 'large_airport', True, 'Lagos'),
+            ('9001', 'LA00', None, 'Lazy Acres Airstrip', 'small_airport', False, 'Laramie'),
+        ]
+        for airfield_id, ident, iata_code, name, airport_type, scheduled_service, municipality in airports:
+            Airfield.objects.create(
+                id=airfield_id, ident=ident, iata_code=iata_code, name=name, type=airport_type,
+                scheduled_service=scheduled_service, municipality=municipality,
+                latitude=Decimal('0'), longitude=Decimal('0'), iso_country='US'
+            )
+        self.index = AutocompleteIndex(airfield_records(airfield_rows(Airfield.objects.all())), top_k=3)
+        airfield_index.invalidate()
+        airfield_index.warm()
+
+    def test_prefix_ranking(self):
+        self.assertEqual([r.ident for r in self.index.complete('LA')], ['KLGA', 'KLAX', 'DNMM'])
+        self.assertEqual([r.ident for r in self.index.complete('la00')], ['LA00'])
+        self.assertEqual([r.ident for r in self.index.complete('lagos')], ['DNMM'])
+        self.assertEqual([r.ident for r in self.index.complete('los ang')], ['KLAX'])
+        self.assertEqual(self.index.complete('xyz'), [])
+
+    def test_autocomplete_endpoint(self):
+        response = self.client.get('/api/airports/autocomplete/', {'prefix': 'la g', 'limit': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['iata_code'] for r in response.json()], ['LGA'])
+        self.assertEqual(self.client.get('/api/airports/autocomplete/').status_code, 400)
+
+    def test_warmed_index_swapped_in_from_background(self):
+        index = airfield_index.autocomplete()
+        with mock.patch('airport_info.index.AutocompleteIndex') as build:
+            self.client.get('/api/airports/autocomplete/', {'prefix': 'la'})
+        build.assert_not_called()
+
+        Airfield.objects.create(
+            id='9002', ident='LA01', iata_code='LAS', name='Harry Reid International Airport',
+            type='large_airport', scheduled_service=True, municipality='Las Vegas',
+            latitude=Decimal('0'), longitude=Decimal('0'), iso_country='US'
+        )
+        airfield_index.invalidate()
+        # The old index answers until the rebuild finishes
+        self.assertIs(airfield_index.autocomplete(), index)
+        for thread in threading.enumerate():
+            if thread.name == 'airfield-autocomplete-index':
+                thread.join(5)
+        response = self.client.get('/api/airports/autocomplete/', {'prefix': 'las v'})
+        self.assertEqual([r['iata_code'] for r in response.json()], ['LAS'])
+
+
+Point = namedtuple('Point', ['id', 'latitude', 'longitude', 'type', 'scheduled_service'])
+
+
+class SpatialIndexTests(SimpleTestCase):
+    def distance(self, point, latitude, longitude):
+        return float(haversine_km(
+            math.radians(latitude), math.radians(longitude),
+            math.radians(point.latitude), math.radians(point.longitude)
+        ))
+
+    def test_nearest_ordered_by_distance(self):
+        index = SpatialIndex([
+            Point('far', 0, 3, 'small_airport', False), Point('near', 0, 1, 'large_airport', True),
+            Point('mid', 2, 0, 'small_airport', True), Point('none', None, None, 'small_airport', False),
+        ])
+        self.assertEqual(len(index), 3)
+        results = index.nearest(0, 0, k=2)
+        self.assertEqual([point.id for point, _ in results], ['near', 'mid'])
+        self.assertAlmostEqual(results[0][1], 111.195, places=3)
+        self.assertEqual([point.id for point, _ in index.nearest(0, 0, k=10)], ['near', 'mid', 'far'])
+        self.assertEqual([p.id for p, _ in index.nearest(0, 0, types=['small_airport'])], ['mid', 'far'])
+        self.assertEqual([p.id for p, _ in index.nearest(0, 0, scheduled_service=False)], ['far'])
+        self.assertEqual(index.nearest(0, 0, types=['heliport']), [])
+        self.assertEqual(index.nearest(0, 0, k=0), [])
+        self.assertEqual(SpatialIndex([]).nearest(0, 0), [])
+
+    def test_antimeridian_and_poles(self):
+        index = SpatialIndex([
+            Point('east', 0, 178, 'small_airport', False), Point('west', 0, -179.9, 'small_airport', False),
+            Point('pole', 89.9, 180, 'small_airport', False), Point('below', 88.5, 0, 'small_airport', False),
+            Point('south', -89.99, -45, 'small_airport', False),
+        ])
+        self.assertEqual(index.nearest(0, 179.9, k=1)[0][0].id, 'west')
+        self.assertAlmostEqual(index.nearest(0, 179.9, k=1)[0][1], 22.239, places=3)
+        self.assertEqual(index.nearest(89.9, 0, k=1)[0][0].id, 'pole')
+        # The band must widen past the south pole to reach the other hemisphere
+        self.assertEqual(index.nearest(-89.99, 135, k=1)[0][0].id, 'south')
+        self.assertEqual([p.id for p, _ in index.nearest(-89, 0, k=2)], ['south', 'east'])
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        points = [
+            Point(str(i), rng.uniform(-90, 90), rng.uniform(-180, 180), rng.choice(['a', 'b']), rng.random() < 0.5)
+            for i in range(500)
+        ]
+        index = SpatialIndex(points)
+        queries = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(50)]
+        queries += [(89.99, 10), (-89.99, -170), (0, 180), (45, -180)]
+        for latitude, longitude in queries:
+            for k, types in ((1, None), (7, None), (5, ['b'])):
+                expected = sorted(
+                    (self.distance(p, latitude, longitude), p.id) for p in points if not types or p.type in types
+                )[:k]
+                results = index.nearest(latitude, longitude, k=k, types=types)
+                self.assertEqual([p.id for p, _ in results], [id for _, id in expected])
+                for (_, distance), (expected_distance, _) in zip(results, expected):
+                    self.assertAlmostEqual(distance, expected_distance, places=6)
+
+
+class NearestViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for id, latitude, longitude, airport_type in (
+            ('1', '0', '1', 'large_airport'), ('2', '0', '2', 'small_airport'), ('3', '0', '-179.9', 'heliport'),
+        ):
+            Airfield.objects.create(
+                id=id, ident=f'X{id}', name=f'Airfield {id}', type=airport_type,
+                latitude=Decimal(latitude), longitude=Decimal(longitude)
+            )
+        airfield_index.invalidate()
+        airfield_index.warm()
+
+    def nearest(self, **params):
+        return self.client.get('/api/airports/nearest/', params)
+
+    def test_nearest(self):
+        response = self.nearest(lat=0, lon=0, k=2)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual([airport['id'] for airport in results], ['1', '2'])
+        self.assertEqual(results[0]['distance_km'], 111.195)
+        self.assertEqual(results[0]['distance_nm'], round(111.19508 / KM_PER_NM, 3))
+        response = self.nearest(lat=0, lon=179, type='heliport')
+        self.assertEqual([airport['id'] for airport in response.json()], ['3'])
+        response = self.nearest(lat=0, lon=0, type='small_airport,heliport')
+        self.assertEqual([airport['id'] for airport in response.json()], ['2', '3'])
+
+    def test_invalid_parameters(self):
+        for params in (
+            {'lon': 0}, {'lat': 'x', 'lon': 0}, {'lat': 0, 'lon': 0, 'k': '1.5'}, {'lat': 91, 'lon': 0},
+            {'lat': 0, 'lon': 181}, {'lat': 0, 'lon': 0, 'k': 0},
+            {'lat': 0, 'lon': 0, 'k': settings.NEAREST_MAX_RESULTS + 1},
+        ):
+            with self.subTest(params=params):
+                response = self.nearest(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+        self.assertEqual(self.nearest(lat=0, lon=0, k=settings.NEAREST_MAX_RESULTS).status_code, 200)
+
+
+class BatchLookupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        utc = TimeZone.objects.create(name='UTC', timezone_id='UTC', raw_offset=0)
+        for id, ident, iata_code, gps_code in (
+            ('1', 'KJFK', 'JFK', 'KJFK'), ('2', 'EGLL', 'LHR', 'EGLL'), ('3', 'US-0001', None, 'KABC'),
+            ('4', 'ABC', None, None), ('5', 'XABC', 'ABC', None),
+        ):
+            Airfield.objects.create(
+                id=id, ident=ident, iata_code=iata_code, gps_code=gps_code, name=f'Airfield {id}',
+                type='small_airport', latitude=Decimal('0'), longitude=Decimal('0'), timezone=utc
+            )
+
+    def batch(self, codes):
+        return self.client.post('/api/airports/batch/', {'codes': codes}, content_type='application/json')
+
+    @mock.patch('airport_info.views.hit_counter')
+    def test_mixed_codes(self, hit_counter):
+        with self.assertNumQueries(1):
+            response = self.batch(['jfk', 'EGLL', ' kabc ', 'ZZZ', 'JFK', 'KJFK', 'ABC', 'ZZZZ'])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        airports = data['airports']
+        self.assertEqual(list(airports), ['JFK', 'EGLL', 'KABC', 'ZZZ', 'KJFK', 'ABC', 'ZZZZ'])
+        self.assertEqual(airports['JFK'], airports['KJFK'])
+        self.assertEqual(
+            {code: airport and airport['id'] for code, airport in airports.items()},
+            {'JFK': '1', 'EGLL': '2', 'KABC': '3', 'ZZZ': None, 'KJFK': '1', 'ABC': '5', 'ZZZZ': None}
+        )
+        self.assertEqual(airports['JFK']['timezone']['timezone_id'], 'UTC')
+        self.assertEqual(data['not_found'], ['ZZZ', 'ZZZZ'])
+        # Only the airfields returned are recorded, once each
+        self.assertEqual(sorted(hit_counter.record.call_args.args[0]), ['1', '2', '3', '5'])
+
+    def test_code_limit(self):
+        limit = settings.BATCH_LOOKUP_MAX_CODES
+        self.assertEqual(self.batch([f'C{i}' for i in range(limit)]).status_code, 200)
+        response = self.batch([f'C{i}' for i in range(limit + 1)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('codes', response.json())
+
+    def test_invalid_bodies(self):
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.batch('JFK').status_code, 400)
+        self.assertEqual(self.batch(['X' * 11]).status_code, 400)
+
+
+class AirfieldListTests(TestCase):
+    def setUp(self):
+        for i, (country, airport_type, scheduled_service) in enumerate([
+            ('US', 'large_airport', True), ('US', 'small_airport', False), ('GB', 'large_airport', True),
+            ('US', 'heliport', False), ('US', 'large_airport', False),
+        ]):
+            Airfield.objects.create(
+                id=f'{i + 1}', ident=f'X{i}', name=f'Airfield {i}', type=airport_type, iso_country=country,
+                iso_region=f'{country}-A', scheduled_service=scheduled_service,
+                latitude=Decimal('0'), longitude=Decimal('0')
+            )
+
+    def test_cursor_pages_cover_every_airfield_once(self):
+        ids = []
+        response = self.client.get('/api/airports/', {'page_size': 2})
+        while True:
+            data = response.json()
+            self.assertNotIn('count', data)
+            ids.extend(airfield['id'] for airfield in data['results'])
+            if not data['next']:
+                break
+            response = self.client.get(data['next'])
+        self.assertEqual(ids, ['1', '2', '3', '4', '5'])
+
+    def test_only_returned_page_enqueued(self):
+        london = TimeZone.objects.create(name='Europe/London', timezone_id='Europe/London')
+        Airfield.objects.filter(id='2').update(timezone=london, timezone_last_updated=timezone.now())
+        response = self.client.get('/api/airports/', {'page_size': 3})
+        self.assertEqual([airfield['id'] for airfield in response.json()['results']], ['1', '2', '3'])
+        # Airfield 2 is fresh, and 4 and 5 are only on later pages
+        self.assertEqual(sorted(TimeZoneRefreshJob.objects.values_list('airfield_id', flat=True)), ['1', '3'])
+
+        TimeZoneRefreshJob.objects.all().delete()
+        self.client.get('/api/airports/', {'iso_country': 'us', 'type': 'heliport'})
+        self.assertEqual(list(TimeZoneRefreshJob.objects.values_list('airfield_id', flat=True)), ['4'])
+
+    def test_filters(self):
+        response = self.client.get('/api/airports/', {'iso_country': 'us', 'type': 'large_airport,heliport'})
+        self.assertEqual([a['id'] for a in response.json()['results']], ['1', '4', '5'])
+        response = self.client.get('/api/airports/', {'iso_region': 'US-A', 'scheduled_service': 'true'})
+        self.assertEqual([a['id'] for a in response.json()['results']], ['1'])
+        self.assertEqual(self.client.get('/api/airports/', {'type': 'airship'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/airports/', {'scheduled_service': 'maybe'}).status_code, 400)
+
+    def test_export_streams_filtered_airfields(self):
+        response = self.client.get('/api/airports/export/', {'format': 'ndjson', 'iso_country': 'US'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], ['1', '2', '4', '5'])
+
+        response = self.client.get('/api/airports/export/', {'format': 'csv'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        rows = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertTrue(rows[0].startswith('id,ident,iata_code,name'))
+        self.assertEqual(len(rows), 6)
+
+
+class GeoFilterTests(TestCase):
+    AIRFIELDS = [
+        ('NFFN', Decimal('-17.755'), Decimal('177.443')),  # Nadi, Fiji
+        ('NSFA', Decimal('-13.830'), Decimal('-172.008')),  # Apia, Samoa
+        ('EGLL', Decimal('51.471'), Decimal('-0.462')),
+        ('KJFK', Decimal('40.640'), Decimal('-73.779')),
+    ]
+
+    def setUp(self):
+        for ident, latitude, longitude in self.AIRFIELDS:
+            Airfield.objects.create(
+                id=ident, ident=ident, name=ident, type='large_airport',
+                latitude=latitude, longitude=longitude, geohash=encode(latitude, longitude)
+            )
+
+    def ids(self, params):
+        response = self.client.get('/api/airports/', params)
+        self.assertEqual(response.status_code, 200)
+        return [airfield['id'] for airfield in response.json()['results']]
+
+    def test_covering_ranges_cross_antimeridian(self):
+        ranges = covering_ranges(-20, 170, -10, -170)
+        for latitude, longitude in ((-17.755, 177.443), (-13.83, -172.008), (-15, 180), (-15, -180)):
+            geohash = encode(latitude, longitude)
+            self.assertTrue(any(low <= geohash and (high is None or geohash < high) for low, high in ranges))
+        self.assertFalse(any(low <= encode(51.471, -0.462) < (high or '~') for low, high in ranges))
+
+    def test_radius_bbox_wraps(self):
+        min_lat, min_lon, max_lat, max_lon = radius_bbox(-17.0, 179.5, 200, 6371.0)
+        self.assertGreater(min_lon, max_lon)
+        self.assertTrue(-180 < max_lon < -178)
+
+    def test_bbox_filter(self):
+        self.assertEqual(self.ids({'bbox': '-1,51,0,52'}), ['EGLL'])
+        self.assertEqual(self.ids({'bbox': '170,-20,-170,-10'}), ['NFFN', 'NSFA'])
+        self.assertEqual(self.ids({'bbox': '-170,-20,170,-10'}), [])
+        self.assertEqual(self.client.get('/api/airports/', {'bbox': '1,2,3'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/airports/', {'bbox': '0,10,1,5'}).status_code, 400)
+
+    def test_radius_filter(self):
+        self.assertEqual(self.ids({'lat': '40.7', 'lon': '-74.0', 'radius_nm': '20'}), ['KJFK'])
+        # Nadi is about 150 nm from this point on the far side of the antimeridian
+        self.assertEqual(self.ids({'lat': '-17.5', 'lon': '-179.9', 'radius_nm': '200'}), ['NFFN'])
+        self.assertEqual(self.ids({'lat': '-17.5', 'lon': '-179.9', 'radius_nm': '100'}), [])
+        self.assertEqual(
+            self.client.get('/api/airports/', {'lat': '0', 'lon': '0', 'radius_nm': '0'}).status_code, 400
+        )
+
+class ZoneOffsetsTests(SimpleTestCase):
+    def setUp(self):
+        _memo.clear()
+        _spans.clear()
+
+    def test_dst_transition(self):
+        # New York fell back at 2020-11-01 06:00 UTC and sprang forward at 2021-03-14 07:00 UTC
+        spring = datetime(2021, 3, 14, 7, tzinfo=dt_timezone.utc).timestamp()
+        winter = zone_offsets('America/New_York', datetime(2021, 3, 1, 12, tzinfo=dt_timezone.utc))
+        self.assertEqual((winter.raw_offset, winter.dst_offset, winter.abbreviation), (-18000, 0, 'EST'))
+        self.assertEqual(winter.valid_until, spring)
+        self.assertEqual(winter.valid_from, datetime(2020, 11, 1, 6, tzinfo=dt_timezone.utc).timestamp())
+
+        summer = zone_offsets('America/New_York', datetime(2021, 3, 14, 7, tzinfo=dt_timezone.utc))
+        self.assertEqual((summer.raw_offset, summer.dst_offset, summer.abbreviation), (-18000, 3600, 'EDT'))
+        self.assertEqual(summer.valid_from, spring)
+        self.assertEqual(summer.valid_until, datetime(2021, 11, 7, 6, tzinfo=dt_timezone.utc).timestamp())
+        # Historical lookups are not memoized
+        self.assertNotIn('America/New_York', _memo)
+
+    def test_zone_without_dst(self):
+        at = datetime(2021, 6, 1, tzinfo=dt_timezone.utc)
+        offsets = zone_offsets('Asia/Tokyo', at)
+        self.assertEqual((offsets.raw_offset, offsets.dst_offset, offsets.abbreviation), (32400, 0, 'JST'))
+        # No transition within the search span either side
+        self.assertEqual(offsets.valid_from, at.timestamp() - SEARCH_SECONDS)
+        self.assertEqual(offsets.valid_until, at.timestamp() + SEARCH_SECONDS + 1)
+
+    def test_current_offsets_memoized(self):
+        offsets = zone_offsets('Asia/Tokyo')
+        self.assertIs(_memo['Asia/Tokyo'], offsets)
+        self.assertIs(zone_offsets('Asia/Tokyo'), offsets)
+        self.assertIsNone(zone_offsets('Not/AZone'))
+
+    def test_historical_spans_cached(self):
+        winter = zone_offsets('America/New_York', datetime(2021, 1, 5, tzinfo=dt_timezone.utc))
+        summer = zone_offsets('America/New_York', datetime(2021, 7, 5, tzinfo=dt_timezone.utc))
+        with mock.patch('airport_info.offsets._state') as state:
+            self.assertIs(zone_offsets('America/New_York', datetime(2021, 2, 1, tzinfo=dt_timezone.utc)), winter)
+            self.assertIs(zone_offsets('America/New_York', datetime(2021, 10, 1, tzinfo=dt_timezone.utc)), summer)
+        state.assert_not_called()
+        self.assertEqual(_spans['America/New_York'], [winter, summer])
+
+    def test_timezone_name_follows_dst(self):
+        # The stored name is from a winter refresh
+        new_york = TimeZone(name='America/New_York', timezone_id='America/New_York', timezone_name='EST',
+                            raw_offset=-18000, dst_offset=0)
+        data = TimeZoneSerializer(new_york, context={'at': datetime(2021, 7, 1, tzinfo=dt_timezone.utc)}).data
+        self.assertEqual(
+            (data['timezone_name'], data['abbreviation'], data['dst_offset'], data['total_offset']),
+            ('EDT', 'EDT', 3600, -4.0)
+        )
+        unknown = TimeZone(name='Unknown', timezone_id='Not/AZone', timezone_name='Somewhere Time', raw_offset=0)
+        self.assertEqual(TimeZoneSerializer(unknown).data['timezone_name'], 'Somewhere Time')
+
+
+class FakeClock:
+    """Stands in for the time module; sleeping advances the clock instantly."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class GoogleTimeZoneClientTests(SimpleTestCase):
+    DATA = {'status': 'OK', 'timeZoneId': 'Asia/Tokyo', 'rawOffset': 32400, 'dstOffset': 0}
+
+    def setUp(self):
+        cache.clear()
+        self.google = GoogleTimeZoneClient()
+        self.google.session = mock.Mock()
+        self.google.session.get.return_value = mock.Mock(status_code=200, json=lambda: dict(self.DATA))
+
+    def test_concurrent_lookups_coalesce(self):
+        called, release = threading.Event(), threading.Event()
+
+        def get(*args, **kwargs):
+            called.set()
+            release.wait(5)
+            return mock.Mock(status_code=200, json=lambda: dict(self.DATA))
+
+        self.google.session.get.side_effect = get
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.google.lookup(35.55, 139.78, 'key')))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(called.wait(5))
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(self.google.session.get.call_count, 1)
+        self.assertEqual(results, [self.DATA] * 5)
+        # The other processes' path: a stored result is reused without a call
+        self.assertEqual(self.google.lookup(35.55, 139.78, 'key'), self.DATA)
+        self.assertEqual(self.google.session.get.call_count, 1)
+
+    def calls_per_second(self, qps):
+        clock = FakeClock()
+        seconds = []
+        self.google.session.get.side_effect = lambda *args, **kwargs: (
+            seconds.append(int(clock.now)) or mock.Mock(status_code=200, json=lambda: dict(self.DATA))
+        )
+        with mock.patch('airport_info.google_timezone.time', clock):
+            for i in range(6):
+                self.google.lookup(i, i, 'key', qps=qps)
+        return [seconds.count(second) for second in sorted(set(seconds))]
+
+    @override_settings(GOOGLE_TIMEZONE_QPS=10)
+    def test_respects_qps(self):
+        self.assertEqual(self.calls_per_second(qps=2), [2, 2, 2])
+
+    @override_settings(GOOGLE_TIMEZONE_QPS=3)
+    def test_qps_capped_by_setting(self):
+        self.assertEqual(self.calls_per_second(qps=50), [3, 3])
+
+    @override_settings(GOOGLE_TIMEZONE_QPS=5)
+    def test_capped_caller_leaves_other_tokens_free(self):
+        clock = FakeClock()
+        granted = []
+
+        def sleep(seconds):
+            if not granted:
+                # While the capped caller waits, the rest of the second's tokens stay free
+                for _ in range(3):
+                    self.google._acquire()
+                    granted.append(int(clock.now))
+            clock.now += seconds
+
+        clock.sleep = sleep
+        with mock.patch('airport_info.google_timezone.time', clock):
+            for _ in range(3):
+                self.google._acquire(qps=2)
+        self.assertEqual(granted, [1000, 1000, 1000])
+        self.assertEqual(int(clock.now), 1001)
+        self.assertEqual(cache.get('airport_info:google_timezone:rate:1000'), 5)
+
+
+class AirfieldUpserterTests(TestCase):
+    def setUp(self):
+        self.utc = TimeZone.objects.create(name='UTC', timezone_id='UTC', raw_offset=0)
+
+    def row(self, id, **values):
+        defaults = {
+            'id': id, 'ident': f'X{id}', 'type': 'small_airport', 'name': f'Airfield {id}',
+            'latitude': Decimal('1.000000'), 'longitude': Decimal('2.000000'), 'iso_country': 'US',
+            'scheduled_service': False,
+        }
+        defaults.update(values)
+        return tuple(defaults.get(name) for name in COLUMN_NAMES)
+
+    def upsert(self, rows):
+        with AirfieldUpserter(self.utc) as upserter:
+            upserter.write(rows)
+        return upserter
+
+    def test_insert(self):
+        upserter = self.upsert([self.row('1', iata_code='AAA'), self.row('2')])
+        self.assertEqual((upserter.created, upserter.updated, upserter.unchanged), (2, 0, 0))
+        airfield = Airfield.objects.get(id='1')
+        self.assertEqual((airfield.iata_code, airfield.name, airfield.timezone), ('AAA', 'Airfield 1', self.utc))
+        self.assertTrue(airfield.content_hash)
+        self.assertEqual(upserter.removed_ids(), [])
+
+    def test_update_one_field(self):
+        self.upsert([self.row('1'), self.row('2')])
+        before = dict(Airfield.objects.values_list('id', 'updated'))
+        other = TimeZone.objects.create(name='Asia/Tokyo', timezone_id='Asia/Tokyo', raw_offset=32400)
+        Airfield.objects.filter(id='1').update(timezone=other)
+
+        upserter = self.upsert([self.row('1', municipality='Springfield'), self.row('2')])
+        self.assertEqual((upserter.created, upserter.updated, upserter.unchanged), (0, 1, 1))
+        airfield = Airfield.objects.get(id='1')
+        self.assertEqual(airfield.municipality, 'Springfield')
+        self.assertGreater(airfield.updated, before['1'])
+        # Resolved timezones survive re-imports
+        self.assertEqual(airfield.timezone, other)
+        self.assertEqual(Airfield.objects.get(id='2').updated, before['2'])
+
+    def test_unchanged_rows_skipped(self):
+        self.upsert([self.row('1'), self.row('2')])
+        before = dict(Airfield.objects.values_list('id', 'updated'))
+        upserter = self.upsert([self.row('1')])
+        self.assertEqual((upserter.created, upserter.updated, upserter.unchanged), (0, 0, 1))
+        self.assertEqual(upserter._pending, [])
+        self.assertEqual(dict(Airfield.objects.values_list('id', 'updated')), before)
+        self.assertEqual(upserter.removed_ids(), ['2'])
+
+    def test_iata_code_moves_between_airfields(self):
+        self.upsert([self.row('1', iata_code='AAA'), self.row('2')])
+        before = Airfield.objects.get(id='1').updated
+        # Only the airfield gaining the code is in this import
+        upserter = self.upsert([self.row('2', iata_code='AAA')])
+        self.assertEqual(upserter.updated, 1)
+        self.assertEqual(Airfield.objects.get(iata_code='AAA').id, '2')
+        released = Airfield.objects.get(id='1')
+        self.assertIsNone(released.iata_code)
+        self.assertGreater(released.updated, before)
+
+        # Duplicates within one file keep the first airfield's code
+        upserter = self.upsert([self.row('1', iata_code='BBB'), self.row('2', iata_code='BBB')])
+        self.assertEqual(upserter.duplicate_iata, 1)
+        self.assertEqual(dict(Airfield.objects.values_list('id', 'iata_code')), {'1': 'BBB', '2': None})
+
+
+class FakeResponse:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        yield from self.chunks
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+class AirportCSVStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.command = import_airports.Command()
+        self.command.skipped_count = 0
+
+    def csv(self, *names):
+        lines = [','.join(import_airports.CSV_FIELDS)]
+        for i, name in enumerate(names):
+            values = dict.fromkeys(import_airports.CSV_FIELDS, '')
+            values.update(id=str(i + 1), ident=f'X{i + 1}', name=name, latitude_deg='1.5', longitude_deg='2.5')
+            lines.append(','.join(values[field] for field in import_airports.CSV_FIELDS))
+        return ('\r\n'.join(lines) + '\r\n').encode('utf-8')
+
+    def split(self, data, size):
+        return [data[i:i + size] for i in range(0, len(data), size)]
+
+    def names(self, response):
+        return [[row[3] for row in batch] for batch in self.command.iter_batches(response)]
+
+    def test_quoted_newline_across_chunks(self):
+        data = self.csv('"Two\r\nLines, quoted"', 'Plain')
+        for size in (1, 5, 64, len(data)):
+            with self.subTest(size=size):
+                response = FakeResponse(self.split(data, size))
+                self.assertEqual(self.names(response), [['Two\r\nLines, quoted', 'Plain']])
+                self.assertTrue(response.closed)
+
+    def test_byte_order_mark(self):
+        data = b'\xef\xbb\xbf' + self.csv('Plain')
+        for size in (1, 2, len(data)):
+            with self.subTest(size=size):
+                self.assertEqual(self.names(FakeResponse(self.split(data, size))), [['Plain']])
+
+    def test_multibyte_character_split(self):
+        data = self.csv('Zürich', '東京')
+        self.assertEqual(self.names(FakeResponse(self.split(data, 1))), [['Zürich', '東京']])
+        start = data.index('ü'.encode('utf-8'))
+        response = FakeResponse([data[:start + 1], data[start + 1:]])
+        self.assertEqual(self.names(response), [['Zürich', '東京']])
+
+    def test_batches(self):
+        self.command.BATCH_SIZE = 2
+        self.assertEqual(self.names(FakeResponse([self.csv('A', 'B', 'C')])), [['A', 'B'], ['C']])
+
+    def test_download_error_raised(self):
+        data = self.csv('Plain')
+        response = FakeResponse([data[:20]], error=ConnectionError('reset'))
+        with self.assertRaisesRegex(ConnectionError, 'reset'):
+            self.names(response)
+        self.assertTrue(response.closed)
+
+
+class TimeZoneResolverTests(SimpleTestCase):
+    # A square zone with a hole holding a smaller zone, and a triangle whose
+    # diagonal runs through the middle of grid cells
+    BOUNDARIES = {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'properties': {'tzid': 'Test/Outer'}, 'geometry': {'type': 'Polygon', 'coordinates': [
+            [[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]],
+            [[4, 4], [4, 6], [6, 6], [6, 4], [4, 4]],
+        ]}},
+        {'type': 'Feature', 'properties': {'tzid': 'Test/Inner'}, 'geometry': {'type': 'MultiPolygon', 'coordinates': [
+            [[[4.5, 4.5], [5.5, 4.5], [5.5, 5.5], [4.5, 5.5], [4.5, 4.5]]],
+        ]}},
+        {'type': 'Feature', 'properties': {'tzid': 'Test/Triangle'}, 'geometry': {'type': 'Polygon', 'coordinates': [
+            [[20, 0], [30, 0], [20, 10], [20, 0]],
+        ]}},
+    ]}
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.geojson') as file:
+            json.dump(self.BOUNDARIES, file)
+            file.flush()
+            self.resolver = TimeZoneResolver.from_file(file.name)
+
+    def test_resolve(self):
+        self.assertEqual(self.resolver.resolve(2, 2), 'Test/Outer')
+        self.assertEqual(self.resolver.resolve(9.9, 0.1), 'Test/Outer')
+        # Inside the hole, and inside the zone filling part of it
+        self.assertIsNone(self.resolver.resolve(4.2, 4.2))
+        self.assertEqual(self.resolver.resolve(5.0, 5.2), 'Test/Inner')
+        self.assertIsNone(self.resolver.resolve(5.7, 5.0))
+        # Either side of the triangle's diagonal within one cell
+        self.assertEqual(self.resolver.resolve(5.5, 24.4), 'Test/Triangle')
+        self.assertIsNone(self.resolver.resolve(5.5, 24.6))
+        self.assertIsNone(self.resolver.resolve(-1, 5))
+
+    def test_nautical_fallback(self):
+        with mock.patch('airport_info.tzresolver._resolver', self.resolver):
+            self.assertEqual(resolve_timezone_id(4.2, 4.2), 'Etc/GMT')
+            self.assertEqual(resolve_timezone_id(30, -100), 'Etc/GMT+7')
+            self.assertEqual(resolve_timezone_id(-20, 170), 'Etc/GMT-11')
+            self.assertEqual(resolve_timezone_id(1, 21), 'Test/Triangle')
+
+
+class GetOrCreateTimeZoneTests(TestCase):
+    def test_creates_zone_once(self):
+        tokyo = get_or_create_timezone('Asia/Tokyo')
+        self.assertEqual((tokyo.raw_offset, tokyo.timezone_name), (32400, 'JST'))
+        self.assertEqual(get_or_create_timezone('Asia/Tokyo'), tokyo)
+        self.assertIsNone(get_or_create_timezone('Not/AZone'))
+
+    def test_concurrently_created_zone_reused(self):
+        tokyo = get_or_create_timezone('Asia/Tokyo')
+        # Another thread created the row after this one found none
+        with mock.patch.object(QuerySet, 'first', return_value=None):
+            self.assertEqual(get_or_create_timezone('Asia/Tokyo'), tokyo)
+        self.assertEqual(TimeZone.objects.filter(timezone_id='Asia/Tokyo').count(), 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TimeZone.objects.create(name='Asia/Tokyo', timezone_id='Asia/Tokyo')
+
+
+CLDR_XML = b"""<?xml version="1.0" encoding="UTF-8" ?>
+<ldmlBCP47>
+    <keyword>
+        <key name="cu" description="Currency type key">
+            <type name="usd" alias="Asia/Tokyo"/>
+        </key>
+        <key name="tz" description="Time zone key">
+            <type name="inccu" description="Kolkata, India" alias="Asia/Calcutta Asia/Kolkata" iana="Asia/Kolkata"/>
+            <type name="uaiev" description="Kyiv, Ukraine" alias="Europe/Kiev" iana="Europe/Kyiv"/>
+            <type name="jptyo" description="Tokyo, Japan" alias="Asia/Tokyo Japan"/>
+            <type name="unk" description="Unknown location"/>
+        </key>
+    </keyword>
+</ldmlBCP47>
+"""
+
+
+class FakeAliasResponse(FakeResponse):
+    def __init__(self, status_code, body=b'', headers=None):
+        super().__init__([body] if body else [])
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TimeZoneAliasTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'timezone.xml')
+        overridden = override_settings(TIMEZONE_ALIASES_FILE=self.path)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+
+    def test_parse_aliases(self):
+        index = parse_aliases(io.BytesIO(CLDR_XML))
+        self.assertEqual(len(index), 6)
+        self.assertEqual(index.canonical('Asia/Calcutta'), 'Asia/Kolkata')
+        self.assertEqual(index.canonical('Europe/Kiev'), 'Europe/Kyiv')
+        self.assertEqual(index.canonical('Japan'), 'Asia/Tokyo')
+        self.assertEqual(index.aliases('Asia/Kolkata'), {'Asia/Calcutta'})
+        self.assertEqual(index.aliases('Europe/Kyiv'), {'Europe/Kiev'})
+        self.assertEqual(index.aliases('Asia/Tokyo'), {'Japan'})
+        self.assertNotIn('usd', index)
+        self.assertIsNone(index.canonical('Nowhere/Else'))
+        self.assertEqual(index.aliases('Nowhere/Else'), frozenset())
+
+    def test_only_changed_aliases_updated(self):
+        kolkata = TimeZone.objects.create(name='Asia/Kolkata', timezone_id='Asia/Kolkata', aliases='Asia/Calcutta')
+        kyiv = TimeZone.objects.create(name='Europe/Kyiv', timezone_id='Europe/Kyiv', aliases='')
+        TimeZone.objects.create(name='Unnamed')
+        command = import_timezone_aliases.Command()
+        with mock.patch.object(TimeZone.objects, 'bulk_update', wraps=TimeZone.objects.bulk_update) as bulk_update, \
+                mock.patch.object(import_timezone_aliases, 'drop_timezone_payloads') as drop:
+            counts = command.update_timezone_aliases(parse_aliases(io.BytesIO(CLDR_XML)))
+        self.assertEqual(counts, (1, 1, 1))
+        self.assertEqual(bulk_update.call_args.args[0], [kyiv])
+        self.assertEqual(list(drop.call_args.args[0]), [kyiv.pk])
+        self.assertEqual(TimeZone.objects.get(pk=kyiv.pk).aliases, 'Europe/Kiev')
+        self.assertEqual(TimeZone.objects.get(pk=kolkata.pk).aliases, 'Asia/Calcutta')
+
+    def test_import_stores_snapshot_and_etag(self):
+        TimeZone.objects.create(name='Asia/Kolkata', timezone_id='Asia/Kolkata')
+        response = FakeAliasResponse(200, CLDR_XML, {'ETag': '"v1"'})
+        with mock.patch.object(import_timezone_aliases.requests, 'get', return_value=response) as get:
+            call_command('import_timezone_aliases', stdout=io.StringIO())
+        self.assertNotIn('If-None-Match', get.call_args.kwargs['headers'])
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), CLDR_XML)
+        self.assertEqual(TimeZone.objects.get(timezone_id='Asia/Kolkata').aliases, 'Asia/Calcutta')
+        self.assertEqual(DataSource.objects.get(url=import_timezone_aliases.Command.TIMEZONE_URL).last_etag, '"v1"')
+
+    def test_not_modified_keeps_snapshot(self):
+        with open(self.path, 'wb') as f:
+            f.write(CLDR_XML)
+        os.utime(self.path, (0, 0))
+        DataSource.objects.create(
+            url=import_timezone_aliases.Command.TIMEZONE_URL, last_download=timezone.now(), last_etag='"v1"'
+        )
+        response = FakeAliasResponse(304)
+        with mock.patch.object(import_timezone_aliases.requests, 'get', return_value=response) as get, \
+                mock.patch.object(import_timezone_aliases.Command, 'update_timezone_aliases') as update:
+            call_command('import_timezone_aliases', stdout=io.StringIO())
+        self.assertEqual(get.call_args.kwargs['headers']['If-None-Match'], '"v1"')
+        self.assertTrue(response.closed)
+        update.assert_not_called()
+        self.assertEqual(os.stat(self.path).st_mtime, 0)
+
+    def test_missing_snapshot_downloaded_unconditionally(self):
+        DataSource.objects.create(
+            url=import_timezone_aliases.Command.TIMEZONE_URL, last_download=timezone.now(), last_etag='"v1"'
+        )
+        response = FakeAliasResponse(200, CLDR_XML, {'ETag': '"v1"'})
+        with mock.patch.object(import_timezone_aliases.requests, 'get', return_value=response) as get:
+            call_command('import_timezone_aliases', stdout=io.StringIO())
+        self.assertNotIn('If-None-Match', get.call_args.kwargs['headers'])
+        self.assertTrue(os.path.exists(self.path))
+
+
+    def write_snapshot(self, data, mtime):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+        os.utime(self.path, (mtime, mtime))
+
+    @override_settings(TIMEZONE_ALIASES_CHECK_INTERVAL=0)
+    @mock.patch.object(tzaliases, '_registry', None)
+    def test_registry_reloaded_when_snapshot_changes(self):
+        self.assertEqual(len(get_alias_index()), 0)
+        self.write_snapshot(CLDR_XML, 1000)
+        index = get_alias_index()
+        self.assertEqual(index.aliases('Asia/Kolkata'), {'Asia/Calcutta'})
+        self.assertIs(get_alias_index(), index)
+
+        self.write_snapshot(CLDR_XML.replace(b'Asia/Calcutta ', b'Asia/Calcutta Asia/Bombay '), 2000)
+        self.assertEqual(get_alias_index().aliases('Asia/Kolkata'), {'Asia/Bombay', 'Asia/Calcutta'})
+
+        # A snapshot that fails to parse keeps the last good index
+        index = get_alias_index()
+        self.write_snapshot(b'<ldmlBCP47>', 3000)
+        self.assertIs(get_alias_index(), index)
+
+    @mock.patch.object(tzaliases, '_registry', None)
+    def test_zone_created_from_google_gets_aliases(self):
+        self.write_snapshot(CLDR_XML, 1000)
+        airfield = Airfield.objects.create(
+            id='1', ident='VABB', name='Mumbai', latitude=Decimal('19.088'), longitude=Decimal('72.868')
+        )
+        data = {'timeZoneId': 'Asia/Kolkata', 'rawOffset': 19800, 'dstOffset': 0, 'timeZoneName': 'IST'}
+        with mock.patch.object(tzresolver, 'resolve_timezone_id', return_value=None), \
+                mock.patch.object(tzcells, 'cell_timezone', return_value=None), \
+                mock.patch.object(google_timezone.client, 'lookup', return_value=data):
+            kolkata = airfield.resolve_timezone('key')
+        self.assertEqual((kolkata.timezone_id, kolkata.aliases), ('Asia/Kolkata', 'Asia/Calcutta'))
+
+class TimeZoneCellTests(TestCase):
+    def setUp(self):
+        self.tokyo = TimeZone.objects.create(name='Asia/Tokyo', timezone_id='Asia/Tokyo', raw_offset=32400)
+        self.seoul = TimeZone.objects.create(name='Asia/Seoul', timezone_id='Asia/Seoul', raw_offset=32400)
+        self.point = (Decimal('35.5494'), Decimal('139.7798'))
+        self.cells = neighbors(*self.point, tzcells.CELL_PRECISION)
+
+    def test_interior_cell_trusted(self):
+        self.assertIsNone(tzcells.cell_timezone(*self.point))
+        tzcells.record_cell_timezone(*self.point, self.tokyo)
+        TimeZoneCell.objects.create(cell=self.cells[1], timezone=self.tokyo)
+        self.assertEqual(tzcells.cell_timezone(*self.point), self.tokyo)
+        # Another point in the same cell
+        self.assertEqual(tzcells.cell_timezone(Decimal('35.5490'), Decimal('139.7790')), self.tokyo)
+
+    def test_border_cell_falls_through(self):
+        tzcells.record_cell_timezone(*self.point, self.tokyo)
+        tzcells.record_cell_timezone(*self.point, self.tokyo)
+        self.assertFalse(TimeZoneCell.objects.get(cell=self.cells[0]).border)
+        tzcells.record_cell_timezone(*self.point, self.seoul)
+        cell = TimeZoneCell.objects.get(cell=self.cells[0])
+        self.assertEqual((cell.border, cell.timezone), (True, self.tokyo))
+        self.assertIsNone(tzcells.cell_timezone(*self.point))
+
+    def test_border_neighbour_falls_through(self):
+        tzcells.record_cell_timezone(*self.point, self.tokyo)
+        TimeZoneCell.objects.create(cell=self.cells[1], timezone=self.tokyo, border=True)
+        self.assertIsNone(tzcells.cell_timezone(*self.point))
+
+    def test_disagreeing_neighbour_falls_through(self):
+        tzcells.record_cell_timezone(*self.point, self.tokyo)
+        TimeZoneCell.objects.create(cell=self.cells[-1], timezone=self.seoul)
+        self.assertIsNone(tzcells.cell_timezone(*self.point))
+
+
+@mock.patch.object(HitCounter, '_run')
+class HitCounterTests(TestCase):
+    def setUp(self):
+        for id in ('1', '2'):
+            Airfield.objects.create(
+                id=id, ident=f'X{id}', name=f'Airfield {id}', latitude=Decimal('0'), longitude=Decimal('0')
+            )
+
+    def hits(self):
+        return dict(AirfieldAccess.objects.values_list('airfield_id', 'hit_count'))
+
+    def test_record_leaves_writes_to_flush_thread(self, run):
+        counter = HitCounter()
+        with self.assertNumQueries(0):
+            counter.record(['1', '1'])
+            counter.record(['2'])
+        counter._thread.join(5)
+        run.assert_called_once()
+        counter.flush()
+        self.assertEqual(self.hits(), {'1': 2, '2': 1})
+
+    def test_exit_flush_skips_other_database(self, run):
+        counter = HitCounter()
+        counter.record(['1'])
+        with mock.patch.dict(connection.settings_dict, NAME='other'):
+            counter.flush_at_exit()
+        self.assertEqual(self.hits(), {})
+        counter.flush_at_exit()
+        self.assertEqual(self.hits(), {'1': 1})
+
+
+class BackfillTimezonesTests(TestCase):
+    def setUp(self):
+        self.utc = TimeZone.objects.create(name='UTC', timezone_id='UTC', raw_offset=0)
+        self.tokyo = TimeZone.objects.create(name='Asia/Tokyo', timezone_id='Asia/Tokyo', raw_offset=32400)
+        for id, country, airport_type, zone in [
+            ('1', 'JP', 'large_airport', None), ('2', 'JP', 'small_airport', None), ('3', 'JP', 'large_airport', None),
+            ('4', 'JP', 'heliport', self.utc), ('5', 'JP', 'large_airport', None), ('6', 'US', 'large_airport', None),
+            ('7', 'JP', 'large_airport', self.tokyo),
+        ]:
+            Airfield.objects.create(
+                id=id, ident=f'X{id}', name=f'Airfield {id}', iso_country=country, type=airport_type,
+                timezone=zone, latitude=Decimal('35'), longitude=Decimal('139')
+            )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = os.path.join(directory.name, 'backfill.json')
+        self.resolved = []
+
+    def resolve(self, airfield, api_key, qps=None):
+        self.resolved.append(airfield.id)
+        if airfield.id == self.interrupt_at:
+            raise KeyboardInterrupt
+        return self.tokyo
+
+    def backfill(self, *args):
+        with mock.patch.object(Airfield, 'resolve_timezone', autospec=True, side_effect=self.resolve):
+            call_command('backfill_timezones', *args, '--workers', '2', '--checkpoint', self.checkpoint,
+                         stdout=io.StringIO())
+
+    @mock.patch.object(backfill_timezones.Command, 'CHUNK_SIZE', 2)
+    def test_resume_after_interruption(self):
+        self.interrupt_at = '5'
+        with mock.patch.object(backfill_timezones, 'refresh_payloads', wraps=backfill_timezones.refresh_payloads) \
+                as refresh, self.assertRaises(KeyboardInterrupt):
+            self.backfill('--country', 'jp')
+        # Two chunks (missing and UTC timezones, in id order) were written and checkpointed
+        refresh.assert_called()
+        with open(self.checkpoint) as file:
+            self.assertEqual(json.load(file)['last_id'], '4')
+        self.assertEqual(
+            dict(Airfield.objects.values_list('id', 'timezone__timezone_id')),
+            {'1': 'Asia/Tokyo', '2': 'Asia/Tokyo', '3': 'Asia/Tokyo', '4': 'Asia/Tokyo', '5': None, '6': None,
+             '7': 'Asia/Tokyo'}
+        )
+        self.assertTrue(AirfieldPayload.objects.filter(airfield_id='1').exists())
+
+        self.interrupt_at = None
+        self.resolved = []
+        with mock.patch.object(Airfield.objects, 'bulk_update', wraps=Airfield.objects.bulk_update) as bulk_update:
+            self.backfill('--country', 'jp')
+        self.assertEqual(self.resolved, ['5'])
+        self.assertEqual([airfield.id for airfield in bulk_update.call_args.args[0]], ['5'])
+        self.assertEqual(Airfield.objects.get(id='5').timezone, self.tokyo)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_restart_ignores_checkpoint(self):
+        backfill_timezones.Command().save_checkpoint(
+            self.checkpoint, {'missing': False, 'utc': False, 'stale_days': None, 'country': None, 'type': None},
+            '5', {'updated': 4}
+        )
+        self.interrupt_at = None
+        self.backfill('--restart')
+        self.assertEqual(self.resolved, ['1', '2', '3', '4', '5', '6'])
+
+    def test_selectors(self):
+        self.interrupt_at = None
+        self.backfill('--utc')
+        self.assertEqual(self.resolved, ['4'])
+        self.resolved = []
+        self.backfill('--missing', '--type', 'large_airport', '--country', 'US')
+        self.assertEqual(self.resolved, ['6'])
+        self.resolved = []
+        Airfield.objects.filter(id='7').update(timezone_last_updated=timezone.now() - timezone.timedelta(days=60))
+        Airfield.objects.exclude(id='7').update(timezone_last_updated=timezone.now())
+        self.backfill('--stale-days', '30')
+        self.assertEqual(self.resolved, ['7'])
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        airfield_index.invalidate()
+        self.tokyo = TimeZone.objects.create(name='Asia/Tokyo', timezone_id='Asia/Tokyo', raw_offset=32400)
+        self.haneda = Airfield.objects.create(
+            id='5', ident='RJTT', iata_code='HND', gps_code='RJTT', name='Tokyo Haneda', type='large_airport',
+            latitude=Decimal('35.55'), longitude=Decimal('139.78'), timezone=self.tokyo
+        )
+        Airfield.objects.create(
+            id='6', ident='RJAA', iata_code='NRT', name='Narita', type='large_airport',
+            latitude=Decimal('35.76'), longitude=Decimal('140.38'), timezone=self.tokyo
+        )
+
+    def test_version_bump_invalidates_every_response(self):
+        set_cached_response('iata', 'HND', False, 'haneda')
+        set_cached_response('iata', 'NRT', False, 'narita')
+        version = get_dataset_version()
+        self.assertEqual(get_cached_response('iata', 'HND', False), 'haneda')
+        self.assertGreater(bump_dataset_version(), version)
+        self.assertIsNone(get_cached_response('iata', 'HND', False))
+        self.assertIsNone(get_cached_response('iata', 'NRT', False))
+
+        # An evicted version comes back above every version used before it
+        set_cached_response('iata', 'HND', False, 'haneda')
+        cache.delete(DATASET_VERSION_KEY)
+        self.assertIsNone(get_cached_response('iata', 'HND', False))
+
+    def test_timezone_update_drops_only_that_airfields_responses(self):
+        for code in ('HND', 'NRT'):
+            self.assertEqual(self.client.get('/api/airports/by_iata/', {'code': code}).status_code, 200)
+        self.client.get('/api/airports/by_icao/', {'code': 'RJTT'})
+        self.client.get('/api/airports/5/')
+        version = get_dataset_version()
+
+        utc = TimeZone.objects.create(name='UTC', timezone_id='UTC', raw_offset=0)
+        with mock.patch.object(Airfield, 'resolve_timezone', return_value=utc):
+            self.haneda.update_timezone('key')
+        self.assertEqual(get_dataset_version(), version)
+        self.assertIsNone(get_cached_response('iata', 'HND', False))
+        self.assertIsNone(get_cached_response('icao', 'RJTT', False))
+        self.assertIsNone(get_cached_response('id', '5', True))
+        self.assertIsNotNone(get_cached_response('iata', 'NRT', False))
+        response = self.client.get('/api/airports/by_iata/', {'code': 'HND'})
+        self.assertEqual(response.json()['timezone']['timezone_id'], 'UTC')
+
+
+class TimeZoneRefreshQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        airfield_index.invalidate()
+        for id, iata_code in (('1', 'AAA'), ('2', 'BBB')):
+            Airfield.objects.create(
+                id=id, ident=f'X{id}', iata_code=iata_code, name=f'Airfield {id}', type='small_airport',
+                latitude=Decimal('0'), longitude=Decimal('0')
+            )
+        self.worker = run_timezone_worker.Command()
+
+    def job(self, airfield_id='1'):
+        return TimeZoneRefreshJob.objects.get(airfield_id=airfield_id)
+
+    def set_job(self, airfield_id='1', **values):
+        TimeZoneRefreshJob.objects.filter(airfield_id=airfield_id).update(**values)
+
+    def test_active_jobs_deduplicated(self):
+        self.assertEqual(enqueue_timezone_refresh(['1', '2', '1']), 2)
+        self.assertEqual(enqueue_timezone_refresh(['1']), 0)
+        self.set_job(status=TimeZoneRefreshJob.STATUS_RUNNING)
+        self.assertEqual(enqueue_timezone_refresh(['1']), 0)
+        self.assertEqual(self.job().status, TimeZoneRefreshJob.STATUS_RUNNING)
+        self.assertEqual(TimeZoneRefreshJob.objects.count(), 2)
+
+    def test_done_job_requeued(self):
+        enqueue_timezone_refresh(['1'])
+        self.set_job(status=TimeZoneRefreshJob.STATUS_DONE, attempts=2)
+        self.assertEqual(enqueue_timezone_refresh(['1']), 1)
+        self.assertEqual((self.job().status, self.job().attempts), (TimeZoneRefreshJob.STATUS_PENDING, 0))
+
+    def test_failed_job_held_for_a_day(self):
+        enqueue_timezone_refresh(['1'])
+        self.set_job(status=TimeZoneRefreshJob.STATUS_FAILED, updated=timezone.now() - timezone.timedelta(hours=23))
+        self.assertEqual(enqueue_timezone_refresh(['1']), 0)
+        self.assertEqual(self.job().status, TimeZoneRefreshJob.STATUS_FAILED)
+        self.set_job(updated=timezone.now() - timezone.timedelta(hours=25))
+        self.assertEqual(enqueue_timezone_refresh(['1']), 1)
+        self.assertEqual(self.job().status, TimeZoneRefreshJob.STATUS_PENDING)
+
+    def test_abandoned_running_jobs_reclaimed(self):
+        enqueue_timezone_refresh(['1', '2'])
+        now = timezone.now()
+        self.set_job('1', status=TimeZoneRefreshJob.STATUS_RUNNING, updated=now - timezone.timedelta(minutes=11))
+        self.set_job('2', status=TimeZoneRefreshJob.STATUS_RUNNING, updated=now - timezone.timedelta(minutes=5))
+        self.assertEqual([job.airfield_id for job in self.worker.claim_jobs(10)], ['1'])
+        self.assertEqual(self.job('1').status, TimeZoneRefreshJob.STATUS_RUNNING)
+        self.assertEqual(self.worker.claim_jobs(10), [])
+
+    def test_backoff_doubles_until_max_attempts(self):
+        enqueue_timezone_refresh(['1'])
+        delays = []
+        with mock.patch.object(Airfield, 'update_timezone', return_value=None):
+            for _ in range(self.worker.MAX_ATTEMPTS):
+                self.set_job(run_after=timezone.now())
+                job, = self.worker.claim_jobs(10)
+                started = timezone.now()
+                self.assertFalse(self.worker.process_job(job))
+                job = self.job()
+                delays.append(round((job.run_after - started).total_seconds()))
+        self.assertEqual(delays[:-1], [60, 120, 240, 480])
+        self.assertEqual((job.status, job.attempts), (TimeZoneRefreshJob.STATUS_FAILED, 5))
+        self.assertEqual(job.last_error, 'Timezone lookup failed')
+
+    def test_successful_job_done(self):
+        enqueue_timezone_refresh(['1'])
+        utc = TimeZone.objects.create(name='UTC', timezone_id='UTC', raw_offset=0)
+        with mock.patch.object(Airfield, 'update_timezone', return_value=utc):
+            job, = self.worker.claim_jobs(10)
+            self.assertTrue(self.worker.process_job(job))
+        self.assertEqual(self.job().status, TimeZoneRefreshJob.STATUS_DONE)
+
+    def test_lookup_flags_refreshing_timezone(self):
+        response = self.client.get('/api/airports/by_iata/', {'code': 'AAA', 'include_timezone': 'true'})
+        self.assertTrue(response.json()['timezone_refreshing'])
+        self.assertIsNone(response.json()['timezone'])
+        self.assertEqual(self.job().status, TimeZoneRefreshJob.STATUS_PENDING)
+
+        response = self.client.get('/api/airports/by_iata/', {'code': 'BBB'})
+        self.assertFalse(response.json()['timezone_refreshing'])
+        self.assertFalse(TimeZoneRefreshJob.objects.filter(airfield_id='2').exists())
+
+
+class AirfieldIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.utc = TimeZone.objects.create(name='UTC', timezone_id='UTC', raw_offset=0)
+        for id, iata_code in (('1', 'AAA'), ('2', 'BBB'), ('3', 'CCC')):
+            Airfield.objects.create(
+                id=id, ident=f'X{id}', iata_code=iata_code, name=f'Airfield {id}', type='small_airport',
+                latitude=Decimal('0'), longitude=Decimal('0'), timezone=self.utc
+            )
+        self.index = AirfieldIndex()
+
+    def refresh(self):
+        self.index.invalidate()
+        with mock.patch.object(self.index, '_build', wraps=self.index._build) as build:
+            self.index.by_id('1')
+        return build.called
+
+    def test_snapshot(self):
+        record = self.index.by_iata('AAA')
+        self.assertEqual((record.id, record.name, record.timezone.timezone_id), ('1', 'Airfield 1', 'UTC'))
+        self.assertIs(self.index.by_icao('X2'), self.index.by_id('2'))
+        self.assertIsNone(self.index.by_iata('ZZZ'))
+        self.assertFalse(self.refresh())
+        self.assertIs(self.index.by_iata('AAA'), record)
+
+    def test_updated_airfields_patched(self):
+        generation = self.index._current().generation
+        airfield = Airfield.objects.get(id='1')
+        airfield.iata_code = 'AAB'
+        airfield.save()
+        self.assertFalse(self.refresh())
+        self.assertIsNone(self.index.by_iata('AAA'))
+        self.assertEqual(self.index.by_iata('AAB').id, '1')
+        self.assertEqual(self.index._current().generation, generation + 1)
+
+        Airfield.objects.filter(id='2').update(timezone=None, updated=timezone.now())
+        self.assertFalse(self.refresh())
+        self.assertIsNone(self.index.by_iata('BBB').timezone)
+        self.assertEqual(self.index._current().generation, generation + 1)
+
+    def test_late_commit_patched(self):
+        # Airfield 2 is committed after airfield 1 but stamped before it
+        now = timezone.now()
+        Airfield.objects.filter(id='2').update(updated=now - timezone.timedelta(days=1))
+        Airfield.objects.filter(id='1').update(updated=now)
+        self.index.by_id('1')
+        Airfield.objects.filter(id='2').update(name='Renamed', updated=now - timezone.timedelta(seconds=1))
+        self.assertFalse(self.refresh())
+        self.assertEqual(self.index.by_id('2').name, 'Renamed')
+
+    def test_many_changes_rebuilt(self):
+        self.index.by_id('1')
+        Airfield.objects.filter(id__in=['1', '2']).update(name='Renamed', updated=timezone.now())
+        with mock.patch('airport_info.index.PATCH_LIMIT', 2):
+            self.assertTrue(self.refresh())
+        self.assertEqual(self.index.by_id('2').name, 'Renamed')
+
+    def test_version_change_rebuilt(self):
+        self.index.by_id('1')
+        # An import writing a row stamped before the indexed ones, and a deletion
+        Airfield.objects.filter(id='2').update(name='Renamed', updated=timezone.now() - timezone.timedelta(days=1))
+        Airfield.objects.filter(id='3').delete()
+        bump_dataset_version()
+        self.assertTrue(self.refresh())
+        self.assertEqual(self.index.by_id('2').name, 'Renamed')
+        self.assertIsNone(self.index.by_iata('CCC'))
+        self.assertFalse(self.refresh())
@@ -0,0 +1,111 @@
+from django.conf import settings
+from pathlib import Path
+import logging
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+
+class AliasIndex:
+    """
+    Bidirectional timezone alias index built from CLDR bcp47/timezone.xml.
+
+    Every name in a CLDR timezone entry (its short aliases and IANA names)
+    maps to the entry's canonical IANA id and to the full set of names, so
+    looking up any name is a single dict access.
+    """
+
+    def __init__(self):
+        self._canonical = {}
+        self._names = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def add(self, names, canonical_id):
+        names = frozenset(names)
+        for name in names:
+            self._canonical.setdefault(name, canonical_id)
+            self._names.setdefault(name, names)
+
+    def canonical(self, name):
+        """Canonical IANA id for a name, or None if CLDR does not know it."""
+        return self._canonical.get(name)
+
+    def aliases(self, name):
+        """Every other name CLDR lists for the same zone."""
+        return self._names.get(name, frozenset()) - {name}
+
+
+def parse_aliases(source):
+    """
+    Build an AliasIndex from CLDR timezone XML.
+
+    source is a file name or binary file object; the XML is read with
+    iterparse and each element is cleared once handled, so memory does not
+    grow with the size of the document.
+    """
+    index = AliasIndex()
+    in_tz = False
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if elem.tag == 'key':
+            in_tz = event == 'start' and elem.get('name') == 'tz'
+            if event == 'end':
+                elem.clear()
+        elif event == 'end' and elem.tag == 'type':
+            if in_tz and elem.get('alias'):
+                names = elem.get('alias').split()
+                iana_names = (elem.get('iana') or '').split()
+                # The iana attribute, when present, names the current IANA id first
+                index.add(names + iana_names, (iana_names or names)[0])
+            elem.clear()
+    return index
+
+
+_registry = None
+_registry_mtime = None
+_registry_checked = 0.0
+_registry_lock = threading.Lock()
+
+
+def get_alias_index():
+    """
+    Return the process-wide AliasIndex loaded from settings.TIMEZONE_ALIASES_FILE.
+
+    The snapshot is written by import_timezone_aliases; its modification time
+    is checked at most every TIMEZONE_ALIASES_CHECK_INTERVAL seconds and the
+    index reloaded when it changes. Returns an empty index if there is no
+    snapshot yet.
+    """
+    global _registry, _registry_mtime, _registry_checked
+    now = time.monotonic()
+    if _registry is not None and now - _registry_checked < settings.TIMEZONE_ALIASES_CHECK_INTERVAL:
+        return _registry
+
+    with _registry_lock:
+        if _registry is not None and now - _registry_checked < settings.TIMEZONE_ALIASES_CHECK_INTERVAL:
+            return _registry
+        path = Path(settings.TIMEZONE_ALIASES_FILE)
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            mtime = None
+        if _registry is None or mtime != _registry_mtime:
+            if mtime is None:
+                _registry = AliasIndex()
+            else:
+                logger.info(f"Loading timezone aliases from {path}")
+                try:
+                    _registry = parse_aliases(str(path))
+                except (OSError, ET.ParseError) as e:
+                    logger.error(f"Error loading timezone aliases from {path}: {str(e)}")
+                    _registry = _registry or AliasIndex()
+            _registry_mtime = mtime
+        _registry_checked = now
+    return _registry
+
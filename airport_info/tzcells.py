@@ -0,0 +1,34 @@
+from .geohash import encode, neighbors
+from .models import TimeZoneCell
+
+# Geohash precision of a cell: about 4.9 km x 4.9 km
+CELL_PRECISION = 5
+
+
+def cell_timezone(latitude, longitude):
+    """
+    Return the TimeZone recorded for a coordinate's cell, or None.
+
+    The cell is only trusted when it is not a border cell and none of its
+    known neighbours is a border cell or disagrees with it; anything near a
+    zone border falls back to exact resolution.
+    """
+    cells = neighbors(latitude, longitude, CELL_PRECISION)
+    rows = {row.cell: row for row in TimeZoneCell.objects.filter(cell__in=cells).select_related('timezone')}
+    own = rows.get(cells[0])
+    if own is None:
+        return None
+    if any(row.border or row.timezone_id != own.timezone_id for row in rows.values()):
+        return None
+    return own.timezone
+
+
+def record_cell_timezone(latitude, longitude, timezone_obj):
+    """Record an exact lookup for its cell, flagging the cell as a border cell on disagreement."""
+    cell, created = TimeZoneCell.objects.get_or_create(
+        cell=encode(latitude, longitude, CELL_PRECISION),
+        defaults={'timezone': timezone_obj}
+    )
+    if not created and not cell.border and cell.timezone_id != timezone_obj.pk:
+        cell.border = True
+        cell.save(update_fields=['border', 'updated'])
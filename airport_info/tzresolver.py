@@ -0,0 +1,202 @@
+"""
+Offline timezone resolution from latitude/longitude.
+
+Timezones are resolved by point-in-polygon tests against a timezone boundary
+dataset such as the GeoJSON released by timezone-boundary-builder
+(https://github.com/evansiroky/timezone-boundary-builder). Polygon edges are
+bucketed into a one-degree grid, so a lookup only tests the few edges that
+cross the point's cell rather than whole polygon rings.
+"""
+from django.conf import settings
+from django.utils import timezone
+from pathlib import Path
+from .offsets import zone_offsets
+from .tzaliases import get_alias_index
+import json
+import logging
+import math
+import numpy as np
+import threading
+
+logger = logging.getLogger(__name__)
+
+GRID_SIZE = 1.0  # degrees
+
+
+class TimeZoneResolver:
+    """
+    Resolves IANA timezone ids for coordinates from timezone boundary polygons.
+
+    Polygon edges are bucketed into a one-degree grid. For every cell a
+    polygon reaches, the grid keeps whether the cell's centre is inside the
+    polygon and the polygon's edges that cross the cell. A cell crossed by
+    no edge is entirely inside or outside, and cells entirely outside are
+    not stored. Otherwise a point is inside when the path from it to the
+    centre (across, then up or down) crosses the cell's edges an even
+    number of times and the centre is inside, or an odd number and it is not.
+    """
+
+    def __init__(self, features):
+        self.timezone_ids = []  # timezone id of each polygon
+        self.grid = {}  # (cell_x, cell_y) -> [(polygon, centre inside, edges or None), ...]
+        for feature in features:
+            timezone_id = feature['properties'].get('tzid')
+            geometry = feature.get('geometry') or {}
+            if geometry.get('type') == 'Polygon':
+                parts = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiPolygon':
+                parts = geometry['coordinates']
+            else:
+                continue
+            for rings in parts:
+                self._add_polygon(timezone_id, rings)
+        logger.info(f"Loaded {len(self.timezone_ids)} timezone polygons into {len(self.grid)} grid cells")
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        return cls(data['features'])
+
+    def _add_polygon(self, timezone_id, rings):
+        arrays = [np.asarray(ring, dtype=np.float64)[:, :2] for ring in rings if len(ring) >= 4]
+        if not arrays:
+            return
+        # Even-odd over every ring is inside the exterior and outside the holes
+        edges = np.concatenate([np.hstack([ring[:-1], ring[1:]]) for ring in arrays])
+        index = len(self.timezone_ids)
+        self.timezone_ids.append(timezone_id)
+
+        # Cells touched by each edge's bounding box
+        low_x = np.floor(np.minimum(edges[:, 0], edges[:, 2]) / GRID_SIZE).astype(np.int64)
+        high_x = np.floor(np.maximum(edges[:, 0], edges[:, 2]) / GRID_SIZE).astype(np.int64)
+        low_y = np.floor(np.minimum(edges[:, 1], edges[:, 3]) / GRID_SIZE).astype(np.int64)
+        high_y = np.floor(np.maximum(edges[:, 1], edges[:, 3]) / GRID_SIZE).astype(np.int64)
+        widths = high_x - low_x + 1
+        counts = widths * (high_y - low_y + 1)
+        edge_ids = np.repeat(np.arange(len(edges)), counts)
+        within = np.arange(len(edge_ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells_x = low_x[edge_ids] + within % widths[edge_ids]
+        cells_y = low_y[edge_ids] + within // widths[edge_ids]
+        order = np.lexsort((cells_y, cells_x))
+        edge_ids, cells_x, cells_y = edge_ids[order], cells_x[order], cells_y[order]
+        starts = np.flatnonzero(np.r_[True, (cells_x[1:] != cells_x[:-1]) | (cells_y[1:] != cells_y[:-1])])
+        bounds = np.r_[starts, len(edge_ids)]
+        cell_edges = {
+            (int(cells_x[start]), int(cells_y[start])): edges[edge_ids[start:end]]
+            for start, end in zip(bounds[:-1], bounds[1:])
+        }
+
+        for cell_y in range(int(low_y.min()), int(high_y.max()) + 1):
+            # Crossings of the row's centre line, to classify each cell's centre
+            centre_y = (cell_y + 0.5) * GRID_SIZE
+            crossings = np.sort(self._crossings(edges, centre_y))
+            for cell_x in range(int(low_x.min()), int(high_x.max()) + 1):
+                centre_x = (cell_x + 0.5) * GRID_SIZE
+                inside = (len(crossings) - np.searchsorted(crossings, centre_x, side='right')) % 2 == 1
+                cell = (cell_x, cell_y)
+                if cell in cell_edges or inside:
+                    self.grid.setdefault(cell, []).append((index, bool(inside), cell_edges.get(cell)))
+
+    @staticmethod
+    def _cell(value):
+        return math.floor(value / GRID_SIZE)
+
+    @staticmethod
+    def _crossings(edges, y, columns=(0, 1, 2, 3)):
+        """x coordinates where edges cross the line at height y, counting an edge ending on it only from above."""
+        x1, y1, x2, y2 = (edges[:, column] for column in columns)
+        crossing = (y1 > y) != (y2 > y)
+        x1, y1, x2, y2 = x1[crossing], y1[crossing], x2[crossing], y2[crossing]
+        return x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+
+    def _path_crossings(self, edges, x, y, centre_x, centre_y):
+        """Edges crossed going from (x, y) across to centre_x, then along it to centre_y."""
+        across = self._crossings(edges, y)
+        along = self._crossings(edges, centre_x, columns=(1, 0, 3, 2))
+        return (
+            np.count_nonzero((across > min(x, centre_x)) & (across <= max(x, centre_x)))
+            + np.count_nonzero((along > min(y, centre_y)) & (along <= max(y, centre_y)))
+        )
+
+    def resolve(self, latitude, longitude):
+        """Return the IANA timezone id for a coordinate, or None if no polygon contains it."""
+        x, y = float(longitude), float(latitude)
+        cell_x, cell_y = self._cell(x), self._cell(y)
+        centre_x, centre_y = (cell_x + 0.5) * GRID_SIZE, (cell_y + 0.5) * GRID_SIZE
+        for index, inside, edges in self.grid.get((cell_x, cell_y), ()):
+            if edges is not None and self._path_crossings(edges, x, y, centre_x, centre_y) % 2:
+                inside = not inside
+            if inside:
+                return self.timezone_ids[index]
+        return None
+
+
+def nautical_timezone_id(longitude):
+    """Etc/GMT zone for a point at sea; note that Etc/GMT signs are inverted."""
+    offset = round(float(longitude) / 15)
+    if offset == 0:
+        return 'Etc/GMT'
+    return f"Etc/GMT{'+' if offset < 0 else '-'}{abs(offset)}"
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver():
+    """Return the process-wide resolver, or None if no boundary file is configured."""
+    global _resolver
+    if _resolver is None:
+        path = settings.TIMEZONE_BOUNDARIES_FILE
+        if not path or not Path(path).exists():
+            return None
+        with _resolver_lock:
+            if _resolver is None:
+                logger.info(f"Loading timezone boundaries from {path}")
+                _resolver = TimeZoneResolver.from_file(path)
+    return _resolver
+
+
+def resolve_timezone_id(latitude, longitude):
+    """
+    Resolve a coordinate to an IANA timezone id without any network access.
+
+    Returns None when no boundary file is available. Points outside every
+    polygon (i.e. at sea, for datasets without oceans) get a nautical zone.
+    """
+    resolver = get_resolver()
+    if resolver is None:
+        return None
+    return resolver.resolve(latitude, longitude) or nautical_timezone_id(longitude)
+
+
+def get_or_create_timezone(timezone_id):
+    """Return the TimeZone row for an IANA id, creating it with its current offsets from zoneinfo."""
+    from .models import TimeZone
+
+    timezone_obj = TimeZone.objects.filter(timezone_id=timezone_id).first()
+    if timezone_obj:
+        return timezone_obj
+
+    offsets = zone_offsets(timezone_id)
+    if offsets is None:
+        logger.error(f"Unknown timezone id from boundary data: {timezone_id}")
+        return None
+
+    # Backfill threads may race to create the same zone; get_or_create
+    # retries the get when the unique timezone_id rejects the insert
+    timezone_obj, created = TimeZone.objects.get_or_create(
+        timezone_id=timezone_id,
+        defaults={
+            'name': timezone_id,
+            'raw_offset': offsets.raw_offset,
+            'dst_offset': offsets.dst_offset,
+            'timezone_name': offsets.abbreviation,
+            'aliases': ' '.join(sorted(get_alias_index().aliases(timezone_id))),
+            'last_updated': timezone.now(),
+        }
+    )
+    if created:
+        logger.info(f"Created new timezone object for {timezone_id}")
+    return timezone_obj
@@ -1,24 +1,69 @@
 from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from django.conf import settings
-from django.shortcuts import get_object_or_404
+from django.db.models import Q
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from .cache import get_cached_response, set_cached_response
+from .export import gzip_chunks, iter_csv, iter_ndjson
+from .filters import AttributeFilterBackend, GeoFilterBackend
+from .hits import hit_counter
+from .index import airfield_index, airfield_records, airfield_rows
 from .models import Airfield
-from .serializers import AirfieldSerializer
+from .offsets import zone_offsets
+from .pagination import AirfieldCursorPagination
+from .payloads import get_payload, gzip_etag
+from .renderers import CSVRenderer, FastJSONRenderer, NDJSONRenderer
+from .search import database_search
+from .serializers import AirfieldSerializer, BatchLookupSerializer, FastAirfieldSerializer
+from .spatial import KM_PER_NM
+from .tasks import enqueue_timezone_refresh
+import json
 import logging
-from datetime import datetime, timedelta
+import re
+from datetime import timezone as dt_timezone
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
 
 logger = logging.getLogger(__name__)
 
+_CODING_QUALITY = re.compile(r';\s*q\s*=\s*([0-9.]+)', re.IGNORECASE)
+
+
+def accepts_gzip(request):
+    """Whether the request's Accept-Encoding allows gzip, honouring q-values (gzip;q=0 refuses it)."""
+    qualities = {}
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name = coding.split(';', 1)[0].strip().lower()
+        if not name:
+            continue
+        match = _CODING_QUALITY.search(coding)
+        try:
+            qualities[name] = float(match.group(1)) if match else 1.0
+        except ValueError:
+            qualities[name] = 0.0
+    quality = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+    return quality > 0
+
+# Fields of each autocomplete suggestion
+AUTOCOMPLETE_FIELDS = [
+    'id', 'ident', 'iata_code', 'name', 'municipality', 'iso_country', 'type', 'scheduled_service'
+]
+
 class AirfieldViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for retrieving airport information.
     Supports lookup by IATA code or ICAO code (ident).
     """
-    queryset = Airfield.objects.all()
+    queryset = Airfield.objects.select_related('timezone')
     serializer_class = AirfieldSerializer
+    filter_backends = [AttributeFilterBackend, GeoFilterBackend]
+    pagination_class = AirfieldCursorPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
     lookup_field = 'id'
 
     def _log_request_info(self, request, code_type, code):
@@ -39,147 +84,377 @@ class AirfieldViewSet(viewsets.ReadOnlyModelViewSet):
             f"Agent: {info['user_agent']}"
         )
 
-    def _update_timezone_if_needed(self, airport, include_timezone):
-        """Helper method to update timezone data if needed."""
-        logger.info(f"Checking if timezone update needed for {airport}")
-        logger.info(f"include_timezone parameter: {include_timezone}")
-        
+    def _timezone_update_reason(self, airport):
+        """Return why the airport's timezone data needs refreshing, or None if it is current."""
+        if airport.timezone is None:
+            return "no timezone data exists"
+        if (airport.timezone.timezone_id == "UTC" or
+                airport.timezone.timezone_name == "Coordinated Universal Time"):
+            return f"timezone is UTC (id: {airport.timezone.timezone_id}, name: {airport.timezone.timezone_name})"
+        if airport.timezone.timezone_id is None:
+            return "incomplete timezone data"
+        # Offsets are computed locally from zoneinfo; stored ones only matter for ids it does not know
+        if (zone_offsets(airport.timezone.timezone_id) is None and
+                (airport.timezone.raw_offset is None or airport.timezone.dst_offset is None)):
+            return "incomplete timezone data"
+        return None
+
+    def _queue_timezone_refresh_if_needed(self, airport, include_timezone):
+        """
+        Queue a background timezone refresh if the airport's data needs one.
+
+        Returns True when a refresh is pending; the response then carries the
+        existing (possibly placeholder) timezone data instead of waiting for
+        the Google API.
+        """
         if not include_timezone:
             logger.debug("Timezone update skipped - include_timezone=false")
-            return
-            
-        needs_update = False
-        reason = ""
-        
-        if airport.timezone is None:
-            needs_update = True
-            reason = "no timezone data exists"
-        elif (airport.timezone.timezone_id == "UTC" or 
-              airport.timezone.timezone_name == "Coordinated Universal Time"):
-            needs_update = True
-            reason = f"timezone is UTC (id: {airport.timezone.timezone_id}, name: {airport.timezone.timezone_name})"
-        elif (airport.timezone.raw_offset is None or
-              airport.timezone.dst_offset is None or
-              airport.timezone.timezone_id is None or
-              airport.timezone.timezone_name is None):
-            needs_update = True
-            reason = "incomplete timezone data"
-        elif (airport.timezone.last_updated is None or
-              airport.timezone.last_updated < timezone.now() - timedelta(days=90)):
-            needs_update = True
-            reason = f"timezone data is old (last_updated: {airport.timezone.last_updated})"
-        
-        logger.info(f"Needs update: {needs_update}, Reason: {reason}")
-        
-        if needs_update:
-            logger.info(f"Updating timezone for {airport} - Reason: {reason}")
-            logger.info(f"Current timezone data: {airport.timezone.__dict__ if airport.timezone else None}")
-            
-            result = airport.update_timezone(settings.GOOGLE_MAPS_API_KEY)
-            logger.info(f"Update timezone result: {result.__dict__ if result else 'Failed'}")
-            
-            airport.refresh_from_db()
-            logger.info(f"After refresh - timezone data: {airport.timezone.__dict__ if airport.timezone else None}")
-        else:
+            return False
+
+        reason = self._timezone_update_reason(airport)
+        if reason is None:
             logger.info(f"No timezone update needed for {airport}")
+            return False
 
-    @action(detail=False, methods=['get'])
-    def by_iata(self, request):
-        """Get airport by IATA code."""
-        iata = request.query_params.get('code', '').upper()
+        logger.info(f"Queueing timezone refresh for {airport} - Reason: {reason}")
+        enqueue_timezone_refresh([airport.id])
+        return True
+
+    def _cache_timeout(self, payload):
+        """Cache lifetime for a payload, ending at the airport's next UTC offset transition."""
+        if payload.valid_until is None:
+            return settings.CACHE_TTL
+        remaining = (payload.valid_until - timezone.now()).total_seconds()
+        return max(1, min(settings.CACHE_TTL, int(remaining)))
+
+    def _not_modified(self, request, payload):
+        """True if the request's validators match the payload; If-None-Match takes precedence."""
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            # Weak comparison, and either content coding of the same body matches
+            etags = {etag.removeprefix('W/') for etag in parse_etags(if_none_match)}
+            return bool(etags & {'*', payload.etag, gzip_etag(payload.etag)})
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE'))
+        return if_modified_since is not None and int(payload.last_modified.timestamp()) <= if_modified_since
+
+    def _payload_response(self, request, payload):
+        """
+        Return a stored payload's bytes, gzip-compressed if the client accepts it.
+
+        Requests whose If-None-Match or If-Modified-Since validators still
+        match get an empty 304 response instead.
+        """
+        if request.accepted_renderer.format != 'json':
+            # The browsable API renders the data itself
+            return Response(json.loads(payload.body))
+        compress = accepts_gzip(request)
+        if self._not_modified(request, payload):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                payload.gzip_body if compress else payload.body,
+                content_type=request.accepted_renderer.media_type
+            )
+            if compress:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = gzip_etag(payload.etag) if compress else payload.etag
+        response['Last-Modified'] = http_date(payload.last_modified.timestamp())
+        patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+        return response
+
+    def _lookup_response(self, request, code_type, code, find):
+        """Shared implementation of the by_iata and by_icao lookups."""
         include_timezone = request.query_params.get('include_timezone', '').lower() == 'true'
-        logger.info(f"Request params - code: {iata}, include_timezone: {include_timezone}")
-        
-        self._log_request_info(request, 'IATA', iata)
-        
-        if not iata:
+        logger.info(f"Request params - code: {code}, include_timezone: {include_timezone}")
+
+        self._log_request_info(request, code_type, code)
+
+        if not code:
             return Response(
-                {'error': 'IATA code is required'},
+                {'error': f'{code_type} code is required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        at = None
+        if request.query_params.get('at'):
+            try:
+                at = parse_datetime(request.query_params['at'])
+            except ValueError:
+                pass
+            if at is None:
+                return Response(
+                    {'error': 'at must be an ISO 8601 timestamp'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at, dt_timezone.utc)
+
+        lookup = code_type.lower()
         try:
-            airport = get_object_or_404(Airfield, iata_code=iata)
+            # Responses for a specific instant are not cached
+            cached = get_cached_response(lookup, code, include_timezone) if at is None else None
+            if cached is not None:
+                logger.info(f"Cache hit for {code_type} {code}")
+                hit_counter.record([cached.airfield_id])
+                return self._payload_response(request, cached)
+
+            airport = find(code)
+            if airport is None:
+                return Response(
+                    {'error': f'No airport found with {code_type} code {code}'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
             logger.info(f"Found airport: {airport}")
-            
-            # Update timezone if requested
-            if include_timezone:
-                logger.info(f"Updating timezone for {airport}")
-                if airport.timezone:
-                    logger.info(f"Current timezone data: {airport.timezone.timezone_id}, {airport.timezone.timezone_name}")
-                self._update_timezone_if_needed(airport, include_timezone)
-                logger.info(f"After update - timezone data: {airport.timezone.timezone_id if airport.timezone else 'None'}")
-            
-            serializer = self.get_serializer(airport)
-            response_data = serializer.data
-            logger.info(f"Response data for {iata}: {response_data.get('timezone', {})}")
-            
+            hit_counter.record([airport.id])
+
+            refreshing = self._queue_timezone_refresh_if_needed(airport, include_timezone)
+
+            # Don't serve or cache placeholder timezone data that is about to be replaced
+            if not refreshing and at is None:
+                payload = get_payload(airport.id)
+                if payload is not None:
+                    set_cached_response(
+                        lookup, code, include_timezone, payload, timeout=self._cache_timeout(payload)
+                    )
+                    return self._payload_response(request, payload)
+
+            serializer = FastAirfieldSerializer(context={'at': at})
+            response_data = {**serializer.airfield(airport), 'timezone_refreshing': refreshing}
+            logger.info(f"Response data for {code}: {response_data.get('timezone', {})}")
             return Response(response_data)
         except Exception as e:
-            logger.error(f"Error processing IATA request: {str(e)}")
+            logger.error(f"Error processing {code_type} request: {str(e)}")
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=['get'])
+    def by_iata(self, request):
+        """Get airport by IATA code."""
+        iata = request.query_params.get('code', '').upper()
+        return self._lookup_response(request, 'IATA', iata, airfield_index.by_iata)
+
     @action(detail=False, methods=['get'])
     def by_icao(self, request):
         """Get airport by ICAO code (ident)."""
         icao = request.query_params.get('code', '').upper()
-        include_timezone = request.query_params.get('include_timezone', '').lower() == 'true'
-        
-        self._log_request_info(request, 'ICAO', icao)
-        
-        if not icao:
+        return self._lookup_response(request, 'ICAO', icao, airfield_index.by_icao)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Look up many IATA/ICAO codes in one request.
+
+        Expects {"codes": [...]} and returns a code -> airport map in which
+        codes that matched nothing map to null and are listed in not_found.
+        """
+        input_serializer = BatchLookupSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+        codes = input_serializer.validated_data['codes']
+        logger.info(f"Batch request for {len(codes)} codes | IP: {request.META.get('REMOTE_ADDR')}")
+
+        airports = airfield_records(airfield_rows(Airfield.objects.filter(
+            Q(iata_code__in=codes) | Q(ident__in=codes) | Q(gps_code__in=codes)
+        ).order_by()))
+
+        by_iata, by_ident, by_gps_code = {}, {}, {}
+        for airport in airports:
+            if airport.iata_code:
+                by_iata.setdefault(airport.iata_code, airport)
+            by_ident.setdefault(airport.ident, airport)
+            if airport.gps_code:
+                by_gps_code.setdefault(airport.gps_code, airport)
+
+        matches = {}
+        for code in codes:
+            # Three-letter codes are IATA first; anything else is treated as ICAO
+            if len(code) == 3:
+                matches[code] = by_iata.get(code) or by_ident.get(code) or by_gps_code.get(code)
+            else:
+                matches[code] = by_ident.get(code) or by_gps_code.get(code) or by_iata.get(code)
+
+        # Serialize each matched airport once, however many codes point at it
+        matched = {airport.id: airport for airport in matches.values() if airport is not None}
+        hit_counter.record(matched)
+        serialized = {
+            data['id']: data
+            for data in FastAirfieldSerializer().many(matched.values())
+        }
+
+        results = {code: serialized[airport.id] if airport else None for code, airport in matches.items()}
+        not_found = [code for code, airport in matches.items() if airport is None]
+        return Response({'airports': results, 'not_found': not_found})
+
+    @action(detail=False, methods=['get'])
+    def nearest(self, request):
+        """
+        Get the airports nearest to a coordinate.
+
+        Query parameters: lat and lon (required), k (default 10), type
+        (comma-separated airport types) and scheduled_service (true/false).
+        """
+        try:
+            latitude = float(request.query_params['lat'])
+            longitude = float(request.query_params['lon'])
+            k = int(request.query_params.get('k', 10))
+        except (KeyError, ValueError):
             return Response(
-                {'error': 'ICAO code is required'},
+                {'error': 'lat and lon are required and must be numbers; k must be an integer'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return Response(
+                {'error': 'lat must be between -90 and 90 and lon between -180 and 180'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 1 <= k <= settings.NEAREST_MAX_RESULTS:
+            return Response(
+                {'error': f'k must be between 1 and {settings.NEAREST_MAX_RESULTS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        types = [t for t in request.query_params.get('type', '').split(',') if t]
+        scheduled_service = request.query_params.get('scheduled_service')
+        if scheduled_service is not None:
+            scheduled_service = scheduled_service.lower() == 'true'
 
+        matches = airfield_index.spatial().nearest(
+            latitude, longitude, k=k, types=types, scheduled_service=scheduled_service
+        )
+        serializer = FastAirfieldSerializer()
+        results = [
+            {**serializer.airfield(airfield_index.latest(airport)), 'distance_km': round(distance, 3),
+             'distance_nm': round(distance / KM_PER_NM, 3)}
+            for airport, distance in matches
+        ]
+        return Response(results)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Search airports by name, municipality, keywords, codes and region.
+
+        Query parameters: q (required) and limit (default 20). Matching is
+        typo-tolerant; results are ranked by how many query words match,
+        then by relevance and airport size.
+        """
+        query = request.query_params.get('q', '').strip()
         try:
-            airport = get_object_or_404(Airfield, ident=icao)
-            logger.info(f"Found airport: {airport}")
-            
-            # Update timezone if needed
-            if include_timezone:
-                logger.info(f"Updating timezone for {airport}")
-                if airport.timezone:
-                    logger.info(f"Current timezone data: {airport.timezone.timezone_id}, {airport.timezone.timezone_name}")
-                self._update_timezone_if_needed(airport, include_timezone)
-                logger.info(f"After update - timezone data: {airport.timezone.timezone_id if airport.timezone else 'None'}")
-            
-            serializer = self.get_serializer(airport)
-            response_data = serializer.data
-            logger.info(f"Response data for {icao}: {response_data.get('timezone', {})}")
-            
-            return Response(response_data)
-        except Exception as e:
-            logger.error(f"Error processing ICAO request: {str(e)}")
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            limit = None
+        if not query:
+            return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit is None or not 1 <= limit <= settings.SEARCH_MAX_RESULTS:
             return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': f'limit must be an integer between 1 and {settings.SEARCH_MAX_RESULTS}'},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
+        if settings.AIRPORT_SEARCH_BACKEND == 'postgres':
+            matches = [
+                (airfield_index.by_id(airfield_id), score)
+                for airfield_id, score in database_search(query, limit)
+            ]
+            matches = [(airport, score) for airport, score in matches if airport is not None]
+        else:
+            matches = [
+                (airfield_index.latest(airport), score)
+                for airport, score in airfield_index.search().search(query, limit)
+            ]
+        serializer = FastAirfieldSerializer()
+        return Response([{**serializer.airfield(airport), 'score': score} for airport, score in matches])
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Suggest airports whose code, name, municipality or a word of them starts with a prefix.
+
+        Query parameters: prefix (required) and limit (default 10). Returns
+        compact entries ranked by airport size and scheduled service, with
+        an exact code match first.
+        """
+        prefix = request.query_params.get('prefix', '').strip()
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = None
+        if not prefix:
+            return Response({'error': 'prefix is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit is None or not 1 <= limit <= settings.AUTOCOMPLETE_MAX_RESULTS:
+            return Response(
+                {'error': f'limit must be an integer between 1 and {settings.AUTOCOMPLETE_MAX_RESULTS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response([
+            {field: getattr(airport, field) for field in AUTOCOMPLETE_FIELDS}
+            for airport in airfield_index.autocomplete().complete(prefix, limit)
+        ])
+
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        Stream every airport, with its timezone, as NDJSON or CSV.
+
+        Query parameters: format (ndjson, the default, or csv) and the list
+        endpoint's filters. Rows are read with a server-side cursor and the
+        body is gzip-compressed on the fly for clients that accept it.
+        """
+        export_format = request.accepted_renderer.format
+        rows = airfield_rows(self.filter_queryset(self.get_queryset()).order_by('id'))
+        chunks = iter_csv(rows) if export_format == 'csv' else iter_ndjson(rows)
+
+        compress = accepts_gzip(request)
+        response = StreamingHttpResponse(
+            gzip_chunks(chunks) if compress else chunks,
+            content_type=request.accepted_renderer.media_type
+        )
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        response['Content-Disposition'] = f'attachment; filename="airports.{export_format}"'
+        patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+        return response
+
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        
-        # Check and update timezone if needed
-        instance.update_timezone_if_needed(settings.GOOGLE_MAPS_API_KEY)
-        
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        # retrieve always refreshes timezone data, so it is cached as include_timezone=true
+        airfield_id = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        cached = get_cached_response('id', airfield_id, True)
+        if cached is not None:
+            hit_counter.record([cached.airfield_id])
+            return self._payload_response(request, cached)
+
+        records = airfield_records(airfield_rows(self.get_queryset().filter(id=airfield_id).order_by()))
+        if not records:
+            raise Http404
+        instance = records[0]
+        hit_counter.record([instance.id])
+
+        # Serve what we have and refresh the timezone in the background
+        if self._timezone_update_reason(instance) is not None:
+            enqueue_timezone_refresh([instance.id])
+            return Response({**FastAirfieldSerializer().airfield(instance), 'timezone_refreshing': True})
+
+        payload = get_payload(instance.id)
+        if payload is None:
+            # Removed (e.g. by an import) since its record was read
+            return Response({**FastAirfieldSerializer().airfield(instance), 'timezone_refreshing': False})
+        set_cached_response('id', airfield_id, True, payload, timeout=self._cache_timeout(payload))
+        return self._payload_response(request, payload)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        # Update timezones for filtered queryset if needed
-        for airfield in queryset:
-            airfield.update_timezone_if_needed(settings.GOOGLE_MAPS_API_KEY)
-        
+        queryset = airfield_rows(self.filter_queryset(self.get_queryset()))
+
         page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        airfields = airfield_records(page if page is not None else queryset)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        # Only rows being returned are considered, and missing ones are resolved in the background
+        enqueue_timezone_refresh(
+            airfield.id for airfield in airfields if self._timezone_update_reason(airfield) is not None
+        )
+
+        data = FastAirfieldSerializer().many(airfields)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
@@ -59,6 +59,47 @@ CACHES = {
 # Cache time to live is 24 hours (in seconds)
 CACHE_TTL = 60 * 60 * 24
 
+# How often (in seconds) each worker checks the database for changes to its
+# in-memory airfield code index
+AIRFIELD_INDEX_CHECK_INTERVAL = env.int('AIRFIELD_INDEX_CHECK_INTERVAL', default=60)
+
+# Maximum number of codes accepted by a single batch lookup request
+BATCH_LOOKUP_MAX_CODES = 1000
+
+# Maximum number of airports returned by the nearest-airport endpoint
+NEAREST_MAX_RESULTS = 100
+
+# Airport search backend: 'memory' (per-worker trigram index) or 'postgres'
+# (pg_trgm in the database), and the most results a search may return
+AIRPORT_SEARCH_BACKEND = env('AIRPORT_SEARCH_BACKEND', default='memory')
+SEARCH_MAX_RESULTS = 100
+
+# Most results returned by the autocomplete endpoint; every prefix keeps this
+# many precomputed candidates
+AUTOCOMPLETE_MAX_RESULTS = 20
+
+# Timezone boundary GeoJSON (e.g. from timezone-boundary-builder) used to resolve
+# timezones offline. Google Maps is only used when this file is missing.
+TIMEZONE_BOUNDARIES_FILE = env('TIMEZONE_BOUNDARIES_FILE', default=os.path.join(BASE_DIR, 'data', 'timezones.geojson'))
+
+# Local snapshot of CLDR bcp47/timezone.xml, written by import_timezone_aliases,
+# and how often (in seconds) each process checks it for changes
+TIMEZONE_ALIASES_FILE = env('TIMEZONE_ALIASES_FILE', default=os.path.join(BASE_DIR, 'data', 'timezone.xml'))
+TIMEZONE_ALIASES_CHECK_INTERVAL = env.int('TIMEZONE_ALIASES_CHECK_INTERVAL', default=300)
+
+# Google Maps Time Zone API calls allowed per second across all workers, and
+# the read timeout (in seconds) for each call
+GOOGLE_TIMEZONE_QPS = env.int('GOOGLE_TIMEZONE_QPS', default=10)
+GOOGLE_TIMEZONE_TIMEOUT = env.float('GOOGLE_TIMEZONE_TIMEOUT', default=10)
+
+# Days after which a resolved timezone is due for a refresh, and the number of
+# refreshes schedule_timezone_refreshes may queue per (daily) run
+TIMEZONE_STALE_DAYS = env.int('TIMEZONE_STALE_DAYS', default=30)
+TIMEZONE_REFRESH_DAILY_BUDGET = env.int('TIMEZONE_REFRESH_DAILY_BUDGET', default=500)
+
+# How often (in seconds) each process writes its buffered airfield hit counts
+AIRFIELD_HITS_FLUSH_INTERVAL = env.int('AIRFIELD_HITS_FLUSH_INTERVAL', default=30)
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Build the airfield code index before the worker starts serving requests
+from airport_info.index import airfield_index  # noqa: E402
+
+airfield_index.warm()